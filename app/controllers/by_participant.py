@@ -22,6 +22,23 @@ except ImportError as e:
     print("ADVERTENCIA: ByParticipant: Servicio de cache t-SNE no disponible:", str(e))
     get_tsne_cache = None
 
+# Índice temporal acumulado para ventanas t_start/t_end
+try:
+    from app.shared.dwell_cube_service import build_time_index, window_pair_totals
+    print("OK: ByParticipant: Ventanas temporales HABILITADAS")
+except ImportError as e:
+    print("ADVERTENCIA: ByParticipant: Ventanas temporales no disponibles:", str(e))
+    build_time_index = None
+    window_pair_totals = None
+
+# Motor de densidad (binning vectorizado + suavizado a resolución reducida)
+try:
+    from app.shared.density_engine import density_map
+    print("OK: ByParticipant: Motor de densidad HABILITADO")
+except ImportError as e:
+    print("ADVERTENCIA: ByParticipant: Motor de densidad no disponible:", str(e))
+    density_map = None
+
 by_participant_bp = Blueprint('by_participant', __name__)
 
 class ByParticipantController:
@@ -122,12 +139,15 @@ class ByParticipantController:
         images = sorted(participant_data['ImageName'].unique().tolist())
         return images
 
-    def get_heatmap_data_for_participant(self, participant_id, top_n_clases=15):
+    def get_heatmap_data_for_participant(self, participant_id, top_n_clases=15, t_start=None, t_end=None):
         """
         Calcula matriz de densidad ponderada para un participante
         - Filas: clases (top N por tiempo total)
         - Columnas: imágenes que vio el participante (50)
         - Valores: densidad = time_en_clase / ratio_de_clase
+
+        t_start/t_end (segundos desde el inicio de cada imagen) restringen el
+        tiempo a las muestras en [t_start, t_end).
         """
         if self.data is None or self.scores_data is None:
             return {'error': 'No data available'}
@@ -169,14 +189,26 @@ class ByParticipantController:
             df_sorted['delta_t'] = df_sorted['delta_t'].fillna(0.0)
 
             # Agrupar por (imagen, main_class) y sumar delta_t
+            grouped = df_sorted.groupby(['ImageName', 'main_class'], dropna=False)['delta_t']
             por_imagen_clase = (
-                df_sorted
-                .groupby(['ImageName', 'main_class'], dropna=False)['delta_t']
+                grouped
                 .sum()
                 .reset_index()
                 .rename(columns={'delta_t': 'time_por_imagen_clase'})
             )
 
+            # Ventana temporal: búsqueda binaria en el dwell acumulado de cada (imagen, clase)
+            time_window = t_start is not None or t_end is not None
+            if time_window and build_time_index:
+                sample_time = df_sorted['Time'] - df_sorted.groupby('_bloque')['Time'].transform('min')
+                time_index = build_time_index(
+                    grouped.ngroup().to_numpy(), sample_time.to_numpy(dtype=float),
+                    df_sorted['delta_t'].to_numpy(dtype=float), len(por_imagen_clase)
+                )
+                window_time, window_count = window_pair_totals(time_index, t_start, t_end)
+                por_imagen_clase['time_por_imagen_clase'] = window_time
+                por_imagen_clase = por_imagen_clase[window_count > 0].reset_index(drop=True)
+
             # Obtener top N clases por tiempo total
             suma_total_clase = (
                 por_imagen_clase
@@ -263,7 +295,7 @@ class ByParticipantController:
             # matriz.to_csv('RESULTADO_PARTICIPANT.csv', index=False)
             # matriz_normalized.to_csv('RESULTADO_PARTICIPANT_NORMALIZED.csv', index=False)
             # Preparar datos para retornar
-            return {
+            result = {
                 'classes': matriz.index.tolist(),
                 'images': images,
                 'image_scores': image_scores,  # Mapeo de ImageName -> score
@@ -273,12 +305,15 @@ class ByParticipantController:
                 'max_value': float(max_val),
                 'participant_id': participant_id
             }
+            if time_window:
+                result['time_window'] = {'t_start': t_start, 't_end': t_end}
+            return result
 
         except Exception as e:
             print(f"Error calculating heatmap for participant {participant_id}: {e}")
             return {'error': str(e)}
 
-    def generate_heatmap(self, fixations, img_width=800, img_height=600, sigma=30):
+    def generate_heatmap(self, fixations, img_width=800, img_height=600, sigma=30, output_shape=None):
         """
         Genera un mapa de densidad continuo usando suavizado Gaussiano.
 
@@ -287,10 +322,15 @@ class ByParticipantController:
             img_width: ancho de la imagen (píxeles)
             img_height: alto de la imagen (píxeles)
             sigma: desviación estándar del kernel Gaussiano (≈1° visual = ~30 píxeles a 800x600)
+            output_shape: (ancho, alto) del resultado; por defecto (img_width, img_height)
 
         Returns:
             heatmap normalizado entre 0 y 1
         """
+        if density_map:
+            # Binning con np.bincount y suavizado a resolución reducida (ver density_engine)
+            return density_map(fixations, img_width, img_height, sigma, output_shape=output_shape)
+
         # 1. Crear matriz de ceros (histograma 2D)
         heatmap = np.zeros((img_height, img_width), dtype=np.float32)
 
@@ -11,6 +11,8 @@ import time
 
 # Agregar ruta para imports
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+from app.shared.result_cache import ResultCache
+
 # Importar servicio compartido de datos
 try:
     from app.shared.data_service import get_data_service
@@ -27,6 +29,40 @@ except ImportError as e:
     print("ADVERTENCIA: Servicio de fijaciones pre-calculadas no disponible:", str(e))
     precalculated_service = None
 
+from app.shared.scarf_segments import build_region_timelines
+from app.shared.fixation_labeling import assign_fixation_classes
+from app.shared.semantic_regions import (
+    encode_classes, fixation_regions, gaze_regions, regions_payload, MIN_STAY_DURATION, MAX_STAY_DURATION
+)
+
+# Fusión de segmentos cortos (nivel de detalle) del scarf timeline
+try:
+    from app.shared.scarf_segments import merge_segment_dicts, lod_min_duration, parse_lod_args
+    print("OK: Nivel de detalle de scarf timeline HABILITADO")
+except ImportError as e:
+    print("ADVERTENCIA: Nivel de detalle de scarf timeline no disponible:", str(e))
+    merge_segment_dicts = None
+    lod_min_duration = None
+    parse_lod_args = None
+
+# Timelines pre-calculados (memory-mapped)
+try:
+    from app.shared.timeline_store import get_timeline_store
+    print("OK: Timelines pre-calculados HABILITADOS")
+except ImportError as e:
+    print("ADVERTENCIA: Timelines pre-calculados no disponibles:", str(e))
+    get_timeline_store = None
+
+# Importar fijaciones pre-calculadas por imagen y máscaras de segmentación
+try:
+    from app.shared.precomputed_fixation_service import get_precomputed_service
+    from app.shared.segmentation_service import get_segmentation_service
+    print("OK: Servicios de fijaciones por imagen y segmentación HABILITADOS")
+except ImportError as e:
+    print("ADVERTENCIA: Servicios de fijaciones por imagen/segmentación no disponibles:", str(e))
+    get_precomputed_service = None
+    get_segmentation_service = None
+
 # Blueprint para rutas de glyph
 glyph_bp = Blueprint('glyph', __name__)
 
@@ -53,8 +89,8 @@ if precalculated_service and precalculated_service.is_available():
 else:
     print(" Servicio de fijaciones pre-calculadas no disponible - usando cálculo en tiempo real")
 
-SCARF_TIMELINE_CACHE = {}
 SCARF_TIMELINE_CACHE_TTL_SECONDS = 90
+SCARF_SEGMENT_BYTES = 160  # tamaño estimado de un segmento del payload (para el límite en bytes)
 SCARF_SOURCE_FALLBACK = {'source': None}
 
 
@@ -65,116 +101,163 @@ def _safe_float(value, default=0.0):
         return default
 
 
-def _finalize_segment(region, start, end, fixation_count, source_label):
-    if end <= start:
-        end = start + 0.05
-    return {
-        'region': region,
-        'start_time': start,
-        'end_time': end,
-        'duration': max(end - start, 0.05),
-        'fixation_count': max(int(fixation_count), 1),
-        'source': source_label
-    }
+def _scarf_payload_size(payload):
+    """Bytes estimados de un payload de scarf timeline"""
+    return 512 + SCARF_SEGMENT_BYTES * payload.get('total_segments', 0)
 
 
-def _build_participant_timeline(records, source_label='raw_eye_tracking'):
-    timeline = []
-    if not records:
-        return timeline
-    current_region = None
-    segment_start = None
-    segment_end = None
-    fixation_count = 0
-
-    for record in records:
-        region = str(record.get('main_class') or record.get('class_name') or 'unknown').strip() or 'unknown'
-        timestamp = _safe_float(record.get('Time'), _safe_float(record.get('start_time'), 0.0))
-        if current_region is None:
-            current_region = region
-            segment_start = timestamp
-            segment_end = timestamp
-            fixation_count = 1
-            continue
+# Cache LRU + TTL de payloads (acotado en entradas y bytes, thread-safe, single-flight)
+SCARF_TIMELINE_CACHE = ResultCache(
+    'scarf_timeline', max_entries=256, max_bytes=128 * 1024 * 1024,
+    ttl_seconds=SCARF_TIMELINE_CACHE_TTL_SECONDS, sizeof=_scarf_payload_size
+)
+
+
+def _merge_timeline_payload(payload, resolution):
+    """Copia del payload con los segmentos más cortos que un píxel fusionados por participante"""
+    participants_data = {}
+    total_segments = 0
+    total_merged = 0
+    for key, participant in payload['participants_data'].items():
+        time_range = participant['time_range']
+        min_duration = lod_min_duration(time_range['duration'], resolution)
+        timeline, merged = merge_segment_dicts(
+            participant['timeline'], min_duration,
+            class_key='region', count_key='fixation_count', origin=time_range['start']
+        )
+        participants_data[key] = dict(participant, timeline=timeline, merged_segments=merged)
+        total_segments += len(timeline)
+        total_merged += merged
+
+    return dict(
+        payload,
+        participants_data=participants_data,
+        total_segments=total_segments,
+        lod={'resolution': int(resolution), 'merged_segments': total_merged}
+    )
 
-        if region == current_region and timestamp >= segment_end:
-            segment_end = timestamp
-            fixation_count += 1
-        else:
-            timeline.append(_finalize_segment(current_region, segment_start, segment_end, fixation_count, source_label))
-            current_region = region
-            segment_start = timestamp
-            segment_end = timestamp
-            fixation_count = 1
-
-    if current_region is not None:
-        timeline.append(_finalize_segment(current_region, segment_start, segment_end, fixation_count, source_label))
-    return timeline
-
-
-def _scarf_cache_get(cache_key):
-    entry = SCARF_TIMELINE_CACHE.get(cache_key)
-    if not entry:
-        return None
-    if time.time() - entry['ts'] > SCARF_TIMELINE_CACHE_TTL_SECONDS:
-        return None
-    return entry['payload']
-
-
-def _scarf_cache_set(cache_key, payload):
-    SCARF_TIMELINE_CACHE[cache_key] = {
-        'ts': time.time(),
-        'payload': payload,
-    }
 
+def get_scarf_timeline_payload(image_id, patch_size=40, limit=None, resolution=None):
+    cache_key = (int(image_id), int(patch_size), int(limit) if limit else None, resolution)
+    return SCARF_TIMELINE_CACHE.get_or_load(
+        cache_key, lambda: _build_scarf_timeline_payload(image_id, patch_size, limit, resolution)
+    )
 
-def get_scarf_timeline_payload(image_id, patch_size=40, limit=None):
-    cache_key = (int(image_id), int(patch_size), int(limit) if limit else None)
-    cached = _scarf_cache_get(cache_key)
-    if cached:
-        return cached
+
+def _build_scarf_timeline_payload(image_id, patch_size=40, limit=None, resolution=None):
+    # Nivel de detalle: se deriva del timeline completo (cacheado aparte)
+    if resolution and merge_segment_dicts:
+        payload = get_scarf_timeline_payload(image_id, patch_size=patch_size, limit=limit)
+        if payload is None:
+            return None
+        return _merge_timeline_payload(payload, resolution)
 
     if SCARF_SOURCE_FALLBACK['source'] is None and precalculated_service and precalculated_service.is_available() and precalculated_service.fixations_df is not None:
         SCARF_SOURCE_FALLBACK['source'] = 'precalculated'
 
     source_label = 'raw_eye_tracking'
-    if glyph_controller.data is None:
-        return None
-    image_subset = glyph_controller.data[glyph_controller.data['ImageName'] == image_id].copy()
 
-    if image_subset is None or image_subset.empty:
-        payload = {
-            'image_id': image_id,
-            'patch_size': patch_size,
-            'participants': [],
-            'participants_data': {},
-            'source': source_label,
-            'generated_at': time.time(),
-            'total_segments': 0
-        }
-        _scarf_cache_set(cache_key, payload)
-        return payload
+    # Timelines pre-calculados (memory-mapped): solo lectura
+    variant = get_timeline_store().get_variant('glyph', 'main_class') if get_timeline_store else None
+    if variant is not None:
+        timelines = get_timeline_store().read_image(variant, image_id)
+    else:
+        if glyph_controller.data is None:
+            return None
+        image_subset = glyph_controller.data[glyph_controller.data['ImageName'] == image_id]
+        timelines = build_glyph_timelines(image_subset)
+
+    return _timeline_payload_from_arrays(image_id, patch_size, limit, timelines, source_label)
 
-    participants = sorted(image_subset['participante'].dropna().unique().tolist())
+
+def _region_names(frame):
+    """
+    Región de cada fila: main_class, si no class_name, si no 'unknown'
+    (valores falsos como None o '' pasan a la siguiente columna)
+    """
+    names = pd.Series('unknown', index=frame.index, dtype=object)
+    for column in ('class_name', 'main_class'):
+        if column in frame.columns:
+            values = frame[column]
+            names = values.where(values.map(bool), names)
+    names = names.astype(str).str.strip()
+    return names.where(names != '', 'unknown')
+
+
+def build_glyph_timelines(data):
+    """
+    Arrays de timeline de regiones de todos los (imagen, participante) de data
+
+    Una corrida se corta al cambiar la región o cuando el tiempo no avanza
+    (ver scarf_segments.build_region_timelines).
+    """
+    frame = data.dropna(subset=['ImageName', 'participante'])
+    frame = frame.assign(_time=pd.to_numeric(frame['Time'], errors='coerce') if 'Time' in frame.columns else np.nan)
+    frame = frame.sort_values(['ImageName', 'participante', '_time'], kind='mergesort')
+
+    timelines = build_region_timelines(
+        frame['ImageName'].to_numpy(dtype=np.int64),
+        frame['participante'].to_numpy(dtype=np.int64),
+        frame['_time'].to_numpy(dtype=float),
+        _region_names(frame).to_numpy(dtype=object)
+    )
+
+    # Rango de tiempo por participante desde start_time / end_time si existen
+    if len(frame) and ('start_time' in frame.columns or 'end_time' in frame.columns):
+        keys = (frame['ImageName'].to_numpy(dtype=np.int64) << 32) + frame['participante'].to_numpy(dtype=np.int64)
+        pair_first = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        with np.errstate(invalid='ignore'):
+            if 'start_time' in frame.columns:
+                timelines['t_min'] = np.fmin.reduceat(pd.to_numeric(frame['start_time'], errors='coerce').to_numpy(dtype=float), pair_first)
+            if 'end_time' in frame.columns:
+                timelines['t_max'] = np.fmax.reduceat(pd.to_numeric(frame['end_time'], errors='coerce').to_numpy(dtype=float), pair_first)
+        timelines['time_range'] = timelines['t_max'] - timelines['t_min']
+
+    timelines['colors'] = [None] * len(timelines['classes'])
+    return timelines
+
+
+def _timeline_payload_from_arrays(image_id, patch_size, limit, timelines, source_label):
+    """Payload de /api/scarf/timeline desde arrays de timeline de una imagen"""
+    n_pairs = len(timelines['participant'])
     if limit:
-        participants = participants[:max(1, int(limit))]
+        n_pairs = min(n_pairs, max(1, int(limit)))
 
+    classes = timelines['classes']
+    offsets = timelines['offsets']
     participants_data = {}
     total_segments = 0
 
-    for participant_id in participants:
-        participant_df = image_subset[image_subset['participante'] == participant_id].sort_values('Time')
-        if participant_df.empty:
-            continue
-        timeline = _build_participant_timeline(participant_df.to_dict('records'), source_label)
-        if not timeline:
+    for pair in range(n_pairs):
+        lo, hi = offsets[pair], offsets[pair + 1]
+        if hi == lo:
             continue
+        starts = timelines['start'][lo:hi]
+        ends = timelines['end'][lo:hi]
+        # Segmentos de una sola muestra: duración mínima de 0.05
+        ends = np.where(ends <= starts, starts + 0.05, ends)
+        durations = np.maximum(ends - starts, 0.05)
+        counts = np.maximum(timelines['points'][lo:hi], 1)
+
+        timeline = [
+            {
+                'region': classes[code],
+                'start_time': float(start),
+                'end_time': float(end),
+                'duration': float(duration),
+                'fixation_count': int(count),
+                'source': source_label
+            }
+            for code, start, end, duration, count in zip(timelines['codes'][lo:hi].tolist(), starts, ends, durations, counts)
+        ]
         total_segments += len(timeline)
-        start_val = _safe_float(participant_df['start_time'].min() if 'start_time' in participant_df.columns else participant_df['Time'].min(), 0.0)
-        end_val = _safe_float(participant_df['end_time'].max() if 'end_time' in participant_df.columns else participant_df['Time'].max(), start_val)
-        participants_data[str(int(participant_id))] = {
-            'participant_id': int(participant_id),
-            'participant_label': f"P{int(participant_id)}",
+
+        participant_id = int(timelines['participant'][pair])
+        start_val = _safe_float(timelines['t_min'][pair], 0.0)
+        end_val = _safe_float(timelines['t_max'][pair], start_val)
+        participants_data[str(participant_id)] = {
+            'participant_id': participant_id,
+            'participant_label': f"P{participant_id}",
             'timeline': timeline,
             'time_range': {
                 'start': start_val,
@@ -183,26 +266,24 @@ def get_scarf_timeline_payload(image_id, patch_size=40, limit=None):
             }
         }
 
-    payload = {
+    return {
         'image_id': image_id,
         'patch_size': patch_size,
-        'participants': [int(pid) for pid in participants if str(int(pid)) in participants_data],
+        'participants': [int(pid) for pid in timelines['participant'][:n_pairs] if str(int(pid)) in participants_data],
         'participants_data': participants_data,
         'source': source_label,
         'generated_at': time.time(),
         'total_segments': total_segments
     }
 
-    _scarf_cache_set(cache_key, payload)
-    return payload
-
 
 @glyph_bp.route('/api/scarf/timeline/<int:image_id>')
 def get_scarf_timeline(image_id):
     patch_size = request.args.get('patch_size', 40, type=int)
     limit = request.args.get('limit', type=int)
+    resolution = parse_lod_args(request.args) if parse_lod_args else None
     try:
-        payload = get_scarf_timeline_payload(image_id, patch_size=patch_size, limit=limit)
+        payload = get_scarf_timeline_payload(image_id, patch_size=patch_size, limit=limit, resolution=resolution)
         if payload is None:
             return jsonify({'error': 'No hay datos disponibles para generar el scarf plot.'}), 404
         return jsonify(payload)
@@ -213,133 +294,60 @@ def get_scarf_timeline(image_id):
 def _generate_semantic_transitions_from_precalculated(fixations, participant_id, image_id):
     """
     Generar transiciones semánticas a partir de fijaciones pre-calculadas
-    
+
+    Cada fijación se etiqueta una sola vez con la clase de los gaze points
+    cercanos del participante (assign_fixation_classes) y las estadías,
+    transiciones y estadísticas salen del motor común de semantic_regions.
+
     Args:
         fixations: Lista de fijaciones pre-calculadas
         participant_id: ID del participante
         image_id: ID de la imagen
-        
+
     Returns:
         Diccionario con sequence y region_stats
     """
-    if not fixations:
-        return {
-            'sequence': [],
-            'region_stats': {},
-            'total_transitions': 0,
-            'unique_regions': 0
-        }
-    
-    try:
-        # Obtener datos originales para clasificación semántica
-        if glyph_controller.data is not None:
-            participant_data = glyph_controller.data[
-                (glyph_controller.data['ImageName'] == image_id) & 
-                (glyph_controller.data['participante'] == participant_id)
-            ].copy()
-            
-            if len(participant_data) == 0:
-                return {
-                    'sequence': [],
-                    'region_stats': {},
-                    'total_transitions': 0,
-                    'unique_regions': 0
-                }
-            
-            # Mapear fijaciones a regiones semánticas
-            sequence = []
-            region_stats = {}
-            
-            # Ordenar fijaciones por tiempo
-            sorted_fixations = sorted(fixations, key=lambda f: f['start_time'])
-            
-            for i, fixation in enumerate(sorted_fixations):
-                # Encontrar punto más cercano en datos originales para obtener main_class
-                x_centroid = fixation['x_centroid']
-                y_centroid = fixation['y_centroid']
-                
-                # Buscar main_class del punto más cercano
-                distances = ((participant_data['pixelX'] - x_centroid) ** 2 + 
-                           (participant_data['pixelY'] - y_centroid) ** 2) ** 0.5
-                
-                if len(distances) > 0:
-                    closest_idx = distances.idxmin()
-                    main_class = str(participant_data.loc[closest_idx].get('main_class', 'unknown'))
-                else:
-                    main_class = 'unknown'
-                
-                # Agregar a estadísticas de región
-                if main_class not in region_stats:
-                    region_stats[main_class] = {
-                        'visit_count': 0,
-                        'total_duration': 0.0,
-                        'first_visit': float('inf'),
-                        'last_visit': 0.0,
-                        'centroid_x': 0.0,
-                        'centroid_y': 0.0,
-                        'x_coords': [],
-                        'y_coords': []
-                    }
-                
-                region_stats[main_class]['visit_count'] += 1
-                region_stats[main_class]['total_duration'] += fixation['duration']
-                region_stats[main_class]['first_visit'] = min(region_stats[main_class]['first_visit'], fixation['start_time'])
-                region_stats[main_class]['last_visit'] = max(region_stats[main_class]['last_visit'], fixation['end_time'])
-                region_stats[main_class]['x_coords'].append(x_centroid)
-                region_stats[main_class]['y_coords'].append(y_centroid)
-                
-                # Agregar transición si no es la primera fijación
-                if i > 0:
-                    prev_fixation = sorted_fixations[i-1]
-                    # Encontrar región anterior (similar lógica)
-                    prev_distances = ((participant_data['pixelX'] - prev_fixation['x_centroid']) ** 2 + 
-                                    (participant_data['pixelY'] - prev_fixation['y_centroid']) ** 2) ** 0.5
-                    
-                    if len(prev_distances) > 0:
-                        prev_closest_idx = prev_distances.idxmin()
-                        prev_main_class = str(participant_data.loc[prev_closest_idx].get('main_class', 'unknown'))
-                    else:
-                        prev_main_class = 'unknown'
-                    
-                    # Añadir transición
-                    sequence.append({
-                        'from_region': prev_main_class,
-                        'to_region': main_class,
-                        'time': fixation['start_time'],
-                        'duration': fixation['duration']
-                    })
-            
-            # Calcular centroides finales
-            for region_name, stats in region_stats.items():
-                if stats['x_coords']:
-                    stats['centroid_x'] = sum(stats['x_coords']) / len(stats['x_coords'])
-                    stats['centroid_y'] = sum(stats['y_coords']) / len(stats['y_coords'])
-                    
-                    # Limpiar listas temporales
-                    del stats['x_coords']
-                    del stats['y_coords']
-                    
-                    # Arreglar first_visit si es infinito
-                    if stats['first_visit'] == float('inf'):
-                        stats['first_visit'] = 0.0
-            
-            return {
-                'sequence': sequence,
-                'region_stats': region_stats,
-                'total_transitions': len(sequence),
-                'unique_regions': len(region_stats)
-            }
-            
-    except Exception as e:
-        print(f" Error en _generate_semantic_transitions_from_precalculated: {e}")
-        
-    # Fallback vacío
-    return {
+    empty = {
         'sequence': [],
         'region_stats': {},
         'total_transitions': 0,
         'unique_regions': 0
     }
+    if not fixations or glyph_controller.data is None:
+        return empty
+
+    try:
+        participant_data = glyph_controller.data[
+            (glyph_controller.data['ImageName'] == image_id) &
+            (glyph_controller.data['participante'] == participant_id)
+        ]
+        if len(participant_data) == 0:
+            return empty
+
+        # Fijaciones ordenadas por tiempo
+        fixation_frame = pd.DataFrame(fixations).sort_values('start_time', kind='mergesort')
+        xs = fixation_frame['x_centroid'].to_numpy(dtype=float)
+        ys = fixation_frame['y_centroid'].to_numpy(dtype=float)
+
+        if 'main_class' in participant_data.columns:
+            labels = assign_fixation_classes(
+                np.full(len(fixation_frame), participant_id), xs, ys, participant_data, 'main_class'
+            )
+        else:
+            labels = np.full(len(fixation_frame), 'unknown', dtype=object)
+
+        codes, class_names = encode_classes(labels)
+        regions = fixation_regions(
+            codes,
+            fixation_frame['start_time'].to_numpy(dtype=float),
+            fixation_frame['end_time'].to_numpy(dtype=float),
+            xs, ys
+        )
+        return regions_payload(regions, class_names)
+
+    except Exception as e:
+        print(f" Error en _generate_semantic_transitions_from_precalculated: {e}")
+        return empty
 
 def get_fixations_ultra_fast(image_id, patch_size=40):
     """
@@ -391,6 +399,29 @@ def safe_json_value(value, default_value):
         return default_value
     return value
 
+def _patch_main_classes(image_id, patch_indices, patch_size):
+    """
+    main_class de la segmentación para cada índice de patch ('unknown' si no hay)
+
+    Se consulta una vez por patch distinto y se expande al array completo.
+    """
+    patch_indices = np.asarray(patch_indices, dtype=np.int64)
+    unique_patches, inverse = np.unique(patch_indices, return_inverse=True)
+    try:
+        from app.controllers.experimentos import TopicModelingAnalyzer
+        analyzer = TopicModelingAnalyzer(patch_size=patch_size)
+    except Exception as e:
+        print(f"Error getting semantic classes: {e}")
+        return np.full(len(patch_indices), 'unknown', dtype=object)
+
+    classes = np.empty(len(unique_patches), dtype=object)
+    for i, patch_idx in enumerate(unique_patches):
+        try:
+            classes[i] = safe_json_value(analyzer.get_patch_main_class(int(patch_idx), image_id), 'unknown')
+        except Exception:
+            classes[i] = 'unknown'
+    return classes[inverse.ravel()]
+
 def clean_for_json(obj):
     """Recursivamente limpia un objeto para serialización JSON segura."""
     try:
@@ -595,8 +626,8 @@ def get_temporal_sequence(image_id, participant_id):
         
         # Calcular patch para cada punto
         cols = 800 // patch_size
-        # Proteger contra NaN en coordenadas de pixel
-        participant_data = participant_data.dropna(subset=['pixelX', 'pixelY'])
+        # Proteger contra NaN en coordenadas de pixel y en el tiempo
+        participant_data = participant_data.dropna(subset=['pixelX', 'pixelY', 'Time'])
         if len(participant_data) == 0:
             return jsonify({
                 'error': f'No valid pixel coordinates found for participant {participant_id} in image {image_id}'
@@ -611,146 +642,23 @@ def get_temporal_sequence(image_id, participant_id):
         participant_data['patch_index'] = participant_data['patch_y'] * cols + participant_data['patch_x']
         
         #  CAMBIO: Usar regiones SEMÁNTICAS en lugar de patches
-        MIN_STAY_DURATION = 0.2  # Mínimo 200ms en una región semántica
-        MAX_STAY_DURATION = 5.0  # Máximo 5s por estadía (filtrar anomalías)
-        
         # Obtener main_class para cada punto usando segmentación
-        try:
-            from app.controllers.experimentos import TopicModelingAnalyzer
-            analyzer = TopicModelingAnalyzer(patch_size=patch_size)
-            
-            # Agregar columna main_class
-            participant_data['main_class'] = 'unknown'
-            for idx, row in participant_data.iterrows():
-                patch_idx = int(row['patch_index'])
-                try:
-                    main_class = analyzer.get_patch_main_class(patch_idx, image_id)
-                    participant_data.at[idx, 'main_class'] = safe_json_value(main_class, 'unknown')
-                except:
-                    participant_data.at[idx, 'main_class'] = 'unknown'
-        except Exception as e:
-            print(f"Error getting semantic classes: {e}")
-            participant_data['main_class'] = 'unknown'
-        
-        # Filtrar estadías por REGIÓN SEMÁNTICA (no por patch)
-        filtered_regions = []
-        current_group = []
-        
-        for _, row in participant_data.iterrows():
-            current_region = str(row['main_class'])
-            current_time = safe_json_value(row['Time'], 0.0)
-            
-            # Agregar punto al grupo actual
-            current_group.append({
-                'region': current_region,
-                'time': current_time,
-                'pixelX': row['pixelX'],
-                'pixelY': row['pixelY']
-            })
-            
-            # Si cambia de región o es el último punto, procesar el grupo
-            is_last = (_ == participant_data.index[-1])
-            next_region = current_region
-            if not is_last:
-                next_row = participant_data.iloc[_ + 1]
-                next_region = str(next_row['main_class'])
-            
-            if current_region != next_region or is_last:
-                # Procesar grupo: si duración >= MIN_STAY_DURATION, mantener
-                if len(current_group) > 1:
-                    group_start = current_group[0]['time']
-                    group_end = current_group[-1]['time']
-                    duration = group_end - group_start
-                    
-                    # Filtrar por duración válida
-                    if duration >= MIN_STAY_DURATION and duration <= MAX_STAY_DURATION:
-                        # Calcular centroide de la región
-                        avg_x = sum(p['pixelX'] for p in current_group) / len(current_group)
-                        avg_y = sum(p['pixelY'] for p in current_group) / len(current_group)
-                        
-                        # Debug: Log estadías largas
-                        if duration > 3.0:
-                            print(f" Estadía larga: Participante {participant_id}, Región {current_region}, Duración: {duration:.3f}s, Puntos: {len(current_group)}")
-                        
-                        filtered_regions.append({
-                            'region': current_region,
-                            'start_time': group_start,
-                            'end_time': group_end,
-                            'duration': duration,
-                            'points': len(current_group),
-                            'centroid_x': avg_x,
-                            'centroid_y': avg_y
-                        })
-                    elif duration > MAX_STAY_DURATION:
-                        print(f"🚫 Estadía filtrada (muy larga): Participante {participant_id}, Región {current_region}, Duración: {duration:.3f}s > {MAX_STAY_DURATION}s")
-                    elif len(filtered_regions) == 0:
-                        # Permitir la primera región aunque sea corta para evitar participantes vacíos
-                        avg_x = sum(p['pixelX'] for p in current_group) / len(current_group)
-                        avg_y = sum(p['pixelY'] for p in current_group) / len(current_group)
-                        
-                        filtered_regions.append({
-                            'region': current_region,
-                            'start_time': group_start,
-                            'end_time': group_end,
-                            'duration': duration,
-                            'points': len(current_group),
-                            'centroid_x': avg_x,
-                            'centroid_y': avg_y
-                        })
-                
-                current_group = []
-        
-        # Crear transiciones entre regiones semánticas
-        sequence = []
-        for i in range(1, len(filtered_regions)):
-            prev_region = filtered_regions[i-1]
-            curr_region = filtered_regions[i]
-            
-            # Solo agregar transición si son regiones diferentes
-            if prev_region['region'] != curr_region['region']:
-                sequence.append({
-                    'from_region': prev_region['region'],
-                    'to_region': curr_region['region'],
-                    'time': curr_region['start_time'],
-                    'duration': curr_region['start_time'] - prev_region['end_time'],
-                    'from_stay_duration': prev_region['duration'],
-                    'to_stay_duration': curr_region['duration']
-                })
-        
-        print(f" Participante {participant_id}: {len(participant_data)} puntos → {len(filtered_regions)} regiones → {len(sequence)} transiciones")
-        
-        # Calcular estadísticas basadas en REGIONES SEMÁNTICAS 
-        region_stats = {}
-        for stay in filtered_regions:
-            region_name = stay['region']
-            if region_name not in region_stats:
-                region_stats[region_name] = {
-                    'visit_count': 0,
-                    'total_duration': 0.0,
-                    'first_visit': stay['start_time'],
-                    'last_visit': stay['end_time'],
-                    'centroid_x': stay['centroid_x'],
-                    'centroid_y': stay['centroid_y']
-                }
-            
-            # Actualizar estadísticas con esta estadía
-            region_stats[region_name]['visit_count'] += 1
-            region_stats[region_name]['total_duration'] += stay['duration']
-            region_stats[region_name]['first_visit'] = min(region_stats[region_name]['first_visit'], stay['start_time'])
-            region_stats[region_name]['last_visit'] = max(region_stats[region_name]['last_visit'], stay['end_time'])
-            
-            # Actualizar centroide promedio
-            region_stats[region_name]['centroid_x'] = (region_stats[region_name]['centroid_x'] + stay['centroid_x']) / 2
-            region_stats[region_name]['centroid_y'] = (region_stats[region_name]['centroid_y'] + stay['centroid_y']) / 2
-            
-        # Asegurar que todos los valores sean JSON-safe
-        for region_name in region_stats:
-            region_stats[region_name]['total_duration'] = safe_json_value(region_stats[region_name]['total_duration'], 0.0)
-            region_stats[region_name]['first_visit'] = safe_json_value(region_stats[region_name]['first_visit'], 0.0)
-            region_stats[region_name]['last_visit'] = safe_json_value(region_stats[region_name]['last_visit'], 0.0)
-            region_stats[region_name]['centroid_x'] = safe_json_value(region_stats[region_name]['centroid_x'], 0.0)
-            region_stats[region_name]['centroid_y'] = safe_json_value(region_stats[region_name]['centroid_y'], 0.0)
-        
+        main_classes = _patch_main_classes(image_id, participant_data['patch_index'].to_numpy(), patch_size)
+
+        # Estadías por REGIÓN SEMÁNTICA (no por patch) filtradas por duración y sus transiciones
+        codes, class_names = encode_classes(main_classes)
+        regions = gaze_regions(
+            codes,
+            participant_data['Time'].to_numpy(dtype=float),
+            participant_data['pixelX'].to_numpy(dtype=float),
+            participant_data['pixelY'].to_numpy(dtype=float)
+        )
+        payload = regions_payload(regions, class_names)
+        sequence = payload['sequence']
+        region_stats = payload['region_stats']
+
+        print(f" Participante {participant_id}: {len(participant_data)} puntos → {len(regions['code'])} regiones → {len(sequence)} transiciones")
+
         # Debug: Resumen de duraciones por región
         total_experiment_time = 0
         for region_name, stats in region_stats.items():
@@ -898,83 +806,74 @@ def get_gaze_points_data(image_id, patch_size=40):
         if glyph_controller.data is None:
             return jsonify({'error': 'No data available'})
         
-        # Filtrar datos por imagen
-        image_data = glyph_controller.data[glyph_controller.data['ImageName'] == image_id].copy()
+        # Filtrar datos por imagen (sin filas sin participante)
+        image_data = glyph_controller.data[
+            (glyph_controller.data['ImageName'] == image_id) & glyph_controller.data['participante'].notna()
+        ]
         
         if len(image_data) == 0:
             return jsonify({'error': f'No data found for image {image_id}'})
         
-        # Obtener participantes únicos
-        participants = sorted(image_data['participante'].unique())
+        # Obtener participantes únicos (ints de Python para jsonify)
+        participant_values = np.sort(image_data['participante'].unique())
+        participants = [int(p) for p in participant_values]
         
         # Calcular dimensiones del grid de patches
         cols = 800 // patch_size
         rows = 600 // patch_size
         total_patches = cols * rows
         
-        # Crear matriz de atención basada en gaze points brutos
-        attention_matrix = []
-        
-        # Datos de transiciones por participante
-        transition_data = []
-
-        for participant_id in participants:
-            participant_data = image_data[image_data['participante'] == participant_id].copy()
+        # Puntos ordenados por participante y tiempo (un solo ordenamiento para toda la imagen)
+        image_data = image_data.iloc[np.lexsort((image_data['Time'].to_numpy(), image_data['participante'].to_numpy()))]
+        participant_ids = image_data['participante'].to_numpy()
+        pixel_x = image_data['pixelX'].to_numpy(dtype=float)
+        pixel_y = image_data['pixelY'].to_numpy(dtype=float)
+        valid_pixels = np.isfinite(pixel_x) & np.isfinite(pixel_y)
+        # int() del cálculo original: truncar hacia cero
+        x = np.trunc(np.where(valid_pixels, pixel_x, 0)).astype(np.int64)
+        y = np.trunc(np.where(valid_pixels, pixel_y, 0)).astype(np.int64)
+
+        # Índice de patch de cada punto (con inversión Y)
+        patch_x = np.minimum(x // patch_size, cols - 1)
+        patch_y = np.minimum((600 - y) // patch_size, rows - 1)
+        patch_index = patch_y * cols + patch_x
+
+        # Matriz de atención: un bincount sobre (participante, patch)
+        participant_pos = np.searchsorted(participant_values, participant_ids)
+        counted = valid_pixels & (patch_index >= 0) & (patch_index < total_patches)
+        attention_matrix = np.bincount(
+            participant_pos[counted] * total_patches + patch_index[counted],
+            minlength=len(participants) * total_patches
+        ).reshape(len(participants), total_patches).tolist()
+
+        # Transiciones semánticas simples por participante
+        if 'main_class' in image_data.columns:
+            main_classes = image_data['main_class'].to_numpy()
+        else:
+            main_classes = np.full(len(image_data), 'unknown', dtype=object)
+        times = image_data['Time'].to_numpy(dtype=float)
+        bounds = np.searchsorted(participant_pos, np.arange(len(participants) + 1))
 
-            if len(participant_data) == 0:
+        transition_data = []
+        for pos, participant_id in enumerate(participants):
+            lo, hi = bounds[pos], bounds[pos + 1]
+            if hi == lo:
                 continue
-
-            # Ordenar por tiempo
-            participant_data = participant_data.sort_values('Time').reset_index(drop=True)
-
-            # NOTA: Los datos ya vienen normalizados de df_final1.csv (0-15s por imagen)
-            # No aplicamos normalización adicional
-
-            # Crear fila de atención para este participante
-            participant_row = [0] * total_patches
-
-            # Procesar cada punto de gaze
-            gaze_points = []
-            for _, row in participant_data.iterrows():
-                x = int(row['pixelX'])
-                y = int(row['pixelY'])
-
-                # Calcular índice de patch
-                patch_x = min(x // patch_size, cols - 1)
-                patch_y = min((600 - y) // patch_size, rows - 1)  # Aplicar inversión Y
-                patch_index = patch_y * cols + patch_x
-
-                # Incrementar contador en matriz de atención
-                if 0 <= patch_index < total_patches:
-                    participant_row[patch_index] += 1
-
-                # Agregar punto de gaze
-                gaze_points.append({
-                    'x': x,
-                    'y': y,
-                    'time': float(row['Time']),
-                    'patch_index': patch_index,
-                    'main_class': str(row.get('main_class', 'unknown'))
-                })
-            
-            attention_matrix.append(participant_row)
-            
-            # Generar transiciones semánticas simples para gaze points
-            semantic_transitions = _generate_gaze_semantic_transitions(gaze_points, participant_id, image_id)
-            
             transition_data.append({
-                'participant': participant_id,
-                'transitions': semantic_transitions,
-                'gaze_count': len(gaze_points)
+                'participant': int(participant_id),
+                'transitions': _generate_gaze_semantic_transitions(
+                    main_classes[lo:hi], times[lo:hi], pixel_x[lo:hi], pixel_y[lo:hi], participant_id, image_id
+                ),
+                'gaze_count': int(hi - lo)
             })
-        
+
         # Calcular estadísticas globales
         total_gaze_points = len(image_data)
-        active_patches = len(set([
-            min((int(row['pixelX']) // patch_size) * cols + min(int(row['pixelY']) // patch_size, rows - 1), total_patches - 1)
-            for _, row in image_data.iterrows()
-        ]))
-        
+        active_patches = int(np.unique(np.minimum(
+            (x[valid_pixels] // patch_size) * cols + np.minimum(y[valid_pixels] // patch_size, rows - 1),
+            total_patches - 1
+        )).size)
+
         response_data = {
             'participants': participants,
             'attention_matrix': attention_matrix,
@@ -1008,76 +907,36 @@ def get_gaze_points_data(image_id, patch_size=40):
         print(f" Error procesando gaze points: {e}")
         return jsonify({'error': f'Error processing gaze points: {str(e)}'})
 
-def _generate_gaze_semantic_transitions(gaze_points, participant_id, image_id):
+def _generate_gaze_semantic_transitions(main_classes, times, xs, ys, participant_id, image_id):
     """
-    Generar transiciones semánticas simples para gaze points
-    
+    Generar transiciones semánticas para gaze points
+
+    Usa el mismo filtro de estadías y las mismas estadísticas por región que
+    los demás caminos del glyph (gaze_regions + regions_payload).
+
     Args:
-        gaze_points: Lista de puntos de gaze con main_class
+        main_classes: main_class de cada punto (ordenados por tiempo)
+        times: tiempo de cada punto
+        xs, ys: posición de cada punto
         participant_id: ID del participante
         image_id: ID de la imagen
-        
+
     Returns:
         Diccionario con secuencia de transiciones y estadísticas de regiones
     """
-    if not gaze_points:
+    if len(main_classes) == 0:
         return {
             'sequence': [],
             'region_stats': {},
             'total_transitions': 0,
             'unique_regions': 0
         }
-    
+
     try:
-        # Generar secuencia de transiciones basada en cambios de main_class
-        sequence = []
-        region_stats = {}
-        
-        current_region = None
-        transition_count = 0
-        
-        for i, point in enumerate(gaze_points):
-            region = point.get('main_class', 'unknown')
-            
-            # Inicializar estadísticas de región si no existen
-            if region not in region_stats:
-                region_stats[region] = {
-                    'total_time': 0,
-                    'visit_count': 0,
-                    'total_points': 0,
-                    'first_visit': point['time'],
-                    'avg_time': 0
-                }
-            
-            # Incrementar contador de puntos para esta región
-            region_stats[region]['total_points'] += 1
-            region_stats[region]['visit_count'] += 1
-            
-            # Si cambió de región, crear transición
-            if current_region is not None and current_region != region:
-                sequence.append({
-                    'from': current_region,
-                    'to': region,
-                    'time': point['time'],
-                    'transition_index': transition_count
-                })
-                transition_count += 1
-            
-            current_region = region
-        
-        # Calcular tiempo promedio por región (aproximado)
-        for region in region_stats:
-            if region_stats[region]['visit_count'] > 0:
-                region_stats[region]['avg_time'] = region_stats[region]['total_points'] * 0.016  # ~16ms por punto
-                region_stats[region]['total_time'] = region_stats[region]['avg_time']
-        
-        return {
-            'sequence': sequence,
-            'region_stats': region_stats,
-            'total_transitions': len(sequence),
-            'unique_regions': len(region_stats)
-        }
-        
+        codes, class_names = encode_classes(main_classes)
+        regions = gaze_regions(codes, times, xs, ys)
+        return regions_payload(regions, class_names)
+
     except Exception as e:
         print(f" Error generando transiciones para gaze points: {e}")
         return {
@@ -1188,8 +1047,7 @@ def get_complete_glyph_data(image_id):
             
             try:
                 from fixation_detection_ivt import get_fixations_ivt
-                from app.controllers.experimentos import TopicModelingAnalyzer
-                
+
                 # Detectar fijaciones usando I-VT
                 fixations_result = get_fixations_ivt(
                     data=participant_data,
@@ -1241,178 +1099,38 @@ def get_complete_glyph_data(image_id):
                     continue
                 
                 # Clasificar cada fijación por región semántica
-                analyzer = TopicModelingAnalyzer(patch_size=patch_size)
-                fixation_regions = []
-                
-                for i, fix in enumerate(fixations):
-                    x = fix['x_centroid']
-                    y = fix['y_centroid']
-                    
-                    # Aplicar Y-inversion para consistencia con visualización
-                    # Calcular patch_index para esta fijación
-                    patch_x = int(x // patch_size)
-                    patch_y = int((600 - y) // patch_size)  # Aplicar inversión Y
-                    patch_index = patch_y * (800 // patch_size) + patch_x
-                    
-                    # Obtener clasificación semántica
-                    try:
-                        main_class = analyzer.get_patch_main_class(patch_index, image_id)
-                        region = main_class or 'unknown'
-                    except:
-                        region = 'unknown'
-                    
-                    fixation_regions.append({
-                        'fixation_id': i,
-                        'region': region,
-                        'centroid_x': x,
-                        'centroid_y': y,
-                        'duration': fix['duration'],
-                        'start_time': fix['start'],
-                        'end_time': fix['end'],
-                        'point_count': fix['pointCount']
-                    })
-                
+                fixations_frame = pd.DataFrame(fixations).sort_values('start', kind='mergesort')
+                xs = fixations_frame['x_centroid'].to_numpy(dtype=float)
+                ys = fixations_frame['y_centroid'].to_numpy(dtype=float)
+                # Aplicar Y-inversion para consistencia con visualización
+                patch_indices = ((600 - ys) // patch_size).astype(np.int64) * (800 // patch_size) + (xs // patch_size).astype(np.int64)
+                codes, class_names = encode_classes(_patch_main_classes(image_id, patch_indices, patch_size))
+
                 print(f" I-VT: Clasificadas fijaciones por regiones semánticas para participante {participant_id}")
-                
-                # Agrupar fijaciones consecutivas por región para crear secuencias
-                sequence = []
-                filtered_regions = []
-                
-                if len(fixation_regions) > 0:
-                    current_region = fixation_regions[0]['region']
-                    region_start = fixation_regions[0]['start_time']
-                    region_end = fixation_regions[0]['end_time']
-                    region_fixations = [fixation_regions[0]]
-                    
-                    for i in range(1, len(fixation_regions)):
-                        fix_region = fixation_regions[i]
-                        
-                        if fix_region['region'] == current_region:
-                            # Misma región, continuar agrupando
-                            region_end = fix_region['end_time']
-                            region_fixations.append(fix_region)
-                        else:
-                            # Cambio de región, guardar la anterior y crear transición
-                            region_duration = region_end - region_start
-                            avg_x = sum(f['centroid_x'] for f in region_fixations) / len(region_fixations)
-                            avg_y = sum(f['centroid_y'] for f in region_fixations) / len(region_fixations)
-                            
-                            filtered_regions.append({
-                                'region': current_region,
-                                'start_time': region_start,
-                                'end_time': region_end,
-                                'duration': region_duration,
-                                'fixation_count': len(region_fixations),
-                                'centroid_x': avg_x,
-                                'centroid_y': avg_y
-                            })
-                            
-                            # Crear transición
-                            sequence.append({
-                                'from_region': current_region,
-                                'to_region': fix_region['region'],
-                                'time': fix_region['start_time'],
-                                'duration': fix_region['start_time'] - region_end
-                            })
-                            
-                            # Iniciar nueva región
-                            current_region = fix_region['region']
-                            region_start = fix_region['start_time']
-                            region_end = fix_region['end_time']
-                            region_fixations = [fix_region]
-                    
-                    # Agregar la última región
-                    if region_fixations:
-                        region_duration = region_end - region_start
-                        avg_x = sum(f['centroid_x'] for f in region_fixations) / len(region_fixations)
-                        avg_y = sum(f['centroid_y'] for f in region_fixations) / len(region_fixations)
-                        
-                        filtered_regions.append({
-                            'region': current_region,
-                            'start_time': region_start,
-                            'end_time': region_end,
-                            'duration': region_duration,
-                            'fixation_count': len(region_fixations),
-                            'centroid_x': avg_x,
-                            'centroid_y': avg_y
-                        })
-                
-                # Serializar timeline completo para visualizaciones (scarf plot)
-                timeline_serialized = []
-                for stay in filtered_regions:
-                    timeline_serialized.append({
-                        'region': stay.get('region', 'unknown'),
-                        'start_time': safe_json_value(stay.get('start_time'), 0.0),
-                        'end_time': safe_json_value(stay.get('end_time'), stay.get('start_time', 0.0)),
-                        'duration': safe_json_value(stay.get('duration'), 0.0),
-                        'fixation_count': int(stay.get('fixation_count', 0) or 0),
-                        'centroid_x': safe_json_value(stay.get('centroid_x'), 0.0),
-                        'centroid_y': safe_json_value(stay.get('centroid_y'), 0.0)
-                    })
-
-                # Calcular estadísticas por región
-                region_stats = {}
-                for stay in filtered_regions:
-                    region_name = stay['region']
-                    all_patches_visited.add(region_name)
-                    
-                    if region_name not in region_stats:
-                        region_stats[region_name] = {
-                            'visit_count': 0,
-                            'total_duration': 0.0,
-                            'fixation_count': 0,
-                            'first_visit': stay['start_time'],
-                            'last_visit': stay['end_time'],
-                            'centroid_x': stay['centroid_x'],
-                            'centroid_y': stay['centroid_y']
-                        }
-                    
-                    region_stats[region_name]['visit_count'] += 1
-                    region_stats[region_name]['total_duration'] += float(stay['duration'])
-                    region_stats[region_name]['fixation_count'] += stay['fixation_count']
-                    
-                    # Asegurar conversión a float para evitar errores de tipo
-                    current_first = float(region_stats[region_name]['first_visit'])
-                    new_start = float(stay['start_time'])
-                    current_last = float(region_stats[region_name]['last_visit'])
-                    new_end = float(stay['end_time'])
-                    
-                    region_stats[region_name]['first_visit'] = min(current_first, new_start)
-                    region_stats[region_name]['last_visit'] = max(current_last, new_end)
-                    
-                    # Actualizar centroide promedio
-                    region_stats[region_name]['centroid_x'] = (region_stats[region_name]['centroid_x'] + stay['centroid_x']) / 2
-                    region_stats[region_name]['centroid_y'] = (region_stats[region_name]['centroid_y'] + stay['centroid_y']) / 2
-                
-                # Asegurar valores JSON-safe
-                for region_name in region_stats:
-                    region_stats[region_name]['total_duration'] = safe_json_value(region_stats[region_name]['total_duration'], 0.0)
-                    region_stats[region_name]['first_visit'] = safe_json_value(region_stats[region_name]['first_visit'], 0.0)
-                    region_stats[region_name]['last_visit'] = safe_json_value(region_stats[region_name]['last_visit'], 0.0)
-                    region_stats[region_name]['centroid_x'] = safe_json_value(region_stats[region_name]['centroid_x'], 0.0)
-                    region_stats[region_name]['centroid_y'] = safe_json_value(region_stats[region_name]['centroid_y'], 0.0)
-                
+
+                # Estadías por región (mismo criterio que las fijaciones pre-calculadas) y transiciones
+                regions = fixation_regions(
+                    codes,
+                    fixations_frame['start'].to_numpy(dtype=float),
+                    fixations_frame['end'].to_numpy(dtype=float),
+                    xs, ys
+                )
+                payload = regions_payload(regions, class_names)
+                all_patches_visited.update(payload['region_stats'])
+
                 # Debug: Resumen basado en fijaciones
-                total_fixation_time = sum(stats['total_duration'] for stats in region_stats.values())
-                for region_name, stats in region_stats.items():
+                for region_name, stats in payload['region_stats'].items():
                     avg_duration = stats['total_duration'] / stats['visit_count'] if stats['visit_count'] > 0 else 0
                     print(f"    [I-VT] P{participant_id} {region_name}: {stats['fixation_count']} fijaciones, {stats['total_duration']:.3f}s total, {avg_duration:.3f}s promedio")
-                
-                print(f" I-VT: Procesadas {len(filtered_regions)} regiones basadas en fijaciones para participante {participant_id}")
+
+                print(f" I-VT: Procesadas {len(payload['timeline'])} regiones basadas en fijaciones para participante {participant_id}")
 
                 duration = participant_time_max - participant_time_min
-                participants_data[int(participant_id)] = {
-                    'sequence': sequence,
-                    'region_stats': region_stats,
-                    'timeline': timeline_serialized,
-                    'total_transitions': len(sequence),
-                    'unique_regions': len(region_stats),
-                    'time_range': {
-                        'start': 0.0,
-                        'end': safe_json_value(duration, 0.0),
-                        'duration': safe_json_value(duration, 0.0)
-                    }
-                }
+                participants_data[int(participant_id)] = dict(payload, time_range={
+                    'start': 0.0,
+                    'end': safe_json_value(duration, 0.0),
+                    'duration': safe_json_value(duration, 0.0)
+                })
                 
             except Exception as e:
                 print(f" Error procesando fijaciones para participante {participant_id}: {e}")
@@ -1468,270 +1186,159 @@ def get_area_analysis(image_id):
         width = request.args.get('width', type=int)
         height = request.args.get('height', type=int)
         data_type = request.args.get('data_type', 'fixations', type=str)
-        
+        dataset_select = request.args.get('dataset_select', 'main_class', type=str).lower()
+
         print(f" Parsed params: x={x}, y={y}, width={width}, height={height}, data_type={data_type}")
-        
+
         # Validar parámetros
         if any(param is None for param in [x, y, width, height]):
             return jsonify({'error': 'Missing required parameters: x, y, width, height'})
-        
+
         if width < 10 or height < 10:
             return jsonify({'error': 'Area too small (minimum 10x10px)'})
-        
+
         print(f" Analyzing area: {width}x{height}px at ({x}, {y}) for image {image_id}, data_type: {data_type}")
-        print(f" DEBUG: Area coordinates - x:[{x}, {x+width}], y:[{y}, {y+height}]")
-        
+
         if glyph_controller.data is None:
             return jsonify({'error': 'No data available'})
-        
+
         # Filtrar datos por imagen
         image_data = glyph_controller.data[glyph_controller.data['ImageName'] == image_id]
         if len(image_data) == 0:
             return jsonify({'error': f'No data found for image {image_id}'})
-        
+
         participants = sorted(image_data['participante'].unique())
-        participants_data = {}
 
-        # 🕒 IMPORTANTE: Calcular tiempo mínimo POR PARTICIPANTE
+        # 🕒 IMPORTANTE: Calcular tiempo mínimo POR PARTICIPANTE (vectorizado)
         # (normalizar tiempos relativos a cuando cada participante comenzó a ver esta imagen)
         # NOTA: NO se aplica offset de 4 segundos - los datos ya contienen tiempos correctos
-        participant_min_times = {}
-        for participant_id in participants:
-            participant_data = image_data[image_data['participante'] == participant_id]
-            if len(participant_data) > 0:
-                # Usar el tiempo mínimo de ESTA IMAGEN para ESTE PARTICIPANTE
-                # Esto normaliza a 0 segundos cuando el participante comenzó a ver esta imagen
-                min_time = pd.to_numeric(participant_data['Time'], errors='coerce').min()
-                participant_min_times[int(participant_id)] = float(min_time) if pd.notna(min_time) else 0.0
-                print(f"   ⏰ Participante {participant_id}: tiempo de inicio imagen = {participant_min_times[int(participant_id)]:.3f}s")
+        image_times = pd.to_numeric(image_data['Time'], errors='coerce')
+        participant_min_times = {
+            int(p): (float(t) if pd.notna(t) else 0.0)
+            for p, t in image_times.groupby(image_data['participante']).min().items()
+        }
 
-        # Procesar cada participante
-        for participant_id in participants:
-            participant_data = image_data[image_data['participante'] == participant_id].copy()
+        # Obtener los puntos (gaze o fixations) de toda la imagen como arrays
+        if data_type == 'fixations':
+            points = None
+            if get_precomputed_service:
+                service = get_precomputed_service()
+                points = service.get_image_fixations_frame(image_id) if service else None
+                if points is not None:
+                    print(f" Usando {len(points)} fijaciones PRE-CALCULADAS")
+
+            if points is None:
+                # FALLBACK: una sola pasada de I-VT para toda la imagen
+                print(f" Fijaciones pre-calculadas no disponibles, calculando I-VT para la imagen")
+                from fixation_detection_ivt import get_fixations_ivt
+                fixations_result = get_fixations_ivt(
+                    data=image_data,
+                    participant_id=None,
+                    image_id=None,
+                    velocity_threshold=1.15,  # UNIFICADO
+                    min_duration=0.0,         # UNIFICADO
+                    image_width=800,          # UNIFICADO
+                    image_height=600          # UNIFICADO
+                )
+                points = pd.DataFrame(fixations_result.get('fixations', []))
+
+            if len(points) == 0:
+                points = pd.DataFrame(columns=['participante', 'start', 'end', 'duration', 'x_centroid', 'y_centroid'])
+
+            point_x = points['x_centroid'].to_numpy(dtype=float)
+            point_y = points['y_centroid'].to_numpy(dtype=float)
+        else:  # data_type == 'gaze'
+            points = image_data
+            point_x = points['pixelX'].to_numpy(dtype=float)
+            point_y = points['pixelY'].to_numpy(dtype=float)
+
+        point_participants = points['participante'].to_numpy()
+
+        # Filtrar puntos dentro del área (vectorizado)
+        in_area = (
+            (point_x >= x) & (point_x <= (x + width)) &
+            (point_y >= y) & (point_y <= (y + height))
+        )
+        area_points = points[in_area]
+        area_x = point_x[in_area]
+        area_y = point_y[in_area]
+        area_participants = point_participants[in_area].astype(int)
+
+        # Clasificar región semántica con la máscara de segmentación de la imagen
+        if get_segmentation_service:
+            area_regions = get_segmentation_service().label_points(image_id, area_x, area_y, dataset_select)
+        else:
+            area_regions = np.full(len(area_x), 'unknown', dtype=object)
+
+        # Normalizar tiempos: tiempo relativo desde que el participante comenzó a ver esta imagen
+        area_offsets = np.array([participant_min_times.get(int(p), 0.0) for p in area_participants], dtype=float)
+
+        if data_type == 'fixations':
+            area_records = pd.DataFrame({
+                'x': area_x,
+                'y': area_y,
+                'duration': area_points['duration'].to_numpy(dtype=float),
+                'start': area_points['start'].to_numpy(dtype=float) - area_offsets,
+                'end': area_points['end'].to_numpy(dtype=float) - area_offsets,
+                'region': area_regions,
+                'participante': area_participants
+            })
+        else:
+            area_records = pd.DataFrame({
+                'x': area_x,
+                'y': area_y,
+                'Time': pd.to_numeric(area_points['Time'], errors='coerce').to_numpy(dtype=float) - area_offsets,
+                'region': area_regions,
+                'participante': area_participants
+            })
 
-            if len(participant_data) == 0:
-                participants_data[int(participant_id)] = {
-                    'fixations_in_area': [],
-                    'total_fixations': 0,
-                    'region_stats': {'sky': 0, 'building': 0, 'road': 0, 'unknown': 0}
-                }
-                continue
+        # Contar por región (por participante y global)
+        region_counts = area_records.groupby(['participante', 'region']).size()
+        global_region_stats = {'unknown': 0}
+        for region, count in area_records['region'].value_counts().items():
+            global_region_stats[str(region)] = int(count)
 
-            if data_type == 'fixations':
-                # Usar fijaciones I-VT
-                print(f" Processing fixations for participant {participant_id}")
-                try:
-                    from fixation_detection_ivt import get_fixations_ivt
-                    print(f" I-VT import successful")
-
-                    fixations_result = get_fixations_ivt(
-                        data=participant_data,
-                        participant_id=None,  # Ya filtrado
-                        image_id=None,        # Ya filtrado
-                        velocity_threshold=1.15,  # UNIFICADO
-                        min_duration=0.0,         # UNIFICADO
-                        image_width=800,          # UNIFICADO
-                        image_height=600          # UNIFICADO
-                    )
+        participants_data = {}
+        records_by_participant = {
+            int(p): group.drop(columns=['participante']).to_dict('records')
+            for p, group in area_records.groupby('participante')
+        }
+        for participant_id in participants:
+            participant_id_int = int(participant_id)
+            records = records_by_participant.get(participant_id_int, [])
+            region_stats = {'unknown': 0}
+            if records:
+                for region, count in region_counts.loc[participant_id_int].items():
+                    region_stats[str(region)] = int(count)
+            participants_data[participant_id_int] = {
+                'fixations_in_area': records,  # Reutilizando mismo campo para gaze
+                'total_fixations': len(records),
+                'region_stats': region_stats,
+                'data_type': data_type
+            }
 
-                    if 'fixations' in fixations_result:
-                        fixations = fixations_result['fixations']
-                    else:
-                        fixations = []
-
-                    # 🕒 NORMALIZAR TIEMPOS: restar el tiempo inicial para esta imagen/participante
-                    # Resultado: tiempos van de 0-15 segundos (el tiempo que el participante vio esta imagen)
-                    participant_id_int = int(participant_id)
-                    if participant_id_int in participant_min_times:
-                        min_time = participant_min_times[participant_id_int]
-                        for fix in fixations:
-                            if fix.get('start') is not None:
-                                fix['start'] = fix['start'] - min_time  # Sin offset de 4 segundos
-                            if fix.get('end') is not None:
-                                fix['end'] = fix['end'] - min_time      # Sin offset de 4 segundos
-
-                    print(f" DEBUG: Participant {participant_id} has {len(fixations)} total I-VT fixations")
-                    
-                    # Debug: mostrar rango de coordenadas para las primeras fijaciones
-                    if len(fixations) > 0:
-                        x_coords = [f['x_centroid'] for f in fixations[:5]]
-                        y_coords = [f['y_centroid'] for f in fixations[:5]]
-                        print(f" DEBUG: First 5 fixation coordinates - X: {x_coords}, Y: {y_coords}")
-                        print(f" DEBUG: Area bounds - X: [{x}, {x+width}], Y: [{y}, {y+height}]")
-                    
-                    # Filtrar fijaciones dentro del área
-                    fixations_in_area = []
-                    for i, fix in enumerate(fixations):
-                        fx = fix['x_centroid']
-                        fy = fix['y_centroid']
-                        
-                        print(f"  Fixation {i+1}: x={fx:.1f}, y={fy:.1f}, in_area={x <= fx <= (x + width) and y <= fy <= (y + height)}")
-                        
-                        # Verificar si la fijación está dentro del área
-                        if x <= fx <= (x + width) and y <= fy <= (y + height):
-                            # Clasificar región semántica
-                            if fy < 200:
-                                region = 'sky'
-                            elif fy < 400:
-                                region = 'building'
-                            else:
-                                region = 'road'
-                            
-                            fixations_in_area.append({
-                                'x': fx,
-                                'y': fy,
-                                'duration': fix.get('duration', 0.1),
-                                'start': fix.get('start', 0),
-                                'end': fix.get('end', 0.1),
-                                'region': region
-                            })
-                    
-                    print(f" DEBUG: Participant {participant_id} has {len(fixations_in_area)} fixations in selected area")
-                    
-                    # Contar por región
-                    region_stats = {'sky': 0, 'building': 0, 'road': 0, 'unknown': 0}
-                    for fix in fixations_in_area:
-                        region_stats[fix['region']] += 1
-                    
-                    participants_data[int(participant_id)] = {
-                        'fixations_in_area': fixations_in_area,
-                        'total_fixations': len(fixations_in_area),
-                        'region_stats': region_stats,
-                        'data_type': 'fixations'
-                    }
-                    
-                except ImportError as ie:
-                    print(f" Error importing I-VT: {ie}")
-                    return jsonify({'error': 'I-VT fixation detection not available'})
-                except Exception as fe:
-                    print(f" Error detecting fixations for participant {participant_id}: {fe}")
-                    participants_data[int(participant_id)] = {
-                        'fixations_in_area': [],
-                        'total_fixations': 0,
-                        'region_stats': {'sky': 0, 'building': 0, 'road': 0, 'unknown': 0},
-                        'error': str(fe)
-                    }
-            
-            else:  # data_type == 'gaze'
-                # Usar puntos de mirada directos
-                area_data = participant_data[
-                    (participant_data['pixelX'] >= x) &
-                    (participant_data['pixelX'] <= (x + width)) &
-                    (participant_data['pixelY'] >= y) &
-                    (participant_data['pixelY'] <= (y + height))
-                ]
-
-                gaze_points = []
-                region_stats = {'sky': 0, 'building': 0, 'road': 0, 'unknown': 0}
-
-                # 🕒 NORMALIZAR TIEMPOS: restar el tiempo inicial para esta imagen/participante
-                participant_id_int = int(participant_id)
-                min_time = participant_min_times.get(participant_id_int, 0.0)
-
-                for _, point in area_data.iterrows():
-                    px = point['pixelX']
-                    py = point['pixelY']
-
-                    # Normalizar tiempos: tiempo relativo desde que el participante comenzó a ver esta imagen
-                    raw_time = point['Time']
-                    normalized_time = raw_time - min_time  # Sin offset de 4 segundos
-
-                    # Clasificar región semántica
-                    if py < 200:
-                        region = 'sky'
-                    elif py < 400:
-                        region = 'building'
-                    else:
-                        region = 'road'
-
-                    gaze_points.append({
-                        'x': px,
-                        'y': py,
-                        'Time': normalized_time,  # Cambiar de 'time' a 'Time' para consistencia con fixations
-                        'region': region
-                    })
-                    region_stats[region] += 1
-                
-                participants_data[int(participant_id)] = {
-                    'fixations_in_area': gaze_points,  # Reutilizando mismo campo para consistencia
-                    'total_fixations': len(gaze_points),
-                    'region_stats': region_stats,
-                    'data_type': 'gaze'
-                }
-        
-        # Calcular estadísticas globales del área
-        total_points = sum(p['total_fixations'] for p in participants_data.values())
-        global_region_stats = {'sky': 0, 'building': 0, 'road': 0, 'unknown': 0}
-        for p_data in participants_data.values():
-            for region, count in p_data['region_stats'].items():
-                global_region_stats[region] += count
-        
-        #  CARGAR DATOS DE EVALUACIÓN (participant_scores) - IGUAL QUE radial-glyph
+        total_points = len(area_records)
+
+        #  DATOS DE EVALUACIÓN (participant_scores) - IGUAL QUE radial-glyph
         participant_scores = {}
-        try:
-            import json
-            eval_data_path = os.path.join(os.path.dirname(__file__), '..', '..', 'static', 'data', 'data_hololens.json')
-            if os.path.exists(eval_data_path):
-                with open(eval_data_path, 'r') as f:
-                    eval_data = json.load(f)
-                
-                # Mapear image_id con ubicación en eval_data
-                location_key = str(image_id)
-                print(f" Buscando scores para image_id: {location_key}")
-                if location_key in eval_data:
-                    location_data = eval_data[location_key]
-                    score_participants = location_data.get('score_participant', [])
-                    print(f" Participantes con scores encontrados en image {location_key}: {len(score_participants)}")
-                    
-                    # Extraer puntajes por participante (mismo formato que radial-glyph)
-                    for score_entry in score_participants:
-                        participant_id = score_entry.get('participant')
-                        score = score_entry.get('score')
-                        if participant_id is not None and score is not None:
-                            participant_scores[int(participant_id)] = {
-                                'score': float(score),
-                                'age': score_entry.get('age'),
-                                'gender': score_entry.get('gener'),  # Note: 'gener' en el JSON
-                                'state': score_entry.get('state')
-                            }
-                            print(f"  👤 Participante {participant_id}: score={score}")
-                    
-                    print(f"📋 Total participants with scores: {len(participant_scores)}")
-                else:
-                    print(f" No evaluation data found for image {image_id}")
-                    print(f"📋 Available keys: {list(eval_data.keys())[:10]}...")
-            else:
-                print(f" Evaluation data file not found at: {eval_data_path}")
-        except Exception as e:
-            print(f" Error loading evaluation data: {e}")
-        
-        # 🕒 CALCULAR TIEMPOS MÍNIMOS POR PARTICIPANTE (image_min_times)
-        image_min_times = {}
-        try:
-            print(f" Calculando image_min_times para imagen {image_id}")
-            image_data = glyph_controller.data[glyph_controller.data['ImageName'] == image_id]
-            for participant_id in image_data['participante'].unique():
-                participant_image_data = image_data[image_data['participante'] == participant_id]
-                if len(participant_image_data) > 0:
-                    min_time = pd.to_numeric(participant_image_data['Time'], errors='coerce').min()
-                    image_min_times[int(participant_id)] = float(min_time) if pd.notna(min_time) else 0.0
-                    print(f"  ⏰ Participante {participant_id}: tiempo mínimo = {image_min_times[int(participant_id)]:.3f}s")
-        except Exception as e:
-            print(f" Error calculando image_min_times: {e}")
+        scores_data = glyph_controller.data_service.get_scores_data() if get_data_service else None
+        if scores_data and str(image_id) in scores_data:
+            for score_entry in scores_data[str(image_id)].get('score_participant', []):
+                participant_id = score_entry.get('participant')
+                score = score_entry.get('score')
+                if participant_id is not None and score is not None:
+                    participant_scores[int(participant_id)] = {
+                        'score': float(score),
+                        'age': score_entry.get('age'),
+                        'gender': score_entry.get('gener'),  # Note: 'gener' en el JSON
+                        'state': score_entry.get('state')
+                    }
+        else:
+            print(f" No evaluation data found for image {image_id}")
 
         # 📊 GENERAR data_for_analysis PARA EL FRONTEND
-        # Flatten fixations_in_area de todos los participantes en una única lista
-        # (esto es lo que espera el frontend en main2.js línea 727)
-        data_for_analysis = []
-        for participant_id, p_data in participants_data.items():
-            if 'fixations_in_area' in p_data and isinstance(p_data['fixations_in_area'], list):
-                for fix in p_data['fixations_in_area']:
-                    # Agregar participante ID si no está presente
-                    if 'participante' not in fix:
-                        fix['participante'] = participant_id
-                    data_for_analysis.append(fix)
-
-        print(f" data_for_analysis generada con {len(data_for_analysis)} items")
+        # Lista única con todos los puntos del área (esto es lo que espera main2.js)
+        data_for_analysis = area_records.to_dict('records')
 
         result = {
             'area': {
@@ -1749,21 +1356,21 @@ def get_area_analysis(image_id):
             'total_participants': len(participants),
             'total_points_in_area': total_points,
             'global_region_stats': global_region_stats,
-            'participant_scores': participant_scores,      #  NUEVO: Scores de evaluación
-            'image_min_times': image_min_times,           # 🕒 NUEVO: Tiempos mínimos
+            'participant_scores': participant_scores,      #  Scores de evaluación
+            'image_min_times': participant_min_times,      # 🕒 Tiempos mínimos
             'success': True
         }
-        
+
         print(f" Area analysis completed: {total_points} points found across {len(participants)} participants")
         print(f" Global region stats: {global_region_stats}")
-        print(f"📤 Sending result with {len(participants_data)} participant entries")
-        
+
         return jsonify(clean_for_json(result))
-        
+
     except Exception as e:
         print(f" Error in area analysis: {e}")
         return jsonify({'error': f'Error analyzing area: {str(e)}'})
 
+
 @glyph_bp.route('/api/glyph/image/<int:image_id>')
 def get_image(image_id):
     """Endpoint para servir imágenes directamente desde el backend."""
@@ -2026,141 +1633,6 @@ def get_complete_glyph_data_precomputed(image_id, patch_size, service):
         print(f" Error en modo ultra-fast: {e}")
         return jsonify({'error': f'Error in precomputed mode: {str(e)}'})
 
-def _process_regions_fallback(participant_data, MIN_STAY_DURATION, MAX_STAY_DURATION, participant_id):
-    """Método fallback para procesar regiones si falla la vectorización."""
-    filtered_regions = []
-    current_group = []
-    
-    for idx, row in participant_data.iterrows():
-        current_region = str(row['main_class'])
-        current_time = safe_json_value(row['Time'], 0.0)
-        
-        current_group.append({
-            'region': current_region,
-            'time': current_time,
-            'pixelX': row['pixelX'],
-            'pixelY': row['pixelY']
-        })
-        
-        # Si cambia de región o es el último punto
-        is_last = (idx == participant_data.index[-1])
-        next_region = current_region
-        if not is_last:
-            try:
-                next_idx = participant_data.index[participant_data.index.get_loc(idx) + 1]
-                next_row = participant_data.loc[next_idx]
-                next_region = str(next_row['main_class'])
-            except:
-                next_region = current_region
-        
-        if current_region != next_region or is_last:
-            if len(current_group) > 1:
-                group_start = current_group[0]['time']
-                group_end = current_group[-1]['time']
-                duration = group_end - group_start
-                
-                # Filtrar por duración válida
-                if duration >= MIN_STAY_DURATION and duration <= MAX_STAY_DURATION:
-                    avg_x = sum(p['pixelX'] for p in current_group) / len(current_group)
-                    avg_y = sum(p['pixelY'] for p in current_group) / len(current_group)
-                    
-                    filtered_regions.append({
-                        'region': current_region,
-                        'start_time': group_start,
-                        'end_time': group_end,
-                        'duration': duration,
-                        'points': len(current_group),
-                        'centroid_x': avg_x,
-                        'centroid_y': avg_y
-                    })
-                elif len(filtered_regions) == 0:
-                    # Permitir la primera región aunque sea corta
-                    avg_x = sum(p['pixelX'] for p in current_group) / len(current_group)
-                    avg_y = sum(p['pixelY'] for p in current_group) / len(current_group)
-                    
-                    filtered_regions.append({
-                        'region': current_region,
-                        'start_time': group_start,
-                        'end_time': group_end,
-                        'duration': duration,
-                        'points': len(current_group),
-                        'centroid_x': avg_x,
-                        'centroid_y': avg_y
-                    })
-            
-            current_group = []
-    
-    print(f"  FALLBACK: Procesadas {len(filtered_regions)} regiones para participante {participant_id}")
-    return filtered_regions
-
-def _convert_regions_to_transitions_format(regions):
-    """Convertir lista de regiones a formato de transiciones esperado."""
-    if not regions:
-        return {
-            'sequence': [],
-            'region_stats': {},
-            'timeline': [],
-            'total_transitions': 0,
-            'unique_regions': 0
-        }
-
-    # Crear estadísticas por región
-    region_stats = {}
-    for region_data in regions:
-        region_name = region_data['region']
-        if region_name not in region_stats:
-            region_stats[region_name] = {
-                'total_duration': 0,
-                'visit_count': 0,
-                'first_visit': None,
-                'last_visit': None,
-                'centroid_x': region_data.get('centroid_x', 0),
-                'centroid_y': region_data.get('centroid_y', 0)
-            }
-
-        stats = region_stats[region_name]
-        stats['total_duration'] += region_data['duration']
-        stats['visit_count'] += 1
-
-        if stats['first_visit'] is None or region_data['start_time'] < stats['first_visit']:
-            stats['first_visit'] = region_data['start_time']
-        if stats['last_visit'] is None or region_data['end_time'] > stats['last_visit']:
-            stats['last_visit'] = region_data['end_time']
-
-    # Crear secuencia de transiciones
-    sequence = []
-    for i in range(1, len(regions)):
-        prev_region = regions[i-1]
-        curr_region = regions[i]
-
-        sequence.append({
-            'from_region': prev_region['region'],
-            'to_region': curr_region['region'],
-            'time': curr_region['start_time'],
-            'duration': curr_region['start_time'] - prev_region['end_time']
-        })
-
-    # Serializar timeline completo para scarf plot
-    timeline_serialized = []
-    for region in regions:
-        timeline_serialized.append({
-            'region': region.get('region', 'unknown'),
-            'start_time': float(region.get('start_time', 0.0)),
-            'end_time': float(region.get('end_time', region.get('start_time', 0.0))),
-            'duration': float(region.get('duration', 0.0)),
-            'fixation_count': int(region.get('fixation_count', 0)),
-            'centroid_x': float(region.get('centroid_x', 0.0)),
-            'centroid_y': float(region.get('centroid_y', 0.0))
-        })
-
-    return {
-        'sequence': sequence,
-        'region_stats': region_stats,
-        'timeline': timeline_serialized,
-        'total_transitions': len(sequence),
-        'unique_regions': len(region_stats)
-    }
-
 def _process_participant_with_original_method(image_id, participant_id, patch_size):
     """Procesar un participante usando el método original con datos completos."""
     try:
@@ -2175,34 +1647,19 @@ def _process_participant_with_original_method(image_id, participant_id, patch_si
         if len(participant_original) == 0:
             return {'sequence': [], 'region_stats': {}, 'timeline': [], 'total_transitions': 0, 'unique_regions': 0}
         
-        # Agregar semantic classification
-        participant_with_semantics = participant_original.copy()
-        cols = 800 // patch_size
-        participant_with_semantics['patch_x'] = (participant_with_semantics['pixelX'] // patch_size).astype(int)
-        participant_with_semantics['patch_y'] = (participant_with_semantics['pixelY'] // patch_size).astype(int)
-        participant_with_semantics['patch_index'] = participant_with_semantics['patch_y'] * cols + participant_with_semantics['patch_x']
-        
-        # Agregar clasificación semántica
-        try:
-            from app.controllers.experimentos import TopicModelingAnalyzer
-            analyzer = TopicModelingAnalyzer(patch_size=patch_size)
-            participant_with_semantics['main_class'] = 'unknown'
-            for idx, row in participant_with_semantics.iterrows():
-                try:
-                    patch_idx = int(row['patch_index'])
-                    main_class = analyzer.get_patch_main_class(patch_idx, image_id)
-                    participant_with_semantics.at[idx, 'main_class'] = main_class or 'unknown'
-                except:
-                    participant_with_semantics.at[idx, 'main_class'] = 'unknown'
-        except:
-            participant_with_semantics['main_class'] = 'unknown'
-        
+        # Clasificación semántica por patch, en orden temporal
+        participant_original = participant_original.dropna(subset=['pixelX', 'pixelY', 'Time'])
+        participant_original = participant_original.sort_values('Time', kind='mergesort')
+        xs = participant_original['pixelX'].to_numpy(dtype=float)
+        ys = participant_original['pixelY'].to_numpy(dtype=float)
+        patch_indices = (ys // patch_size).astype(np.int64) * (800 // patch_size) + (xs // patch_size).astype(np.int64)
+        codes, class_names = encode_classes(_patch_main_classes(image_id, patch_indices, patch_size))
+
         # Procesar regiones
-        fallback_regions = _process_regions_fallback(participant_with_semantics, 0.2, 5.0, participant_id)
-        if fallback_regions and len(fallback_regions) > 0:
-            return _convert_regions_to_transitions_format(fallback_regions)
-        else:
-            return {'sequence': [], 'region_stats': {}, 'timeline': [], 'total_transitions': 0, 'unique_regions': 0}
+        regions = gaze_regions(codes, participant_original['Time'].to_numpy(dtype=float), xs, ys,
+                               MIN_STAY_DURATION, MAX_STAY_DURATION)
+        print(f"  FALLBACK: Procesadas {len(regions['code'])} regiones para participante {participant_id}")
+        return regions_payload(regions, class_names)
 
     except Exception as e:
         print(f"Error processing participant {participant_id} with original method: {e}")
@@ -8,8 +8,8 @@ import numpy as np
 from flask import Blueprint, jsonify, request
 import os
 import json
-import joblib
 from app.services.fixation_detection_ivt import get_fixations_ivt
+from app.shared.fixation_labeling import assign_fixation_classes
 
 # Importar servicio compartido de datos
 try:
@@ -27,6 +27,25 @@ except ImportError as e:
     print("ADVERTENCIA: Heatmap: Servicio de fixations pre-calculadas no disponible:", str(e))
     get_precomputed_service = None
 
+# Importar cubo pre-calculado de dwell time
+from app.shared.dwell_cube_service import get_dwell_cube_service, build_dwell_block, window_pair_totals
+
+# Importar servicio de máscaras de segmentación
+try:
+    from app.shared.segmentation_service import get_segmentation_service
+    print("OK: Heatmap: Servicio de segmentación HABILITADO")
+except ImportError as e:
+    print("ADVERTENCIA: Heatmap: Servicio de segmentación no disponible:", str(e))
+    get_segmentation_service = None
+
+# Importar filtros de cohorte
+try:
+    from app.shared.cohort import get_cohort_service
+    print("OK: Heatmap: Filtros de cohorte HABILITADOS")
+except ImportError as e:
+    print("ADVERTENCIA: Heatmap: Filtros de cohorte no disponibles:", str(e))
+    get_cohort_service = None
+
 heatmap_bp = Blueprint('heatmap', __name__)
 
 class HeatmapController:
@@ -35,6 +54,20 @@ class HeatmapController:
         self.data = None
         self.scores_data = None
         self.load_data()
+        self.preload_dwell_cubes()
+
+    def preload_dwell_cubes(self):
+        """Carga al iniciar los cubos de dwell time pre-calculados (si existen y están vigentes)"""
+        if not (hasattr(self, 'data_service') and self.data_service):
+            return
+        try:
+            cube_service = get_dwell_cube_service()
+            for dataset_select in self.data_service.get_available_datasets():
+                for data_type in ['gaze', 'fixations']:
+                    if os.path.exists(cube_service.get_cube_path(dataset_select, data_type)):
+                        cube_service.get_cube(dataset_select, data_type)
+        except Exception as e:
+            print(f"ADVERTENCIA: HeatmapController: No se pudieron cargar cubos de dwell time: {e}")
 
     def load_data(self):
         """Carga datos de gaze tracking y scores"""
@@ -75,7 +108,8 @@ class HeatmapController:
             return sorted(set(participants))
         return []
 
-    def get_heatmap_data(self, image_id, top_n_clases=15, data_type='gaze', dataset_select='main_class', image_name=None, mode='attention'):
+    def get_heatmap_data(self, image_id, top_n_clases=15, data_type='gaze', dataset_select='main_class', image_name=None, mode='attention', cohort=None,
+                         t_start=None, t_end=None):
         """
         Calcula la matriz de densidad ponderada o tiempo total para una imagen
 
@@ -86,6 +120,9 @@ class HeatmapController:
             dataset_select: Columna a usar para clasificación ('main_class' o 'grupo')
             image_name: ImageName de la imagen (usado para buscar en scores/JSON) - DEPRECATED, use image_id
             mode: 'attention' para densidad, 'time' para tiempo total por clase
+            cohort: filtros de cohorte (dict de parse_cohort_args); None = todos los participantes
+            t_start, t_end: ventana temporal en segundos desde el inicio de la visualización
+                (None = sin límite); solo cuentan las muestras con tiempo en [t_start, t_end)
 
         Returns:
             Dict con la matriz de densidad/tiempo y metadatos
@@ -127,274 +164,84 @@ class HeatmapController:
         print(f"  Using columns: class={class_column}, id={class_id_column}, color={color_column}")
 
         try:
-            # Obtener los 10 participantes oficiales
-            valid_participants = self.get_valid_participants_for_image(image_id)
-            if not valid_participants:
-                return {'error': f'No valid participants found for image {image_id}'}
-
-            # Filtrar datos por ImageName y participantes válidos
-            df_filtered = current_data[
-                (current_data['ImageName'] == image_id) &
-                (current_data['participante'].isin(valid_participants))
-            ].copy()
-
-            if len(df_filtered) == 0:
-                return {'error': f'No data for image {image_id}'}
-
-            # Eliminar puntos sin clasificación
-            df_filtered = df_filtered[
-                (df_filtered[class_column].notna()) &
-                (df_filtered[class_column].astype(str).str.strip() != '')
-            ].copy()
-
-            if len(df_filtered) == 0:
-                return {'error': f'No classified data for image {image_id}'}
-
-            print(f"DEBUG: df_filtered has {len(df_filtered)} points after classification filter")
-            print(f"DEBUG: Sample {class_column} values: {df_filtered[class_column].unique()[:5]}")
-
-            # Si se solicita procesar fixations, detectarlas primero
-            if data_type == 'fixations':
-                print(f"Processing heatmap data as FIXATIONS")
-
-                # PRIORIDAD 1: Intentar usar fijaciones pre-calculadas
-                fixations_list = []
-                use_precomputed = False
-
-                if get_precomputed_service:
-                    try:
-                        service = get_precomputed_service()
-                        if service and service.fixations_df is not None:
-                            # Filtrar fijaciones pre-calculadas para esta imagen y participantes válidos
-                            precomputed_fixations = service.fixations_df[
-                                (service.fixations_df['ImageName'] == image_id) &
-                                (service.fixations_df['participante'].isin(valid_participants))
-                            ].copy()
-
-                            if len(precomputed_fixations) > 0:
-                                print(f"✓ Usando {len(precomputed_fixations)} fijaciones PRE-CALCULADAS")
-                                # Convertir a formato esperado
-                                fixations_list = precomputed_fixations.to_dict('records')
-                                use_precomputed = True
-                    except Exception as e:
-                        print(f"⚠ Error usando fixations pre-calculadas: {e}")
-
-                # FALLBACK: Si no hay pre-calculadas, usar I-VT en tiempo real
-                if not use_precomputed:
-                    print(f"⚠ Calculando fijaciones en TIEMPO REAL con I-VT")
-                    fixations_result = get_fixations_ivt(
-                        data=df_filtered,
-                        participant_id=None,
-                        image_id=None,
-                        velocity_threshold=1.15,
-                        min_duration=0.0,
-                        image_width=800,
-                        image_height=600
-                    )
-                    fixations_list = fixations_result.get('fixations', [])
-
-                print(f"Total fixations para heatmap: {len(fixations_list)}")
-
-                if not fixations_list:
-                    return {'error': f'No fixations detected for image {image_id}'}
-
-                # Convertir fixations a formato compatible
-                # Para cada fixation, asignar el main_class más común de los puntos que caen dentro del radio de fijación
-                data_to_process = []
-                fixation_radius = 50  # radio en pixels para buscar puntos cercanos
-
-                for fix in fixations_list:
-                    # Encontrar gaze points que caen en este fixation
-                    participant_id = fix.get('participante')
-                    x_centroid = fix.get('x_centroid', 0)
-                    y_centroid = fix.get('y_centroid', 0)
-                    duration = fix.get('duration', 0)
-                    start_time = fix.get('start', 0)
-
-                    # Buscar main_class más común en los puntos CERCANOS a esta fixation
-                    participant_points = df_filtered[df_filtered['participante'] == participant_id]
-
-                    if len(participant_points) > 0:
-                        # Calcular distancia a cada punto
-                        distances = np.sqrt(
-                            (participant_points['pixelX'] - x_centroid)**2 +
-                            (participant_points['pixelY'] - y_centroid)**2
-                        )
-
-                        # Filtrar puntos dentro del radio de fixation
-                        nearby_mask = distances <= fixation_radius
-                        nearby_points = participant_points[nearby_mask]
-
-                        if len(nearby_points) > 0:
-                            # Usar la clase más común de los puntos cercanos
-                            class_value = nearby_points[class_column].mode()
-                            class_value = class_value[0] if len(class_value) > 0 else 'unknown'
-                        else:
-                            # Si no hay puntos cercanos, usar el punto más cercano
-                            closest_idx = distances.idxmin()
-                            class_value = participant_points.loc[closest_idx, class_column]
-                    else:
-                        class_value = 'unknown'
-
-                    # Obtener ratio promedio para esta clase
-                    class_points = df_filtered[df_filtered[class_column] == class_value]
-                    ratio_value = class_points['ratio'].mean() if len(class_points) > 0 else 1.0
-
-                    # Construir data_to_process con la columna correcta
-                    data_row = {
-                        'participante': participant_id,
-                        class_column: class_value,
-                        'delta_t': duration,  # duration ya es el tiempo de la fixation
-                        'ratio': ratio_value
-                    }
-                    data_to_process.append(data_row)
-
-                    print(f"Fixation P{participant_id}: ({x_centroid:.1f}, {y_centroid:.1f}) -> {class_column}={class_value}, duration={duration:.3f}s")
-
-                # Crear dataframe con los datos para procesar
-                df_sorted = pd.DataFrame(data_to_process)
-                print(f"Converted {len(df_sorted)} fixations to processable format")
-            else:
-                # Procesar como gaze points (código original)
-                # Ordenar por participante, imagen y tiempo
-                df_sorted = df_filtered.sort_values(
-                    by=['participante', 'ImageIndex', 'Time']
-                ).reset_index(drop=True)
-
-            # Calcular delta_t (duración de cada punto) - solo para gaze, fixations ya lo tienen
-            if data_type != 'fixations':
-                df_sorted['_bloque'] = df_sorted['participante'].astype(str) + '||' + \
-                                       df_sorted['ImageIndex'].astype(str)
-                df_sorted['Time_next'] = df_sorted.groupby('_bloque')['Time'].shift(-1)
-                df_sorted['delta_t'] = df_sorted['Time_next'] - df_sorted['Time']
-                df_sorted['delta_t'] = df_sorted['delta_t'].fillna(0.0)
-            else:
-                # Para fixations, delta_t ya existe como 'duration'
-                if 'delta_t' not in df_sorted.columns:
-                    df_sorted['delta_t'] = 0.0
-
-            # Agrupar por (participante, class_column) y sumar delta_t
-            print(f"DEBUG: df_sorted has {len(df_sorted)} rows before groupby")
-            print(f"DEBUG: df_sorted columns: {list(df_sorted.columns)}")
-            print(f"DEBUG: df_sorted has {class_column}: {class_column in df_sorted.columns}")
-            if len(df_sorted) > 0:
-                print(f"DEBUG: Sample delta_t values: {df_sorted['delta_t'].head()}")
-                print(f"DEBUG: Sample {class_column} values in df_sorted: {df_sorted[class_column].unique()[:5]}")
-
-            por_participante_clase = (
-                df_sorted
-                .groupby(['participante', class_column], dropna=False)['delta_t']
-                .sum()
-                .reset_index()
-                .rename(columns={'delta_t': 'time_por_clase'})
+            # Bloque pre-calculado (o calculado una vez) del cubo de dwell time
+            block = get_dwell_cube_service().get_block(
+                dataset_select, data_type, image_id,
+                lambda: self.build_dwell_block(image_id, data_type, current_data, class_column, class_id_column, color_column)
             )
-
-            print(f"DEBUG: por_participante_clase has {len(por_participante_clase)} rows after groupby")
-
-            # Obtener ratio de cada class en la imagen
-            # Si la columna ratio no tiene datos válidos, usar 1.0 como default
-            if 'ratio' in df_filtered.columns:
-                ratio_por_clase = (
-                    df_filtered[[class_column, 'ratio']]
-                    .dropna(subset=[class_column, 'ratio'])
-                    .groupby(class_column)['ratio']
-                    .mean()
-                    .to_dict()
+            if 'error' in block:
+                return {'error': block['error']}
+
+            valid_participants = block['valid_participants']
+            pair_participants = block['pair_participants']
+            pair_classes = block['pair_classes']
+            pair_time = block['pair_time']
+            ranked_classes = block['ranked_classes']
+            ratio_por_clase = dict(block['ratio_by_class'])
+            pair_mask = None
+
+            # Ventana temporal: dwell por par con búsqueda binaria en los arrays acumulados
+            time_window = t_start is not None or t_end is not None
+            if time_window:
+                pair_time, pair_count = window_pair_totals(block, t_start, t_end)
+                pair_mask = pair_count > 0
+
+            # Cohorte: máscara de participantes sobre los pares pre-calculados del bloque
+            if cohort and get_cohort_service:
+                cohort_service = get_cohort_service()
+                valid_participants = [
+                    p for p, keep in zip(valid_participants, cohort_service.participant_mask(valid_participants, cohort, image_id))
+                    if keep
+                ]
+                if not valid_participants:
+                    return {'error': f'No participants match the cohort filters for image {image_id}'}
+
+                cohort_mask = cohort_service.participant_mask(pair_participants, cohort, image_id)
+                pair_mask = cohort_mask if pair_mask is None else pair_mask & cohort_mask
+
+            if pair_mask is not None:
+                pair_participants = pair_participants[pair_mask]
+                pair_classes = pair_classes[pair_mask]
+                pair_time = pair_time[pair_mask]
+
+                # Ranking de clases por tiempo total dentro de la cohorte / ventana
+                ranked_classes = (
+                    pd.Series(pair_time)
+                    .groupby(pd.Series(pair_classes, dtype=object))
+                    .sum()
+                    .sort_values(ascending=False)
+                    .index.tolist()
                 )
-            else:
-                ratio_por_clase = {}
+                if not ranked_classes:
+                    return {'error': f'No data for image {image_id} in the selected cohort or time window'}
 
-            print(f"DEBUG: ratio_por_clase has {len(ratio_por_clase)} entries")
+            print(f"DEBUG: dwell block has {len(pair_classes)} (participante, clase) pairs, {len(ratio_por_clase)} ratios")
 
             # Decidir las clases a mostrar BASADO EN TIEMPO TOTAL (consistente entre modos)
-            # Obtener top N clases por tiempo total en la imagen
-            suma_total_tiempo = (
-                por_participante_clase
-                .groupby(class_column)['time_por_clase']
-                .sum()
-                .reset_index()
-                .rename(columns={'time_por_clase': 'total_time_global'})
-                .sort_values(by='total_time_global', ascending=False)
-            )
-            top_clases = [str(c).strip() for c in suma_total_tiempo.head(top_n_clases)[class_column].tolist()]
+            # El ranking por tiempo total en la imagen ya está pre-calculado
+            top_clases = [str(c).strip() for c in ranked_classes[:top_n_clases]]
 
             # --- CÁLCULO DE RATIO DINÁMICO ---
             if mode == 'attention':
-                # Cargar el pkl solo si es necesario
-                segmentation_array = None
-                pkl_path = os.path.join(os.path.dirname(__file__), '..', '..', 'static', 'images', 'images', 'datos_seg', f"{image_id}.pkl")
-
-                for clase in top_clases:
-                    if clase not in ratio_por_clase:
-                        print(f"ADVERTENCIA: Ratio no encontrado para la clase '{clase}'. Calculando dinámicamente...")
-                        if segmentation_array is None:
-                            if os.path.exists(pkl_path):
-                                try:
-                                    segmentation_array = joblib.load(pkl_path)
-                                except Exception as e:
-                                    print(f"ERROR: No se pudo cargar {pkl_path}: {e}")
-                                    break
-                            else:
-                                print(f"ERROR: No se encontró el archivo de segmentación: {pkl_path}")
-                                break
-                        
-                        # Encontrar el class_id para esta `clase` (que puede ser un group_name)
-                        class_id_rows = df_filtered[df_filtered[class_column] == clase][class_id_column]
-                        if not class_id_rows.empty:
-                            cid = class_id_rows.iloc[0]
-                            class_pixels = np.sum(segmentation_array == cid)
-                            total_pixels = segmentation_array.size
-                            calculated_ratio = class_pixels / total_pixels if total_pixels > 0 else 0
-                            ratio_por_clase[clase] = calculated_ratio
-                            print(f"✓ Ratio calculado para '{clase}' (ID: {cid}): {calculated_ratio:.4f}")
-                        else:
-                            print(f"ERROR: No se pudo encontrar un class_id para la clase '{clase}'")
-
-
-            # Calcular densidad ponderada
-            def obtener_ratio(row):
-                # Si no hay ratio, usar 1.0 por defecto para que densidad = tiempo
-                return ratio_por_clase.get(row[class_column], 1.0)
-
-            por_participante_clase['class_ratio'] = \
-                por_participante_clase.apply(obtener_ratio, axis=1)
-
-            def calcular_densidad(row):
-                r = row['class_ratio']
-                if pd.isna(r) or r == 0:
-                    return row['time_por_clase']  # Si ratio es inválido, usar tiempo directamente
-                return row['time_por_clase'] / r
-
-            por_participante_clase['density'] = \
-                por_participante_clase.apply(calcular_densidad, axis=1)
-
-            # Filtrar para obtener solo las clases top
-            por_participante_clase_top = por_participante_clase[
-                por_participante_clase[class_column].isin(top_clases)
-            ].copy()
-
-            # Crear matriz: filas=class_column, columnas=participantes
-            # Usar 'density' para modo 'attention' o 'time_por_clase' para modo 'time'
-            print('POR IMAGEN CLASE HEATMAP')
-            print(por_participante_clase_top.loc[por_participante_clase_top['participante'] == 16])
-
-            matrix_values = 'density' if mode == 'attention' else 'time_por_clase'
-            matriz = por_participante_clase_top.pivot_table(
-                index=class_column,
-                columns='participante',
-                values=matrix_values,
-                aggfunc='first',
-                fill_value=0.0
-            )
+                self.resolve_class_ratios(block, image_id, top_clases, ratio_por_clase)
 
-            # Asegurar que todas las clases top estén presentes
-            matriz = matriz.reindex(top_clases, fill_value=0.0)
-
-            # Asegurar que todos los participantes válidos estén presentes
-            for p in valid_participants:
-                if p not in matriz.columns:
-                    matriz[p] = 0.0
-            matriz = matriz[sorted(valid_participants)]
+            # Valores por par (participante, clase): densidad ponderada o tiempo total
+            pair_values = pair_time
+            if mode == 'attention':
+                # Si no hay ratio, usar 1.0 por defecto para que densidad = tiempo
+                pair_ratios = np.array([ratio_por_clase.get(c, 1.0) for c in pair_classes], dtype=float)
+                invalid_ratio = np.isnan(pair_ratios) | (pair_ratios == 0)
+                pair_values = np.where(invalid_ratio, pair_values, pair_values / np.where(invalid_ratio, 1.0, pair_ratios))
+
+            # Crear matriz: filas=clases top, columnas=participantes válidos (slicing del bloque)
+            row_index = {clase: i for i, clase in enumerate(top_clases)}
+            col_index = {p: j for j, p in enumerate(valid_participants)}
+            matriz = np.zeros((len(top_clases), len(valid_participants)), dtype=float)
+            for participant, clase, value in zip(pair_participants, pair_classes, pair_values):
+                i = row_index.get(clase)
+                j = col_index.get(participant)
+                if i is not None and j is not None:
+                    matriz[i, j] = value
 
             print(f"[HEATMAP DEBUG] mode={mode}, top_clases count={len(top_clases)}, top_clases={top_clases}")
             print(f"[HEATMAP DEBUG] matriz shape={matriz.shape}")
@@ -402,37 +249,336 @@ class HeatmapController:
 
             # Normalizar matriz para visualización (0-1)
             matriz_norm = matriz.copy()
-            max_val = matriz_norm.max().max()
+            max_val = matriz_norm.max()
             if max_val > 0:
                 matriz_norm = matriz_norm / max_val
 
             # Obtener colores para cada clase según el dataset_select
-            class_colors = {}
-            for clase in top_clases:
-                color_rows = df_filtered[df_filtered[class_column] == clase][color_column].dropna()
-                if len(color_rows) > 0:
-                    class_colors[clase] = color_rows.iloc[0]
-                else:
-                    class_colors[clase] = '#999999'  # Color por defecto
+            class_colors = {
+                clase: block['color_by_class'].get(clase, '#999999')  # Color por defecto
+                for clase in top_clases
+            }
 
-            return {
+            result = {
                 'status': 'success',
                 'image_id': int(image_id),
-                'participants': sorted(valid_participants),
+                'participants': valid_participants,
                 'classes': top_clases,
-                'matrix_raw': matriz.values.tolist(),
-                'matrix_normalized': matriz_norm.values.tolist(),
-                'min_value': float(matriz.min().min()),
-                'max_value': float(matriz.max().max()),
-                'total_data_points': len(df_filtered),
+                'matrix_raw': matriz.tolist(),
+                'matrix_normalized': matriz_norm.tolist(),
+                'min_value': float(matriz.min()),
+                'max_value': float(matriz.max()),
+                'total_data_points': block['total_data_points'],
                 'class_colors': class_colors
             }
+            if time_window:
+                result['time_window'] = {'t_start': t_start, 't_end': t_end}
+            return result
 
         except Exception as e:
             import traceback
             traceback.print_exc()
             return {'error': f'Error processing heatmap data: {str(e)}'}
 
+    def resolve_class_ratios(self, block, image_id, classes, ratio_por_clase):
+        """
+        Completa ratio_por_clase con el ratio de píxeles de las clases que no lo tienen
+
+        Usa los ratios por class_id pre-calculados (o calculados una vez por máscara).
+        """
+        if not get_segmentation_service:
+            return ratio_por_clase
+        segmentation_service = get_segmentation_service()
+
+        for clase in classes:
+            if clase not in ratio_por_clase:
+                print(f"ADVERTENCIA: Ratio no encontrado para la clase '{clase}'. Calculando dinámicamente...")
+
+                # Encontrar el class_id para esta `clase` (que puede ser un group_name)
+                if clase in block['class_id_by_class']:
+                    cid = block['class_id_by_class'][clase]
+                    calculated_ratio = segmentation_service.get_class_ratio(image_id, cid)
+                    if calculated_ratio is None:
+                        print(f"ERROR: No hay máscara de segmentación para la imagen {image_id}")
+                        break
+                    ratio_por_clase[clase] = calculated_ratio
+                    print(f"✓ Ratio calculado para '{clase}' (ID: {cid}): {calculated_ratio:.4f}")
+                else:
+                    print(f"ERROR: No se pudo encontrar un class_id para la clase '{clase}'")
+        return ratio_por_clase
+
+    def get_comparison_data(self, image_ids, top_n_clases=15, data_type='gaze', dataset_select='main_class',
+                            mode='attention', layout='participants'):
+        """
+        Matrices alineadas de varias imágenes con un eje de clases compartido
+
+        Concatena los pares (participante, clase) de los bloques del cubo de dwell
+        time y arma todas las matrices con una sola acumulación vectorizada.
+
+        Args:
+            image_ids: lista de ImageName a comparar
+            top_n_clases: clases a mostrar (ranking por tiempo total en todas las imágenes)
+            layout: 'participants' (una matriz clase × participante por imagen)
+                o 'images' (una matriz clase × imagen sumando participantes)
+
+        Returns:
+            Dict con las matrices (escala normalizada común a todas las imágenes)
+        """
+        print(f"HeatmapController.get_comparison_data({len(image_ids)} imágenes, data_type={data_type}, dataset_select={dataset_select}, layout={layout})")
+
+        if hasattr(self, 'data_service') and self.data_service:
+            current_data = self.data_service.get_data_by_dataset(dataset_select)
+            columns = self.data_service.get_class_columns(dataset_select, current_data) if current_data is not None else None
+        else:
+            current_data = self.data
+            columns = ('main_class', 'class_id', 'hex_color')
+
+        if current_data is None:
+            return {'error': 'No data available'}
+        if columns is None:
+            return {'error': 'No group column found in dataset'}
+        class_column, class_id_column, color_column = columns
+
+        try:
+            # Bloques del cubo (pre-calculados o calculados una vez por imagen)
+            cube_service = get_dwell_cube_service()
+            blocks = []
+            skipped_images = []
+            for image_id in image_ids:
+                block = cube_service.get_block(
+                    dataset_select, data_type, image_id,
+                    lambda image_id=image_id: self.build_dwell_block(image_id, data_type, current_data, class_column, class_id_column, color_column)
+                )
+                if 'error' in block:
+                    skipped_images.append(int(image_id))
+                else:
+                    blocks.append((int(image_id), block))
+
+            if not blocks:
+                return {'error': 'No data for the requested images', 'skipped_images': skipped_images}
+
+            # Pares de todas las imágenes concatenados
+            image_list = [image_id for image_id, _ in blocks]
+            pair_image = np.repeat(np.arange(len(blocks)), [len(block['pair_time']) for _, block in blocks])
+            pair_participants = np.concatenate([block['pair_participants'] for _, block in blocks])
+            pair_time = np.concatenate([block['pair_time'] for _, block in blocks])
+            pair_classes = pd.Series(
+                np.concatenate([block['pair_classes'] for _, block in blocks]), dtype=object
+            ).str.strip()
+
+            # Eje de clases compartido: ranking por tiempo total en todas las imágenes
+            class_codes, class_values = pd.factorize(pair_classes)
+            classified = class_codes >= 0
+            class_totals = np.bincount(class_codes[classified], weights=pair_time[classified], minlength=len(class_values))
+            top_codes = np.argsort(-class_totals, kind='stable')[:top_n_clases]
+            top_clases = [str(class_values[code]) for code in top_codes]
+
+            # Ratio de cada (imagen, clase top); 1.0 si no hay ratio válido (densidad = tiempo)
+            ratios = np.ones((len(blocks), len(class_values)), dtype=float)
+            if mode == 'attention':
+                for i, (image_id, block) in enumerate(blocks):
+                    ratio_por_clase = {str(c).strip(): r for c, r in block['ratio_by_class'].items()}
+                    block_view = {'class_id_by_class': {str(c).strip(): cid for c, cid in block['class_id_by_class'].items()}}
+                    present = set(pair_classes[pair_image == i].dropna())
+                    self.resolve_class_ratios(block_view, image_id, [c for c in top_clases if c in present], ratio_por_clase)
+                    for code in top_codes:
+                        ratio = ratio_por_clase.get(str(class_values[code]), 1.0)
+                        if ratio is not None and not np.isnan(ratio) and ratio != 0:
+                            ratios[i, code] = ratio
+
+            # Fila de cada par (-1 si su clase no está en el top)
+            row_of_code = np.full(len(class_values), -1, dtype=np.int64)
+            row_of_code[top_codes] = np.arange(len(top_codes))
+            pair_rows = np.where(classified, row_of_code[np.where(classified, class_codes, 0)], -1)
+            keep = pair_rows >= 0
+            pair_values = pair_time[keep] / ratios[pair_image[keep], class_codes[keep]]
+
+            result = {
+                'status': 'success',
+                'layout': layout,
+                'mode': mode,
+                'image_ids': image_list,
+                'classes': top_clases,
+                'skipped_images': skipped_images
+            }
+
+            if layout == 'images':
+                # Clase × imagen (suma sobre participantes)
+                matriz = np.zeros((len(top_codes), len(blocks)), dtype=float)
+                np.add.at(matriz, (pair_rows[keep], pair_image[keep]), pair_values)
+            else:
+                # Una matriz clase × participante por imagen, con columnas comunes
+                participants = sorted({p for _, block in blocks for p in block['valid_participants']})
+                participant_col = {p: j for j, p in enumerate(participants)}
+                pair_cols = np.array([participant_col.get(p, -1) for p in pair_participants[keep]], dtype=np.int64)
+                in_columns = pair_cols >= 0
+
+                matriz = np.zeros((len(blocks), len(top_codes), len(participants)), dtype=float)
+                np.add.at(
+                    matriz,
+                    (pair_image[keep][in_columns], pair_rows[keep][in_columns], pair_cols[in_columns]),
+                    pair_values[in_columns]
+                )
+                result['participants'] = participants
+                result['participants_by_image'] = {
+                    str(image_id): list(block['valid_participants']) for image_id, block in blocks
+                }
+
+            # Escala común para que las imágenes sean comparables
+            max_val = matriz.max() if matriz.size > 0 else 0.0
+            matriz_norm = matriz / max_val if max_val > 0 else matriz.copy()
+
+            # Color de cada clase (primer bloque que lo tenga)
+            class_colors = {}
+            for _, block in blocks:
+                for clase, color in block['color_by_class'].items():
+                    class_colors.setdefault(str(clase).strip(), color)
+
+            result.update({
+                'matrix_raw': matriz.tolist(),
+                'matrix_normalized': matriz_norm.tolist(),
+                'min_value': float(matriz.min()) if matriz.size > 0 else 0.0,
+                'max_value': float(max_val),
+                'total_data_points': int(sum(block['total_data_points'] for _, block in blocks)),
+                'class_colors': {clase: class_colors.get(clase, '#999999') for clase in top_clases}
+            })
+            return result
+
+        except Exception as e:
+            import traceback
+            traceback.print_exc()
+            return {'error': f'Error processing heatmap comparison: {str(e)}'}
+
+    def build_dwell_block(self, image_id, data_type, current_data, class_column, class_id_column, color_column):
+        """
+        Construye el bloque del cubo de dwell time de una imagen
+
+        Filtra los puntos válidos y clasificados, detecta/etiqueta fixations si
+        corresponde y calcula delta_t por muestra.
+
+        Returns:
+            dict del bloque (ver build_dwell_block en dwell_cube_service) o {'error': ...}
+        """
+        # Obtener los 10 participantes oficiales
+        valid_participants = self.get_valid_participants_for_image(image_id)
+        if not valid_participants:
+            return {'error': f'No valid participants found for image {image_id}'}
+
+        # Filtrar datos por ImageName y participantes válidos
+        df_filtered = current_data[
+            (current_data['ImageName'] == image_id) &
+            (current_data['participante'].isin(valid_participants))
+        ].copy()
+
+        if len(df_filtered) == 0:
+            return {'error': f'No data for image {image_id}'}
+
+        # Eliminar puntos sin clasificación
+        df_filtered = df_filtered[
+            (df_filtered[class_column].notna()) &
+            (df_filtered[class_column].astype(str).str.strip() != '')
+        ].copy()
+
+        if len(df_filtered) == 0:
+            return {'error': f'No classified data for image {image_id}'}
+
+        print(f"DEBUG: df_filtered has {len(df_filtered)} points after classification filter")
+        print(f"DEBUG: Sample {class_column} values: {df_filtered[class_column].unique()[:5]}")
+
+        # Si se solicita procesar fixations, detectarlas primero
+        if data_type == 'fixations':
+            print(f"Processing heatmap data as FIXATIONS")
+
+            # PRIORIDAD 1: Intentar usar fijaciones pre-calculadas (fixation.csv)
+            fixations_frame = None
+            use_precomputed = False
+
+            if get_precomputed_service:
+                try:
+                    service = get_precomputed_service()
+                    precomputed_fixations = service.get_image_fixations_frame(image_id) if service else None
+                    if precomputed_fixations is not None:
+                        # Solo participantes válidos de la imagen
+                        precomputed_fixations = precomputed_fixations[
+                            precomputed_fixations['participante'].isin(valid_participants)
+                        ].reset_index(drop=True)
+
+                        if len(precomputed_fixations) > 0:
+                            print(f"✓ Usando {len(precomputed_fixations)} fijaciones PRE-CALCULADAS")
+                            fixations_frame = precomputed_fixations
+                            use_precomputed = True
+                except Exception as e:
+                    print(f"⚠ Error usando fixations pre-calculadas: {e}")
+
+            # FALLBACK: Si no hay pre-calculadas, usar I-VT en tiempo real
+            if not use_precomputed:
+                print(f"⚠ Calculando fijaciones en TIEMPO REAL con I-VT")
+                fixations_result = get_fixations_ivt(
+                    data=df_filtered,
+                    participant_id=None,
+                    image_id=None,
+                    velocity_threshold=1.15,
+                    min_duration=0.0,
+                    image_width=800,
+                    image_height=600
+                )
+                fixations_frame = pd.DataFrame(fixations_result.get('fixations', []))
+
+            print(f"Total fixations para heatmap: {len(fixations_frame)}")
+
+            if len(fixations_frame) == 0:
+                return {'error': f'No fixations detected for image {image_id}'}
+
+            # Convertir fixations a formato compatible
+            # Para cada fixation, asignar el main_class más común de los puntos que caen dentro del radio de fijación
+            # (en lote: KD-tree por participante en lugar de distancias a todos los puntos)
+            class_values = assign_fixation_classes(
+                fixations_frame['participante'].to_numpy(),
+                fixations_frame['x_centroid'].to_numpy(dtype=float),
+                fixations_frame['y_centroid'].to_numpy(dtype=float),
+                df_filtered,
+                class_column
+            )
+
+            # Inicio de la visualización de cada participante: mínimo entre gaze y fixations
+            fixation_starts = (
+                fixations_frame['start'].astype(float)
+                if 'start' in fixations_frame.columns else pd.Series(np.nan, index=fixations_frame.index)
+            )
+            viewing_start = pd.concat([
+                df_filtered.groupby('participante')['Time'].min(),
+                fixation_starts.groupby(fixations_frame['participante']).min()
+            ]).groupby(level=0).min()
+
+            # Construir data_to_process con la columna correcta
+            df_sorted = pd.DataFrame({
+                'participante': fixations_frame['participante'].to_numpy(),
+                class_column: class_values,
+                'delta_t': fixations_frame['duration'].to_numpy(dtype=float),  # duration ya es el tiempo de la fixation
+                'sample_time': (fixation_starts - fixations_frame['participante'].map(viewing_start)).to_numpy(dtype=float)
+            })
+            print(f"Converted {len(df_sorted)} fixations to processable format")
+        else:
+            # Procesar como gaze points (código original)
+            # Ordenar por participante, imagen y tiempo
+            df_sorted = df_filtered.sort_values(
+                by=['participante', 'ImageIndex', 'Time']
+            ).reset_index(drop=True)
+
+        # Calcular delta_t (duración de cada punto) - solo para gaze, fixations ya lo tienen
+        if data_type != 'fixations':
+            df_sorted['Time_next'] = df_sorted.groupby(['participante', 'ImageIndex'], sort=False, dropna=False)['Time'].shift(-1)
+            df_sorted['delta_t'] = df_sorted['Time_next'] - df_sorted['Time']
+            df_sorted['delta_t'] = df_sorted['delta_t'].fillna(0.0)
+            # Tiempo relativo al inicio de la visualización (para ventanas t_start/t_end)
+            df_sorted['sample_time'] = df_sorted['Time'] - df_sorted.groupby('participante')['Time'].transform('min')
+        else:
+            # Para fixations, delta_t ya existe como 'duration'
+            if 'delta_t' not in df_sorted.columns:
+                df_sorted['delta_t'] = 0.0
+
+        return build_dwell_block(df_sorted, df_filtered, class_column, class_id_column, color_column, valid_participants)
+
 # Instancia global
 heatmap_controller = HeatmapController()
 
@@ -9,6 +9,16 @@ import numpy as np
 from flask import Blueprint, jsonify, request
 import os
 from app.services.fixation_detection_ivt import get_fixations_ivt
+from app.shared.fixation_labeling import assign_fixation_classes, first_value_by_class
+from app.shared.scarf_segments import (
+    build_segments, build_fixation_segments, lod_min_duration, SCARF_DURATION_MS,
+    run_length_encode, merge_short_segments, pair_offsets, segments_from_arrays, DEFAULT_SEGMENT_COLOR
+)
+from app.shared.result_cache import ResultCache
+from app.shared.scanpath_similarity import (
+    similarity_matrix, collapse_repeats, patch_sequence, patch_substitution
+)
+from app.shared.seriation import seriate
 
 # Importar servicio compartido de datos
 try:
@@ -18,8 +28,49 @@ except ImportError as e:
     print("ADVERTENCIA: ScarfPlot: Servicio compartido no disponible:", str(e))
     get_data_service = None
 
+# Importar etiquetas pre-calculadas de fixations
+try:
+    from app.shared.fixation_label_service import get_fixation_label_service
+    print("OK: ScarfPlot: Etiquetas pre-calculadas de fixations HABILITADAS")
+except ImportError as e:
+    print("ADVERTENCIA: ScarfPlot: Etiquetas pre-calculadas no disponibles:", str(e))
+    get_fixation_label_service = None
+
+# Importar timelines pre-calculados (memory-mapped)
+try:
+    from app.shared.timeline_store import get_timeline_store
+    print("OK: ScarfPlot: Timelines pre-calculados HABILITADOS")
+except ImportError as e:
+    print("ADVERTENCIA: ScarfPlot: Timelines pre-calculados no disponibles:", str(e))
+    get_timeline_store = None
+
+# Importar cubo de transiciones pre-calculado
+try:
+    from app.shared.transition_cube import get_transition_cube_service, build_transition_arrays, sum_transitions
+    print("OK: ScarfPlot: Cubo de transiciones HABILITADO")
+except ImportError as e:
+    print("ADVERTENCIA: ScarfPlot: Cubo de transiciones no disponible:", str(e))
+    get_transition_cube_service = None
+
+# Importar filtros de cohorte
+try:
+    from app.shared.cohort import get_cohort_service
+    print("OK: ScarfPlot: Filtros de cohorte HABILITADOS")
+except ImportError as e:
+    print("ADVERTENCIA: ScarfPlot: Filtros de cohorte no disponibles:", str(e))
+    get_cohort_service = None
+
 scarf_bp = Blueprint('scarf_plot', __name__)
 
+# Secuencias de scanpath soportadas: clases semánticas o patches de la grilla
+SCANPATH_SEQUENCES = ['class', 'patch']
+
+# Matrices de similitud entre scanpaths por (imagen, dataset, tipo, secuencia, patch, método, participantes)
+scanpath_similarity_cache = ResultCache(
+    'scanpath_similarity', max_entries=1024, max_bytes=32 * 1024 * 1024,
+    sizeof=lambda result: 64 + 8 * len(result['participants']) ** 2
+)
+
 class ScarfPlotController:
     def __init__(self, csv_path='static/data/df_final1.csv'):
         self.csv_path = csv_path
@@ -27,7 +78,12 @@ class ScarfPlotController:
         self.color_mapping = {}
         self.grupo_color_mapping = {}
         self.scores_data = None
+        # Tablas de gaze clasificadas y ordenadas por (imagen, participante, Time), por dataset
+        self.timeline_tables = {}
         self.load_data()
+        # Abrir (memory-map) los timelines pre-calculados al iniciar
+        if get_timeline_store:
+            get_timeline_store()
 
     def load_data(self):
         """Carga datos de gaze tracking y scores"""
@@ -100,7 +156,116 @@ class ScarfPlotController:
             return sorted(set(participants))
         return []
 
-    def get_scarf_plot_data(self, image_id, participant_id=None, data_type='gaze', dataset_select='main_class', image_name=None):
+    def get_labeled_fixations(self, image_id, dataset_select, filtered, class_column, color_column):
+        """
+        Fixations de una imagen con la clase de cada una
+
+        Usa el almacén pre-calculado (fixation.csv + etiquetas por dataset_select);
+        solo si no está disponible detecta las fixations con I-VT en vivo sobre filtered.
+
+        Returns:
+            (DataFrame ordenado por participante y start con 'class_label', dict clase -> color)
+        """
+        if get_fixation_label_service:
+            fixations, class_colors = get_fixation_label_service().get_labeled_fixations(image_id, dataset_select)
+            if fixations is not None:
+                return fixations, class_colors
+
+        print("ADVERTENCIA: ScarfPlot: Fixations pre-calculadas no disponibles, usando I-VT en vivo")
+        fixations_result = get_fixations_ivt(
+            data=filtered,
+            participant_id=None,
+            image_id=None,
+            velocity_threshold=1.15,
+            min_duration=0.0,
+            image_width=800,
+            image_height=600
+        )
+        fixations = pd.DataFrame(fixations_result.get('fixations', []))
+        if len(fixations) == 0:
+            return None, {}
+
+        for column in ('start', 'duration', 'x_centroid', 'y_centroid'):
+            if column not in fixations.columns:
+                fixations[column] = 0.0
+        if 'pointCount' not in fixations.columns:
+            fixations['pointCount'] = 1
+        fixations['class_label'] = assign_fixation_classes(
+            fixations['participante'].to_numpy(),
+            fixations['x_centroid'].to_numpy(dtype=float),
+            fixations['y_centroid'].to_numpy(dtype=float),
+            filtered,
+            class_column
+        )
+        fixations = fixations.sort_values(['participante', 'start'], kind='mergesort').reset_index(drop=True)
+        return fixations, first_value_by_class(filtered, class_column, color_column)
+
+    def get_stored_variant(self, data_type='gaze', dataset_select='main_class'):
+        """Variante vigente del TimelineStore para (data_type, dataset_select) o None"""
+        if not get_timeline_store:
+            return None
+        return get_timeline_store().get_variant('scarf', dataset_select, data_type)
+
+    def get_scarf_plot_data_from_store(self, variant, image_id, participant_id=None, cohort=None, resolution=None):
+        """Mismo resultado que get_scarf_plot_data leyendo los timelines pre-calculados"""
+        valid_participants = self.get_valid_participants_for_image(image_id)
+        if not valid_participants:
+            return {'error': f'No valid participants found for image {image_id}'}
+
+        if cohort and get_cohort_service:
+            keep = get_cohort_service().participant_mask(valid_participants, cohort, image_id)
+            valid_participants = [p for p, k in zip(valid_participants, keep) if k]
+            if not valid_participants:
+                return {'error': f'No participants match the cohort filters for image {image_id}'}
+
+        if participant_id is not None:
+            if participant_id not in valid_participants:
+                return {'error': f'Participant {participant_id} not valid for image {image_id}'}
+            selected = [participant_id]
+        else:
+            selected = valid_participants
+
+        pair_keys = (np.int64(image_id) << 32) + np.asarray(sorted(selected), dtype=np.int64)
+        timelines = get_timeline_store().read_pairs(variant, pair_keys)
+        if len(timelines['image']) == 0:
+            return {'error': f'No data for image {image_id} and participants {valid_participants}'}
+
+        min_duration = lod_min_duration(SCARF_DURATION_MS, resolution)
+        offsets = timelines['offsets']
+        scarf_data = []
+        total_merged = 0
+        for pair, p_id in enumerate(timelines['participant']):
+            lo, hi = offsets[pair], offsets[pair + 1]
+            codes, starts, ends, points, merged = merge_short_segments(
+                timelines['codes'][lo:hi], timelines['start'][lo:hi], timelines['end'][lo:hi],
+                timelines['points'][lo:hi], min_duration, origin=0.0
+            )
+            total_merged += merged
+            scarf_data.append({
+                'participant': int(p_id),
+                'segments': segments_from_arrays(codes, starts, ends, points, timelines['classes'], timelines['colors']),
+                'total_points': int(timelines['total_points'][pair]),
+                'time_range_ms': float(timelines['time_range'][pair])
+            })
+
+        result = {
+            'image_id': int(image_id),
+            'participant_id': participant_id,
+            'total_participants': len(scarf_data),
+            'scarf_data': scarf_data,
+            'color_mapping': self.color_mapping,
+            'status': 'success'
+        }
+        if min_duration:
+            result['lod'] = {
+                'resolution': int(resolution),
+                'min_duration_ms': min_duration,
+                'merged_segments': total_merged
+            }
+        return result
+
+    def get_scarf_plot_data(self, image_id, participant_id=None, data_type='gaze', dataset_select='main_class', image_name=None, cohort=None,
+                            resolution=None):
         """
         Retorna datos procesados para el scarf plot
 
@@ -110,6 +275,9 @@ class ScarfPlotController:
             data_type: Tipo de datos a usar ('gaze' o 'fixations')
             dataset_select: Columna a usar para clasificación ('main_class' o 'grupo')
             image_name: DEPRECATED, use image_id which is now ImageName
+            cohort: filtros de cohorte (dict de parse_cohort_args); None = todos los participantes
+            resolution: ancho en píxeles del eje de tiempo; los segmentos más cortos
+                que un píxel se fusionan con la clase dominante (None = todos los segmentos)
 
         Returns:
             Dict con datos listos para visualizar
@@ -150,6 +318,11 @@ class ScarfPlotController:
 
         print(f"  Using columns: class={class_column}, id={class_id_column}, color={color_column}")
 
+        # Timelines pre-calculados: la solicitud es solo lectura
+        variant = self.get_stored_variant(data_type, dataset_select)
+        if variant is not None:
+            return self.get_scarf_plot_data_from_store(variant, image_id, participant_id, cohort, resolution)
+
         try:
             # Filtrar por ImageName
             filtered = current_data[current_data['ImageName'] == image_id].copy()
@@ -163,6 +336,13 @@ class ScarfPlotController:
             if not valid_participants:
                 return {'error': f'No valid participants found for image {image_id}'}
 
+            # Cohorte: quedarse con los participantes que cumplen los filtros
+            if cohort and get_cohort_service:
+                keep = get_cohort_service().participant_mask(valid_participants, cohort, image_id)
+                valid_participants = [p for p, k in zip(valid_participants, keep) if k]
+                if not valid_participants:
+                    return {'error': f'No participants match the cohort filters for image {image_id}'}
+
             # Filtrar solo para participantes válidos
             filtered = filtered[filtered['participante'].isin(valid_participants)].copy()
 
@@ -186,123 +366,62 @@ class ScarfPlotController:
             if after > 0:
                 print(f"Filtered: {before} -> {after} points (removed {before-after} unclassified)")
 
-            # Si se solicita procesar fixations, detectarlas primero
+            # Modo fixations: fixations pre-calculadas con su clase ya asignada
             if data_type == 'fixations':
                 print(f"Processing scarf plot data as FIXATIONS")
-                # Detectar fixations usando I-VT
-                fixations_result = get_fixations_ivt(
-                    data=filtered,
-                    participant_id=None,
-                    image_id=None,
-                    velocity_threshold=1.15,
-                    min_duration=0.0,
-                    image_width=800,
-                    image_height=600
+                fixations, class_colors = self.get_labeled_fixations(
+                    image_id, dataset_select, filtered, class_column, color_column
                 )
-
-                fixations_list = fixations_result.get('fixations', [])
-                print(f"Detected {len(fixations_list)} fixations for scarf plot")
-
-                if not fixations_list:
+                if fixations is None or len(fixations) == 0:
                     return {'error': f'No fixations detected for image {image_id}'}
 
-                # Convertir fixations a formato para scarf plot
-                # Agrupar por participante
-                fixations_by_participant = {}
-                for fix in fixations_list:
-                    p_id = fix.get('participante')
-                    if p_id not in fixations_by_participant:
-                        fixations_by_participant[p_id] = []
-                    fixations_by_participant[p_id].append(fix)
+                fixations = fixations[fixations['participante'].isin(valid_participants)]
+                if participant_id is not None:
+                    fixations = fixations[fixations['participante'] == participant_id]
+                print(f"Using {len(fixations)} fixations for scarf plot")
 
-                participants = sorted([p for p in fixations_by_participant.keys() if p in valid_participants])
+                participants = sorted(int(p) for p in fixations['participante'].unique())
+                # Filas de cada participante (ya ordenadas por inicio)
+                rows_by_participant = fixations.groupby('participante', sort=False).indices
+                fixation_labels = fixations['class_label'].to_numpy(dtype=object)
+                fixation_starts = fixations['start'].to_numpy(dtype=float)
+                fixation_durations = fixations['duration'].to_numpy(dtype=float)
+                fixation_points = fixations['pointCount'].to_numpy()
             else:
                 # Procesar como gaze points (código original)
                 # Obtener participantes únicos (solo los válidos)
                 participants = sorted([p for p in filtered['participante'].unique() if p in valid_participants])
-                fixations_by_participant = None
+                # Filas de cada participante (un solo groupby en vez de filtrar por participante)
+                rows_by_participant = filtered.groupby('participante', sort=False).indices
+
+            # Duración de un píxel en el eje normalizado (0-15000 ms)
+            min_duration = lod_min_duration(SCARF_DURATION_MS, resolution)
+            total_merged = 0
 
             # Procesar datos por participante
             scarf_data = []
             for p_id in participants:
                 if data_type == 'fixations':
-                    # Usar fixations para este participante
-                    p_fixations = fixations_by_participant.get(p_id, [])
-                    if not p_fixations:
+                    rows = rows_by_participant.get(p_id)
+                    if rows is None or len(rows) == 0:
                         continue
 
-                    # Obtener tiempo min/max de las fixations
-                    times = [f.get('start', 0) for f in p_fixations]
-                    min_time = min(times) if times else 0
-                    max_time = max(times) if times else 1
-
-                    # Agrupar fixations por clase
-                    # Asignar clase basándome en los puntos gaze cercanos espacialmente
-                    segments = []
-                    fixation_radius = 50  # radio en pixels para buscar puntos cercanos
-
-                    for fix_idx, fix in enumerate(sorted(p_fixations, key=lambda f: f.get('start', 0))):
-                        # Obtener clase más común en esta región espacial
-                        x_centroid = fix.get('x_centroid', 0)
-                        y_centroid = fix.get('y_centroid', 0)
-
-                        # Buscar puntos cercanos del participante
-                        p_gaze = filtered[filtered['participante'] == p_id]
-                        if len(p_gaze) > 0:
-                            # Calcular distancia a cada punto
-                            distances = np.sqrt(
-                                (p_gaze['pixelX'] - x_centroid)**2 +
-                                (p_gaze['pixelY'] - y_centroid)**2
-                            )
-
-                            # Filtrar puntos dentro del radio de fijación
-                            nearby_mask = distances <= fixation_radius
-                            nearby_points = p_gaze[nearby_mask]
-
-                            if len(nearby_points) > 0:
-                                # Usar la clase más común de los puntos cercanos
-                                class_value = nearby_points[class_column].mode()
-                                class_value = class_value[0] if len(class_value) > 0 else 'unknown'
-                            else:
-                                # Si no hay puntos cercanos, usar el punto más cercano
-                                closest_idx = distances.idxmin()
-                                class_value = p_gaze.loc[closest_idx, class_column]
-                        else:
-                            class_value = 'unknown'
-
-                        # Obtener color para esta clase
-                        color_rows = filtered[filtered[class_column] == class_value][color_column].dropna()
-                        class_color = color_rows.iloc[0] if len(color_rows) > 0 else '#999999'
-
-                        # Normalizar tiempo a 0-15000ms
-                        time_range = max_time - min_time if max_time > min_time else 1
-                        start_norm = ((fix.get('start', 0) - min_time) / time_range) * 15000
-                        end_norm = start_norm + (fix.get('duration', 0) * 1000)  # duration en segundos
-
-                        # Clamp times to ensure they don't exceed 15000ms
-                        start_norm = min(max(start_norm, 0.0), 15000.0)
-                        end_norm = min(max(end_norm, 0.0), 15000.0)
-
-                        segments.append({
-                            'class': str(class_value),
-                            'start_time': float(start_norm),
-                            'end_time': float(end_norm),
-                            'points': fix.get('pointCount', 1),
-                            'color': class_color
-                        })
-
-                    # Calcular tiempo total de este participante (para mantener consistencia)
-                    total_points = sum([s['points'] for s in segments])
+                    segments, time_range, merged = build_fixation_segments(
+                        fixation_labels[rows], fixation_starts[rows],
+                        fixation_durations[rows], fixation_points[rows], class_colors,
+                        min_duration=min_duration
+                    )
+                    total_merged += merged
 
                     scarf_data.append({
                         'participant': int(p_id),
                         'segments': segments,
-                        'total_points': total_points,
-                        'time_range_ms': float(max_time - min_time)
+                        'total_points': int(fixation_points[rows].sum()),
+                        'time_range_ms': time_range
                     })
                 else:
-                    # Procesar como gaze points (código original)
-                    p_data = filtered[filtered['participante'] == p_id].copy()
+                    # Procesar como gaze points
+                    p_data = filtered.iloc[rows_by_participant.get(p_id, [])]
                     p_data = p_data.sort_values('Time')
 
                     if len(p_data) == 0:
@@ -312,44 +431,18 @@ class ScarfPlotController:
                     min_time = p_data['Time'].min()
                     max_time = p_data['Time'].max()
                     time_range = max_time - min_time if max_time > min_time else 1
+                    normalized_times = ((p_data['Time'].to_numpy(dtype=float) - min_time) / time_range) * 15000
+
+                    # Crear mapeo de colores desde los datos filtrados (primer color no nulo por clase)
+                    color_map = {
+                        str(class_val).strip(): color
+                        for class_val, color in first_value_by_class(p_data, class_column, color_column).items()
+                    }
 
-                    # Crear segmentos (agrupar puntos consecutivos de misma clase)
-                    segments = []
-                    current_segment = None
-
-                    # Crear mapeo de colores desde los datos filtrados
-                    color_map = {}
-                    for class_val in p_data[class_column].dropna().unique():
-                        color_rows = p_data[p_data[class_column] == class_val][color_column].dropna()
-                        if len(color_rows) > 0:
-                            color_map[str(class_val).strip()] = color_rows.iloc[0]
-
-                    for idx, row in p_data.iterrows():
-                        normalized_time = ((row['Time'] - min_time) / time_range) * 15000
-                        class_name = str(row[class_column]).strip()
-
-                        if current_segment is None or current_segment['class'] != class_name:
-                            # Guardar segmento anterior
-                            if current_segment:
-                                segments.append(current_segment)
-                            # Iniciar nuevo segmento
-                            current_segment = {
-                                'class': class_name,
-                                'start_time': float(normalized_time),
-                                'end_time': float(normalized_time),
-                                'points': 1,
-                                'color': color_map.get(class_name, '#999999')
-                            }
-                        else:
-                            # Extender segmento actual
-                            current_segment['end_time'] = float(normalized_time)
-                            current_segment['points'] += 1
-
-                    # Guardar último segmento
-                    if current_segment:
-                        # Clamp end_time to not exceed 15000ms
-                        current_segment['end_time'] = min(current_segment['end_time'], 15000.0)
-                        segments.append(current_segment)
+                    # Crear segmentos (corridas de puntos consecutivos de misma clase)
+                    class_names = p_data[class_column].map(lambda v: str(v).strip()).to_numpy(dtype=object)
+                    segments, merged = build_segments(class_names, normalized_times, color_map, min_duration=min_duration)
+                    total_merged += merged
 
                     scarf_data.append({
                         'participant': int(p_id),
@@ -358,7 +451,7 @@ class ScarfPlotController:
                         'time_range_ms': float(time_range)
                     })
 
-            return {
+            result = {
                 'image_id': int(image_id),
                 'participant_id': participant_id,
                 'total_participants': len(participants),
@@ -366,12 +459,590 @@ class ScarfPlotController:
                 'color_mapping': self.color_mapping,
                 'status': 'success'
             }
+            if min_duration:
+                result['lod'] = {
+                    'resolution': int(resolution),
+                    'min_duration_ms': min_duration,
+                    'merged_segments': total_merged
+                }
+            return result
 
         except Exception as e:
             import traceback
             traceback.print_exc()
             return {'error': f'Error processing scarf data: {str(e)}'}
 
+    def get_timeline_table(self, dataset_select='main_class'):
+        """
+        Gaze clasificado del dataset como arrays ordenados por (imagen, participante, Time)
+
+        Se arma una vez por dataset (y se rehace si DataService recarga el DataFrame);
+        las clases se codifican con un diccionario compartido por todas las imágenes.
+
+        Returns:
+            dict con 'image', 'participant', 'time', 'codes', 'classes', 'colors'
+            o None si no hay datos
+        """
+        data = self.data_service.get_data_by_dataset(dataset_select) if getattr(self, 'data_service', None) else self.data
+        if data is None:
+            return None
+
+        cached = self.timeline_tables.get(dataset_select)
+        if cached is not None and cached['source'] is data:
+            return cached
+
+        columns = self.data_service.get_class_columns(dataset_select, data) if getattr(self, 'data_service', None) else ('main_class', 'class_id', 'hex_color')
+        if columns is None:
+            return None
+        class_column, _, color_column = columns
+
+        names = data[class_column].astype(str).str.strip()
+        classified = data[class_column].notna() & (names != '')
+        frame = pd.DataFrame({
+            'image': data['ImageName'],
+            'participant': data['participante'],
+            'time': data['Time'],
+            'name': names
+        })[classified]
+        if color_column in data.columns:
+            frame['color'] = data.loc[classified, color_column]
+        frame = frame.dropna(subset=['image', 'participant', 'time'])
+        frame = frame.sort_values(['image', 'participant', 'time'], kind='mergesort')
+
+        codes, classes = pd.factorize(frame['name'])
+        colors = {}
+        if 'color' in frame.columns:
+            colors = frame.groupby('name', sort=False)['color'].first().dropna().to_dict()
+
+        table = {
+            'source': data,
+            'image': frame['image'].to_numpy(dtype=np.int64),
+            'participant': frame['participant'].to_numpy(dtype=np.int64),
+            'time': frame['time'].to_numpy(dtype=float),
+            'codes': codes.astype(np.int64),
+            'classes': [str(c) for c in classes],
+            'colors': [str(colors.get(c, DEFAULT_SEGMENT_COLOR)) for c in classes]
+        }
+        self.timeline_tables[dataset_select] = table
+        print(f"ScarfPlotController: Tabla de timelines '{dataset_select}' ({len(codes)} puntos, {len(classes)} clases)")
+        return table
+
+    def get_images_for_participant(self, participant_id):
+        """Imágenes en las que participant_id es uno de los participantes oficiales"""
+        if self.scores_data is None:
+            return []
+        return sorted(
+            int(image_key) for image_key, image_info in self.scores_data.items()
+            if str(image_key).isdigit()
+            and any(entry['participant'] == participant_id for entry in image_info.get('score_participant', []))
+        )
+
+    def get_scarf_batch_data(self, image_ids=None, participant_id=None, data_type='gaze', dataset_select='main_class',
+                             cohort=None, resolution=None):
+        """
+        Timelines de scarf plot de muchas imágenes (y/o un participante) en una sola pasada
+
+        Los segmentos de todos los (imagen, participante) se obtienen con un solo
+        run-length encoding sobre la tabla ordenada y se devuelven en columnas con
+        códigos de un diccionario de clases compartido.
+
+        Args:
+            image_ids: ImageName a incluir (None = todas las del participante)
+            participant_id: limitar a un participante (None = todos los válidos)
+            resolution: ancho en píxeles para fusionar segmentos cortos (ver get_scarf_plot_data)
+
+        Returns:
+            Dict con 'classes', 'colors' y 'timelines' (uno por imagen y participante,
+            con 'codes', 'start_time', 'end_time' y 'points' alineados)
+        """
+        if image_ids is None:
+            if participant_id is None:
+                return {'error': 'Specify image_ids and/or participant_id'}
+            image_ids = self.get_images_for_participant(participant_id)
+        if not image_ids:
+            return {'error': 'No images selected'}
+
+        # Participantes válidos de cada imagen (oficiales, cohorte y participante pedido)
+        pair_keys = []
+        skipped_images = []
+        for image_id in image_ids:
+            participants = np.asarray(self.get_valid_participants_for_image(image_id), dtype=np.int64)
+            if cohort and get_cohort_service and len(participants):
+                participants = participants[get_cohort_service().participant_mask(participants, cohort, image_id)]
+            if participant_id is not None:
+                participants = participants[participants == participant_id]
+            if len(participants) == 0:
+                skipped_images.append(int(image_id))
+                continue
+            pair_keys.append((np.int64(image_id) << 32) + participants)
+
+        if not pair_keys:
+            return {'error': 'No valid participants for the selected images', 'skipped_images': skipped_images}
+        pair_keys = np.unique(np.concatenate(pair_keys))
+
+        timelines_data = self.get_timeline_arrays(pair_keys, data_type, dataset_select)
+        if timelines_data is None:
+            return {'error': f'No data available for dataset {dataset_select}'}
+
+        # Separar los segmentos por par y aplicar el nivel de detalle
+        min_duration = lod_min_duration(SCARF_DURATION_MS, resolution)
+        offsets = timelines_data['offsets']
+        timelines = []
+        total_segments = 0
+        total_merged = 0
+        for pair in range(len(timelines_data['image'])):
+            lo, hi = offsets[pair], offsets[pair + 1]
+            if hi == lo:
+                continue
+            codes, starts, ends, points, merged = merge_short_segments(
+                timelines_data['codes'][lo:hi], timelines_data['start'][lo:hi], timelines_data['end'][lo:hi],
+                timelines_data['points'][lo:hi], min_duration, origin=0.0
+            )
+            total_segments += len(codes)
+            total_merged += merged
+            timelines.append({
+                'image_id': int(timelines_data['image'][pair]),
+                'participant': int(timelines_data['participant'][pair]),
+                'total_points': int(timelines_data['total_points'][pair]),
+                'time_range_ms': float(timelines_data['time_range'][pair]),
+                'codes': codes.tolist(),
+                'start_time': starts.tolist(),
+                'end_time': ends.tolist(),
+                'points': points.astype(np.int64).tolist()
+            })
+        classes = timelines_data['classes']
+        colors = timelines_data['colors']
+
+        covered = {t['image_id'] for t in timelines}
+        result = {
+            'image_ids': [int(i) for i in image_ids if int(i) in covered],
+            'participant_id': participant_id,
+            'data_type': data_type,
+            'dataset_select': dataset_select,
+            'classes': classes,
+            'colors': colors,
+            'timelines': timelines,
+            'total_segments': total_segments,
+            'skipped_images': sorted(set(skipped_images) | {int(i) for i in image_ids if int(i) not in covered}),
+            'status': 'success'
+        }
+        if min_duration:
+            result['lod'] = {
+                'resolution': int(resolution),
+                'min_duration_ms': min_duration,
+                'merged_segments': total_merged
+            }
+        return result
+
+    def get_timeline_arrays(self, pair_keys, data_type='gaze', dataset_select='main_class', use_store=True):
+        """
+        Arrays de timeline (ver scarf_segments.build_region_timelines) de los pares pedidos
+
+        Los tiempos de los segmentos están en el eje del scarf plot (0-15000 ms por par).
+
+        Args:
+            pair_keys: np.ndarray ordenado de claves (imagen << 32) + participante
+            use_store: leer del TimelineStore si hay una variante vigente
+        """
+        variant = self.get_stored_variant(data_type, dataset_select) if use_store else None
+        if variant is not None:
+            return get_timeline_store().read_pairs(variant, pair_keys)
+        if data_type == 'fixations':
+            return self._fixation_timeline_arrays(pair_keys, dataset_select)
+        return self._gaze_timeline_arrays(pair_keys, dataset_select)
+
+    def _gaze_timeline_arrays(self, pair_keys, dataset_select):
+        """Segmentos de gaze de todos los pares (imagen << 32 | participante) pedidos"""
+        table = self.get_timeline_table(dataset_select)
+        if table is None:
+            return None
+
+        # Filas de las imágenes pedidas (rangos contiguos de la tabla ordenada)
+        images = np.unique(pair_keys >> 32)
+        lo = np.searchsorted(table['image'], images, side='left')
+        hi = np.searchsorted(table['image'], images, side='right')
+        lengths = hi - lo
+        rows = np.repeat(lo - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+
+        keys = (table['image'][rows] << 32) + table['participant'][rows]
+        rows = rows[np.isin(keys, pair_keys)]
+        keys = (table['image'][rows] << 32) + table['participant'][rows]
+        times = table['time'][rows]
+        codes = table['codes'][rows]
+
+        # Pares presentes y normalización de tiempo a 0-15000 por par (filas ya ordenadas por Time)
+        pair_first, _ = run_length_encode(keys)
+        pair_of_row = np.cumsum(np.r_[True, keys[1:] != keys[:-1]]) - 1 if len(keys) else np.empty(0, dtype=np.int64)
+        pair_last = np.r_[pair_first[1:] - 1, len(keys) - 1] if len(keys) else pair_first
+        min_time = times[pair_first]
+        max_time = times[pair_last]
+        time_range = np.where(max_time > min_time, max_time - min_time, 1)
+        normalized = ((times - min_time[pair_of_row]) / time_range[pair_of_row]) * SCARF_DURATION_MS
+
+        # Corridas de misma clase dentro de cada par: un run-length encoding sobre (par, clase)
+        n_codes = len(table['classes']) + 1
+        run_starts, run_ends = run_length_encode(pair_of_row * n_codes + codes)
+        segment_pair = pair_of_row[run_starts]
+
+        pair_keys_present = keys[pair_first]
+        return {
+            'image': pair_keys_present >> 32,
+            'participant': pair_keys_present & 0xFFFFFFFF,
+            'offsets': pair_offsets(segment_pair, len(pair_first)),
+            'total_points': (pair_last - pair_first + 1).astype(np.int64),
+            't_min': min_time,
+            't_max': max_time,
+            'time_range': time_range.astype(float),
+            'codes': codes[run_starts],
+            'start': normalized[run_starts],
+            'end': np.minimum(normalized[run_ends], SCARF_DURATION_MS),
+            'points': (run_ends - run_starts + 1).astype(np.int64),
+            'classes': table['classes'],
+            'colors': table['colors']
+        }
+
+    def _image_labeled_fixations(self, image_id, dataset_select, class_column, color_column):
+        """Fixations etiquetadas de una imagen (almacén pre-calculado o I-VT en vivo)"""
+        if get_fixation_label_service:
+            fixations, colors = get_fixation_label_service().get_labeled_fixations(image_id, dataset_select)
+            if fixations is not None:
+                return fixations, colors
+
+        # Sin almacén pre-calculado: I-VT en vivo sobre el gaze clasificado de la imagen
+        data = self.data_service.get_data_by_dataset(dataset_select) if getattr(self, 'data_service', None) else self.data
+        filtered = data[data['ImageName'] == image_id]
+        filtered = filtered[
+            filtered[class_column].notna() &
+            (filtered[class_column].astype(str).str.strip() != '')
+        ]
+        if len(filtered) == 0:
+            return None, {}
+        return self.get_labeled_fixations(image_id, dataset_select, filtered, class_column, color_column)
+
+    def _fixation_timeline_arrays(self, pair_keys, dataset_select):
+        """Segmentos de fixations (una por segmento) de todos los pares pedidos"""
+        columns = self.data_service.get_class_columns(dataset_select) if getattr(self, 'data_service', None) else ('main_class', 'class_id', 'hex_color')
+        if columns is None:
+            return None
+        class_column, _, color_column = columns
+
+        frames = []
+        class_colors = {}
+        for image_id in np.unique(pair_keys >> 32):
+            fixations, colors = self._image_labeled_fixations(int(image_id), dataset_select, class_column, color_column)
+            if fixations is None or len(fixations) == 0:
+                continue
+            frames.append(fixations.assign(image=int(image_id)))
+            for label, color in colors.items():
+                class_colors.setdefault(str(label), color)
+
+        if not frames:
+            fixations = pd.DataFrame({
+                'image': np.empty(0, dtype=np.int64), 'participante': np.empty(0, dtype=np.int64),
+                'start': np.empty(0), 'duration': np.empty(0), 'pointCount': np.empty(0, dtype=np.int64),
+                'class_label': np.empty(0, dtype=object)
+            })
+        else:
+            fixations = pd.concat(frames, ignore_index=True)
+        keys = (fixations['image'].to_numpy(dtype=np.int64) << 32) + fixations['participante'].to_numpy(dtype=np.int64)
+        keep = np.isin(keys, pair_keys)
+        fixations = fixations[keep]
+        keys = keys[keep]
+        # Orden por par y por inicio (estable: conserva el orden de cada imagen)
+        order = np.lexsort((fixations['start'].to_numpy(dtype=float), keys))
+        keys = keys[order]
+        starts = fixations['start'].to_numpy(dtype=float)[order]
+        durations = fixations['duration'].to_numpy(dtype=float)[order]
+        points = fixations['pointCount'].to_numpy(dtype=np.int64)[order]
+        codes, classes = pd.factorize(fixations['class_label'].astype(str).to_numpy()[order])
+
+        pair_first, _ = run_length_encode(keys)
+        pair_of_row = np.cumsum(np.r_[True, keys[1:] != keys[:-1]]) - 1 if len(keys) else np.empty(0, dtype=np.int64)
+        pair_last = np.r_[pair_first[1:] - 1, len(keys) - 1] if len(keys) else pair_first
+        min_time = starts[pair_first]
+        max_time = starts[pair_last]
+        time_range = max_time - min_time
+        divisor = np.where(time_range > 0, time_range, 1)
+        start_norm = ((starts - min_time[pair_of_row]) / divisor[pair_of_row]) * SCARF_DURATION_MS
+        end_norm = np.clip(start_norm + durations * 1000, 0.0, SCARF_DURATION_MS)  # duration en segundos
+        start_norm = np.clip(start_norm, 0.0, SCARF_DURATION_MS)
+
+        pair_keys_present = keys[pair_first]
+        classes = [str(c) for c in classes]
+        return {
+            'image': pair_keys_present >> 32,
+            'participant': pair_keys_present & 0xFFFFFFFF,
+            'offsets': np.r_[pair_first, len(keys)].astype(np.int64),
+            'total_points': np.add.reduceat(points, pair_first) if len(points) else np.empty(0, dtype=np.int64),
+            't_min': min_time,
+            't_max': max_time,
+            'time_range': time_range,
+            'codes': codes.astype(np.int64),
+            'start': start_norm,
+            'end': end_norm,
+            'points': points,
+            'classes': classes,
+            'colors': [str(class_colors.get(c, DEFAULT_SEGMENT_COLOR)) for c in classes]
+        }
+
+    def get_scanpath_sequences(self, image_id, participants, data_type='gaze', dataset_select='main_class',
+                               sequence='class', patch_size=40):
+        """
+        Scanpath de cada participante de una imagen como secuencia de enteros
+
+        Args:
+            sequence: 'class' (códigos de clase de los segmentos del scarf plot) o
+                'patch' (índice del patch de la grilla de patch_size píxeles)
+
+        Returns:
+            (participantes con datos, lista de np.ndarray sin repeticiones consecutivas)
+        """
+        participants = sorted(int(p) for p in participants)
+        pair_keys = (np.int64(image_id) << 32) + np.asarray(participants, dtype=np.int64)
+
+        if sequence == 'class':
+            timelines = self.get_timeline_arrays(pair_keys, data_type, dataset_select)
+            if timelines is None:
+                return [], []
+            offsets = timelines['offsets']
+            sequences = [collapse_repeats(timelines['codes'][offsets[pair]:offsets[pair + 1]])
+                         for pair in range(len(timelines['participant']))]
+            return [int(p) for p in timelines['participant']], sequences
+
+        # Secuencia de patches: posiciones de gaze o centroides de fixations en orden temporal
+        if data_type == 'fixations':
+            columns = self.data_service.get_class_columns(dataset_select) if getattr(self, 'data_service', None) else ('main_class', 'class_id', 'hex_color')
+            if columns is None:
+                return [], []
+            points, _ = self._image_labeled_fixations(int(image_id), dataset_select, columns[0], columns[2])
+            if points is None or len(points) == 0:
+                return [], []
+            points = points.rename(columns={'participante': 'participant', 'start': 'time',
+                                            'x_centroid': 'x', 'y_centroid': 'y'})
+        else:
+            data = self.data_service.get_data_by_dataset(dataset_select) if getattr(self, 'data_service', None) else self.data
+            if data is None:
+                return [], []
+            points = data.loc[data['ImageName'] == image_id, ['participante', 'Time', 'pixelX', 'pixelY']]
+            points = points.rename(columns={'participante': 'participant', 'Time': 'time', 'pixelX': 'x', 'pixelY': 'y'})
+
+        points = points[points['participant'].isin(participants)]
+        points = points.sort_values(['participant', 'time'], kind='mergesort')
+        participant_ids = points['participant'].to_numpy(dtype=np.int64)
+        xs = points['x'].to_numpy(dtype=float)
+        ys = points['y'].to_numpy(dtype=float)
+
+        bounds = np.flatnonzero(np.r_[True, participant_ids[1:] != participant_ids[:-1]]) if len(points) else np.empty(0, dtype=np.int64)
+        bounds = np.r_[bounds, len(points)]
+        present = [int(participant_ids[lo]) for lo in bounds[:-1]]
+        sequences = [patch_sequence(xs[lo:hi], ys[lo:hi], patch_size) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        return present, sequences
+
+    def get_scanpath_similarity(self, image_id, participants=None, data_type='gaze', dataset_select='main_class',
+                                sequence='class', patch_size=40, method='levenshtein', cohort=None):
+        """
+        Similitud entre los scanpaths de todos los participantes de una imagen
+
+        Se calcula una vez por (imagen, dataset, tipo de datos, secuencia, tamaño de
+        patch, método y participantes) y se guarda en scanpath_similarity_cache.
+
+        Returns:
+            dict con 'participants', 'matrix' (n × n), 'order' (orden de hojas óptimo
+            sobre la matriz) y 'sequence_lengths', o dict con 'error'
+        """
+        if participants is None:
+            participants = self.get_valid_participants_for_image(image_id)
+            if cohort and get_cohort_service:
+                keep = get_cohort_service().participant_mask(participants, cohort, image_id)
+                participants = [p for p, k in zip(participants, keep) if k]
+        if not participants:
+            return {'error': f'No valid participants found for image {image_id}'}
+
+        version = self.data_service.get_data_version(dataset_select) if getattr(self, 'data_service', None) else None
+        key = (int(image_id), dataset_select, data_type, sequence, int(patch_size), method,
+               tuple(sorted(int(p) for p in participants)), version)
+        return scanpath_similarity_cache.get_or_load(
+            key,
+            lambda: self._compute_scanpath_similarity(image_id, participants, data_type, dataset_select,
+                                                      sequence, patch_size, method),
+            cacheable=lambda result: 'error' not in result
+        )
+
+    def _compute_scanpath_similarity(self, image_id, participants, data_type, dataset_select, sequence, patch_size, method):
+        """Matriz de similitud y orden de participantes (sin cache)"""
+        present, sequences = self.get_scanpath_sequences(image_id, participants, data_type, dataset_select,
+                                                         sequence, patch_size)
+        if not present:
+            return {'error': f'No scanpath data for image {image_id}'}
+
+        substitution = None
+        if method == 'scanmatch' and sequence == 'patch':
+            substitution = patch_substitution(int(np.ceil(800 / patch_size)), patch_size)
+        matrix = similarity_matrix(sequences, method, substitution=substitution)
+
+        return {
+            'image_id': int(image_id),
+            'participants': present,
+            'matrix': np.round(matrix, 4).tolist(),
+            'order': [present[i] for i in seriate(matrix, 'olo')],
+            'sequence_lengths': [int(len(seq)) for seq in sequences],
+            'method': method,
+            'sequence': sequence,
+            'patch_size': int(patch_size) if sequence == 'patch' else None,
+            'data_type': data_type,
+            'status': 'success'
+        }
+
+    def order_scarf_by_similarity(self, data, image_id, data_type='gaze', dataset_select='main_class',
+                                  sequence='class', patch_size=40, method='levenshtein'):
+        """
+        Reordena scarf_data de una respuesta del scarf plot por similitud de scanpath
+
+        Participantes con scanpaths parecidos quedan contiguos; agrega 'participant_order'
+        y 'similarity' (participantes y matriz). No hace nada si la respuesta tiene error.
+        """
+        if not isinstance(data, dict) or 'error' in data or len(data.get('scarf_data', [])) < 2:
+            return data
+
+        participants = [row['participant'] for row in data['scarf_data']]
+        similarity = self.get_scanpath_similarity(image_id, participants, data_type, dataset_select,
+                                                  sequence, patch_size, method)
+        if 'error' in similarity:
+            return data
+
+        rank = {p: i for i, p in enumerate(similarity['order'])}
+        data['scarf_data'] = sorted(data['scarf_data'], key=lambda row: rank.get(row['participant'], len(rank)))
+        data['participant_order'] = [row['participant'] for row in data['scarf_data']]
+        data['similarity'] = {
+            'method': method,
+            'sequence': sequence,
+            'participants': similarity['participants'],
+            'matrix': similarity['matrix']
+        }
+        return data
+
+    def get_transition_source(self, dataset_select='main_class', data_type='gaze'):
+        """
+        Secuencias clasificadas de todo el dataset para el cubo de transiciones
+
+        Returns:
+            dict con 'image', 'participant', 'time', 'codes' (ordenados por imagen,
+            participante y tiempo), 'classes' y 'colors', o None si no hay datos
+        """
+        if data_type != 'fixations':
+            table = self.get_timeline_table(dataset_select)
+            if table is None:
+                return None
+            return {key: table[key] for key in ('image', 'participant', 'time', 'codes', 'classes', 'colors')}
+
+        columns = self.data_service.get_class_columns(dataset_select) if getattr(self, 'data_service', None) else ('main_class', 'class_id', 'hex_color')
+        if columns is None or self.scores_data is None:
+            return None
+        class_column, _, color_column = columns
+
+        frames = []
+        class_colors = {}
+        for image_id in sorted(int(key) for key in self.scores_data if str(key).isdigit()):
+            fixations, colors = self._image_labeled_fixations(image_id, dataset_select, class_column, color_column)
+            if fixations is None or len(fixations) == 0:
+                continue
+            frames.append(pd.DataFrame({
+                'image': image_id,
+                'participant': fixations['participante'].to_numpy(dtype=np.int64),
+                'time': fixations['start'].to_numpy(dtype=float),
+                'name': fixations['class_label'].astype(str).to_numpy()
+            }))
+            for label, color in colors.items():
+                class_colors.setdefault(str(label), color)
+        if not frames:
+            return None
+
+        frame = pd.concat(frames, ignore_index=True).sort_values(['image', 'participant', 'time'], kind='mergesort')
+        codes, classes = pd.factorize(frame['name'])
+        classes = [str(c) for c in classes]
+        return {
+            'image': frame['image'].to_numpy(dtype=np.int64),
+            'participant': frame['participant'].to_numpy(dtype=np.int64),
+            'time': frame['time'].to_numpy(dtype=float),
+            'codes': codes.astype(np.int64),
+            'classes': classes,
+            'colors': [str(class_colors.get(c, DEFAULT_SEGMENT_COLOR)) for c in classes]
+        }
+
+    def build_transition_cube(self, dataset_select='main_class', data_type='gaze'):
+        """Cubo de transiciones (ver transition_cube.build_transition_arrays) de una variante"""
+        source = self.get_transition_source(dataset_select, data_type)
+        if source is None:
+            return None
+        cube = build_transition_arrays(source['image'], source['participant'], source['time'], source['codes'])
+        cube['classes'] = list(source['classes'])
+        cube['colors'] = list(source['colors'])
+        print(f"ScarfPlotController: Cubo de transiciones '{dataset_select}/{data_type}' ({len(cube['count'])} celdas)")
+        return cube
+
+    def get_transition_cube(self, dataset_select='main_class', data_type='gaze'):
+        """Cubo de transiciones vigente de una variante (pre-calculado o construido una vez)"""
+        if not get_transition_cube_service:
+            return None
+        return get_transition_cube_service().get_cube(
+            dataset_select, data_type, lambda: self.build_transition_cube(dataset_select, data_type)
+        )
+
+    def get_transition_matrix(self, image_ids=None, participant_ids=None, data_type='gaze', dataset_select='main_class',
+                              cohort=None):
+        """
+        Grafo de transiciones entre clases sumado sobre imágenes y participantes
+
+        Solo cuenta los participantes oficiales de cada imagen (y los que cumplen la
+        cohorte); image_ids / participant_ids None = todos.
+
+        Returns:
+            dict con 'classes', 'colors', 'counts' y 'dwell' (matrices origen × destino),
+            'edges' (transiciones no nulas, de mayor a menor conteo) y totales
+        """
+        cube = self.get_transition_cube(dataset_select, data_type)
+        if cube is None:
+            return {'error': f'No transition data available for dataset {dataset_select}'}
+
+        pair_keys = get_cohort_service().get_pair_keys(cohort or {}) if get_cohort_service else None
+
+        transition_cube_service = get_transition_cube_service()
+        rows = transition_cube_service.select_rows(cube, image_ids, participant_ids, pair_keys)
+        if len(rows) == 0:
+            return {'error': 'No transitions for the selected images and participants'}
+
+        counts, dwell = sum_transitions(cube, rows)
+        # Solo las clases que aparecen en la selección
+        used = np.flatnonzero((counts.sum(axis=0) + counts.sum(axis=1)) > 0)
+        counts = counts[np.ix_(used, used)]
+        dwell = dwell[np.ix_(used, used)]
+        classes = [cube['classes'][i] for i in used]
+
+        sources, targets = np.nonzero(counts)
+        order = np.lexsort((targets, sources, -counts[sources, targets]))
+        edges = [{
+            'from': classes[i],
+            'to': classes[j],
+            'count': int(counts[i, j]),
+            'dwell_sum': round(float(dwell[i, j]), 4),
+            'mean_dwell': round(float(dwell[i, j] / counts[i, j]), 4)
+        } for i, j in zip(sources[order], targets[order])]
+
+        pairs = np.unique((cube['image'][rows].astype(np.int64) << 32) + cube['participant'][rows])
+        return {
+            'classes': classes,
+            'colors': [cube['colors'][i] for i in used],
+            'counts': counts.astype(int).tolist(),
+            'dwell': np.round(dwell, 4).tolist(),
+            'edges': edges,
+            'total_transitions': int(counts.sum()),
+            'image_ids': sorted(set(int(i) for i in pairs >> 32)),
+            'participants': sorted(set(int(p) for p in pairs & 0xFFFFFFFF)),
+            'total_pairs': int(len(pairs)),
+            'data_type': data_type,
+            'status': 'success'
+        }
+
 # Instancia global
 scarf_controller = ScarfPlotController()
 
@@ -35,6 +35,115 @@ except ImportError as e:
     print(f"⚠️  Advertencia: No se pudo importar TSNECacheService: {e}")
     get_tsne_cache = None
 
+# SegmentationService
+try:
+    from .segmentation_service import get_segmentation_service, SegmentationService
+    print("✅ SegmentationService importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar SegmentationService: {e}")
+    get_segmentation_service = None
+    SegmentationService = None
+
+# AreaIndexService
+try:
+    from .area_index_service import get_area_index_service, AreaIndexService
+    print("✅ AreaIndexService importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar AreaIndexService: {e}")
+    get_area_index_service = None
+    AreaIndexService = None
+
+# ResultCache
+try:
+    from .result_cache import ResultCache, snap_rect, files_version, get_cache_stats
+    print("✅ ResultCache importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar ResultCache: {e}")
+    ResultCache = None
+    snap_rect = None
+    files_version = None
+    get_cache_stats = None
+
+# Asignación de clase a fixations en lote
+try:
+    from .fixation_labeling import assign_fixation_classes
+    print("✅ fixation_labeling importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar fixation_labeling: {e}")
+    assign_fixation_classes = None
+
+# DwellCubeService
+try:
+    from .dwell_cube_service import get_dwell_cube_service, DwellCubeService
+    print("✅ DwellCubeService importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar DwellCubeService: {e}")
+    get_dwell_cube_service = None
+    DwellCubeService = None
+
+# Seriación de matrices de heatmap
+try:
+    from .seriation import seriate, add_matrix_ordering
+    print("✅ seriation importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar seriation: {e}")
+    seriate = None
+    add_matrix_ordering = None
+
+# Filtros de cohorte
+try:
+    from .cohort import get_cohort_service, CohortService, parse_cohort_args
+    print("✅ CohortService importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar CohortService: {e}")
+    get_cohort_service = None
+    CohortService = None
+    parse_cohort_args = None
+
+# Motor de mapas de densidad
+try:
+    from .density_engine import density_map, density_maps
+    print("✅ density_engine importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar density_engine: {e}")
+    density_map = None
+    density_maps = None
+
+# Etiquetas pre-calculadas de fixations
+try:
+    from .fixation_label_service import get_fixation_label_service, FixationLabelService
+    print("✅ FixationLabelService importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar FixationLabelService: {e}")
+    get_fixation_label_service = None
+    FixationLabelService = None
+
+# Timelines de scarf plot pre-calculados
+try:
+    from .timeline_store import get_timeline_store, TimelineStore
+    print("✅ TimelineStore importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar TimelineStore: {e}")
+    get_timeline_store = None
+    TimelineStore = None
+
+# Similitud entre scanpaths
+try:
+    from .scanpath_similarity import similarity_matrix
+    print("✅ scanpath_similarity importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar scanpath_similarity: {e}")
+    similarity_matrix = None
+
+# Cubo de transiciones entre clases
+try:
+    from .transition_cube import get_transition_cube_service, TransitionCubeService
+    print("✅ TransitionCubeService importado correctamente")
+except ImportError as e:
+    print(f"⚠️  Advertencia: No se pudo importar TransitionCubeService: {e}")
+    get_transition_cube_service = None
+    TransitionCubeService = None
+
 __all__ = [
     'get_data_service',
     'DataService',
@@ -42,5 +151,30 @@ __all__ = [
     'get_fixations_ivt_fast',
     'get_patch_fixations_fast',
     'PrecomputedFixationService',
-    'get_tsne_cache'
+    'get_tsne_cache',
+    'get_segmentation_service',
+    'SegmentationService',
+    'get_area_index_service',
+    'AreaIndexService',
+    'ResultCache',
+    'snap_rect',
+    'files_version',
+    'get_cache_stats',
+    'assign_fixation_classes',
+    'get_dwell_cube_service',
+    'DwellCubeService',
+    'seriate',
+    'add_matrix_ordering',
+    'get_cohort_service',
+    'CohortService',
+    'parse_cohort_args',
+    'density_map',
+    'density_maps',
+    'get_fixation_label_service',
+    'FixationLabelService',
+    'get_timeline_store',
+    'TimelineStore',
+    'similarity_matrix',
+    'get_transition_cube_service',
+    'TransitionCubeService'
 ]
\ No newline at end of file
@@ -0,0 +1,161 @@
+"""
+AreaIndexService - Índice espacial por imagen y sesiones de brush incremental
+Permite que el brush D3 consulte solo los puntos que entran o salen del
+rectángulo entre dos movimientos consecutivos, en lugar de recalcular todo.
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+
+
+class AreaIndex:
+    """Puntos (gaze o fixations) de una imagen ordenados por X para consultas rectangulares"""
+
+    def __init__(self, records, x_column='x_centroid', y_column='y_centroid'):
+        """
+        Args:
+            records: DataFrame con los puntos ya normalizados y listos para JSON
+            x_column, y_column: columnas de coordenadas en espacio de datos
+        """
+        records = records.sort_values(x_column, kind='mergesort').reset_index(drop=True)
+        records['point_id'] = np.arange(len(records), dtype=np.int64)
+
+        self.records = records
+        self.xs = records[x_column].to_numpy(dtype=float)
+        self.ys = records[y_column].to_numpy(dtype=float)
+        self.total = len(records)
+
+        # Códigos de participante para agregados con bincount
+        participants = records['participante'].to_numpy() if 'participante' in records.columns else np.zeros(self.total)
+        self.participant_values, self.participant_codes = np.unique(participants, return_inverse=True)
+
+    def query(self, x, y, width, height):
+        """
+        Retorna los point_id dentro del rectángulo (bordes inclusivos)
+
+        Usa búsqueda binaria sobre X y filtra Y solo dentro de esa franja.
+        """
+        lo = np.searchsorted(self.xs, x, side='left')
+        hi = np.searchsorted(self.xs, x + width, side='right')
+        ys = self.ys[lo:hi]
+        inside = (ys >= y) & (ys <= y + height)
+        return np.flatnonzero(inside) + lo
+
+    def get_records(self, point_ids):
+        """Convierte point_ids a lista de diccionarios"""
+        if len(point_ids) == 0:
+            return []
+        return self.records.iloc[point_ids].to_dict('records')
+
+    def participant_counts(self, point_ids):
+        """Cantidad de puntos por participante para un conjunto de point_ids"""
+        counts = np.bincount(self.participant_codes[point_ids], minlength=len(self.participant_values))
+        return {
+            int(participant): int(count)
+            for participant, count in zip(self.participant_values, counts)
+            if count > 0
+        }
+
+
+class AreaIndexService:
+    """Singleton con cache de índices por imagen y estado de sesiones de brush"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(AreaIndexService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, max_indexes=16, max_sessions=256):
+        if not self._initialized:
+            self.max_indexes = max_indexes
+            self.max_sessions = max_sessions
+            self.indexes = OrderedDict()  # {index_key: AreaIndex}
+            self.sessions = OrderedDict()  # {selection_id: {'index_key', 'point_ids'}}
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    def get_index(self, index_key, builder):
+        """
+        Retorna el índice de index_key, construyéndolo con builder() si no existe
+
+        Args:
+            index_key: tupla hashable (p.ej. (image_id, participant_id, data_type))
+            builder: función sin argumentos que retorna el DataFrame de puntos
+
+        Returns:
+            AreaIndex o None si builder no retorna datos
+        """
+        with self._lock:
+            if index_key in self.indexes:
+                self.indexes.move_to_end(index_key)
+                return self.indexes[index_key]
+
+        records = builder()
+        if records is None:
+            return None
+        index = AreaIndex(records)
+
+        with self._lock:
+            self.indexes[index_key] = index
+            self.indexes.move_to_end(index_key)
+            while len(self.indexes) > self.max_indexes:
+                self.indexes.popitem(last=False)
+        return index
+
+    def update_session(self, selection_id, index_key, point_ids):
+        """
+        Guarda la selección actual de una sesión y calcula el delta con la anterior
+
+        Si la sesión no existe o cambió de índice (otra imagen, participante o
+        tipo de datos) se considera un reinicio: todos los puntos "entran".
+
+        Returns:
+            dict con selection_id, reset, entered (point_ids) y left (point_ids)
+        """
+        if not selection_id:
+            selection_id = uuid.uuid4().hex
+
+        with self._lock:
+            previous = self.sessions.get(selection_id)
+            reset = previous is None or previous['index_key'] != index_key
+            self.sessions[selection_id] = {'index_key': index_key, 'point_ids': point_ids}
+            self.sessions.move_to_end(selection_id)
+            while len(self.sessions) > self.max_sessions:
+                self.sessions.popitem(last=False)
+
+        if reset:
+            entered = point_ids
+            left = np.empty(0, dtype=np.int64)
+        else:
+            # Ambos arrays están ordenados y sin repetidos
+            entered = np.setdiff1d(point_ids, previous['point_ids'], assume_unique=True)
+            left = np.setdiff1d(previous['point_ids'], point_ids, assume_unique=True)
+
+        return {
+            'selection_id': selection_id,
+            'reset': reset,
+            'entered': entered,
+            'left': left
+        }
+
+    def end_session(self, selection_id):
+        """Elimina el estado de una sesión de brush"""
+        with self._lock:
+            self.sessions.pop(selection_id, None)
+
+    def clear(self):
+        """Limpia índices y sesiones"""
+        with self._lock:
+            self.indexes.clear()
+            self.sessions.clear()
+
+
+def get_area_index_service():
+    """Retorna la instancia singleton del AreaIndexService"""
+    return AreaIndexService()
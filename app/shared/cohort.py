@@ -0,0 +1,154 @@
+"""
+CohortService - Filtros de cohorte (score, edad, género, estado) sobre participantes
+Construye una vez, a partir de data_hololens.json, arrays por (imagen, participante)
+y responde cada filtro con una máscara booleana de participantes, que los endpoints
+aplican sobre sus agregados por participante en vez de re-filtrar filas de gaze.
+"""
+
+import threading
+
+import numpy as np
+
+# Parámetros de query soportados (mismos nombres en heatmap, scarf y analyze-area)
+COHORT_PARAMS = ('min_score', 'max_score', 'age_min', 'age_max', 'gender', 'state')
+
+
+def _normalize_text(value):
+    """Texto comparable: sin espacios extremos y sin distinguir mayúsculas"""
+    return str(value).strip().casefold()
+
+
+def parse_cohort_args(args):
+    """
+    Lee los filtros de cohorte de request.args
+
+    Returns:
+        dict con solo los filtros presentes y válidos (vacío = sin filtro)
+    """
+    cohort = {}
+    for name in ('min_score', 'max_score', 'age_min', 'age_max'):
+        value = args.get(name, None, type=float)
+        if value is not None and np.isfinite(value):
+            cohort[name] = value
+    for name in ('gender', 'state'):
+        value = args.get(name, '')
+        if value and value.strip():
+            cohort[name] = _normalize_text(value)
+    return cohort
+
+
+def cohort_key(cohort):
+    """Clave hashable de un filtro (None si no hay filtro) para los caches"""
+    return tuple(sorted(cohort.items())) if cohort else None
+
+
+class CohortService:
+    """Singleton con los atributos de cada participante por imagen"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(CohortService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self._lock = threading.Lock()
+            self._scores_data = None
+            self._table = None
+            self._initialized = True
+
+    def _get_table(self):
+        """Arrays (imagen, participante, score, edad, género, estado) de data_hololens.json"""
+        from app.shared.data_service import get_data_service
+        scores_data = get_data_service().get_scores_data() or {}
+
+        with self._lock:
+            # Reconstruir solo si DataService recargó los scores
+            if self._table is not None and self._scores_data is scores_data:
+                return self._table
+
+            images, participants, scores, ages, genders, states = [], [], [], [], [], []
+            for image_key, image_info in scores_data.items():
+                if not str(image_key).isdigit():
+                    continue
+                for entry in image_info.get('score_participant', []):
+                    images.append(int(image_key))
+                    participants.append(int(entry['participant']))
+                    scores.append(entry.get('score', np.nan))
+                    ages.append(entry.get('age', np.nan))
+                    genders.append(_normalize_text(entry.get('gener', '')))
+                    states.append(_normalize_text(entry.get('state', '')))
+
+            self._table = {
+                'image': np.asarray(images, dtype=np.int64),
+                'participant': np.asarray(participants, dtype=np.int64),
+                'score': np.asarray(scores, dtype=float),
+                'age': np.asarray(ages, dtype=float),
+                'gender': np.asarray(genders, dtype=object),
+                'state': np.asarray(states, dtype=object)
+            }
+            self._scores_data = scores_data
+            print(f"CohortService: {len(images)} filas (imagen, participante) indexadas")
+            return self._table
+
+    def row_mask(self, cohort, image_id=None):
+        """
+        Máscara booleana sobre las filas (imagen, participante) que cumplen el filtro
+
+        Args:
+            cohort: dict de parse_cohort_args
+            image_id: limitar a una imagen (None = todas)
+        """
+        table = self._get_table()
+        mask = np.ones(len(table['participant']), dtype=bool)
+
+        if image_id is not None:
+            mask &= table['image'] == int(image_id)
+        if 'min_score' in cohort:
+            mask &= table['score'] >= cohort['min_score']
+        if 'max_score' in cohort:
+            mask &= table['score'] <= cohort['max_score']
+        if 'age_min' in cohort:
+            mask &= table['age'] >= cohort['age_min']
+        if 'age_max' in cohort:
+            mask &= table['age'] <= cohort['age_max']
+        if 'gender' in cohort:
+            mask &= table['gender'] == cohort['gender']
+        if 'state' in cohort:
+            # Coincide con el estado completo ('sp/brasil') o con una parte ('brasil')
+            state = cohort['state']
+            mask &= np.fromiter(
+                (s == state or state in s.split('/') for s in table['state']),
+                dtype=bool, count=len(table['state'])
+            )
+        return mask
+
+    def get_participants(self, cohort, image_id=None):
+        """Participantes (ordenados) que cumplen el filtro en la imagen"""
+        table = self._get_table()
+        return np.unique(table['participant'][self.row_mask(cohort, image_id)])
+
+    def get_pair_keys(self, cohort, image_id=None):
+        """Claves (imagen << 32) + participante de las filas que cumplen el filtro"""
+        table = self._get_table()
+        mask = self.row_mask(cohort, image_id)
+        return (table['image'][mask] << 32) + table['participant'][mask]
+
+    def participant_mask(self, participants, cohort, image_id=None):
+        """
+        Máscara booleana sobre un array de participantes
+
+        Sin filtro retorna todo True (mismo resultado que no filtrar).
+        """
+        participants = np.asarray(participants)
+        if not cohort:
+            return np.ones(len(participants), dtype=bool)
+        return np.isin(participants, self.get_participants(cohort, image_id))
+
+
+def get_cohort_service():
+    """Retorna la instancia singleton del CohortService"""
+    return CohortService()
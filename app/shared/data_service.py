@@ -13,6 +13,15 @@ class DataService:
     _instance = None
     _initialized = False
 
+    # Mapeo de dataset a archivo CSV
+    DATASET_FILES = {
+        'main_class': 'static/data/df_final1.csv',
+        'grouped': 'static/data/FINAL_Group.csv',
+        'disorder': 'static/data/FINAL_20kDisorder.csv',
+        'grouped_disorder': 'static/data/FINAL_GroupDisorder.csv'
+    }
+    SCORES_FILE = 'static/data/data_hololens.json'
+
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DataService, cls).__new__(cls)
@@ -29,7 +38,7 @@ class DataService:
     def _load_scores(self):
         """Carga scores de participantes (común para todos los datasets)"""
         try:
-            scores_path = os.path.join(self.base_path, 'static', 'data', 'data_hololens.json')
+            scores_path = os.path.join(self.base_path, self.SCORES_FILE)
             if os.path.exists(scores_path):
                 with open(scores_path, 'r') as f:
                     self.scores_data = json.load(f)
@@ -57,13 +66,7 @@ class DataService:
         Returns:
             DataFrame con los datos del dataset seleccionado
         """
-        # Mapeo de dataset a archivo CSV
-        dataset_files = {
-            'main_class': 'static/data/df_final1.csv',
-            'grouped': 'static/data/FINAL_Group.csv',
-            'disorder': 'static/data/FINAL_20kDisorder.csv',
-            'grouped_disorder': 'static/data/FINAL_GroupDisorder.csv'
-        }
+        dataset_files = self.DATASET_FILES
 
         # Validar dataset_select
         if dataset_select not in dataset_files:
@@ -121,6 +124,47 @@ class DataService:
 
             return None
 
+    def get_dataset_path(self, dataset_select='main_class'):
+        """Ruta absoluta del CSV de un dataset"""
+        csv_path = self.DATASET_FILES.get(dataset_select, self.DATASET_FILES['main_class'])
+        return os.path.join(self.base_path, csv_path)
+
+    def get_data_version(self, dataset_select='main_class'):
+        """
+        Versión de los archivos de un dataset (CSV + scores)
+
+        Sirve para invalidar resultados pre-calculados o cacheados cuando cambian los datos.
+        """
+        from app.shared.result_cache import files_version
+        return files_version([
+            self.get_dataset_path(dataset_select),
+            os.path.join(self.base_path, self.SCORES_FILE)
+        ])
+
+    def get_class_columns(self, dataset_select='main_class', df=None):
+        """
+        Resuelve las columnas de clase, id de clase y color para un dataset
+
+        Args:
+            dataset_select: 'main_class', 'grouped', 'disorder', o 'grouped_disorder'
+            df: DataFrame a inspeccionar (por defecto el del dataset seleccionado)
+
+        Returns:
+            Tupla (class_column, class_id_column, color_column) o None si el
+            dataset agrupado no tiene columna de grupo
+        """
+        if dataset_select in ['grouped', 'grouped_disorder']:
+            if df is None:
+                df = self.get_data_by_dataset(dataset_select)
+            columns = df.columns if df is not None else []
+            for candidate in ['group', 'group_name', 'grupo']:
+                if candidate in columns:
+                    return candidate, 'group_class_id', 'hex_color'
+            return None
+
+        # main_class y disorder usan la clase ADE20K directamente
+        return 'main_class', 'class_id', 'hex_color'
+
     def clear_cache(self, dataset_select=None):
         """
         Limpia el cache de datasets
@@ -0,0 +1,273 @@
+"""
+DwellCubeService - Cubo pre-calculado de dwell time (imagen × participante × clase)
+Guarda, por variante de dataset y tipo de datos, un bloque disperso por imagen con
+el tiempo y la cantidad de muestras de cada (participante, clase), además de lo
+necesario para armar las matrices del heatmap (ranking de clases, ratios, colores).
+
+Cada bloque guarda además, por par (participante, clase), los tiempos de las muestras
+ordenados y el dwell acumulado, para responder ventanas temporales (t_start/t_end)
+con una sola búsqueda binaria sobre una clave (par, tiempo) en vez de re-agregar
+las muestras.
+
+Los cubos se generan offline con precalculate_dwell_cube.py y se cargan al iniciar;
+las imágenes que falten se calculan una vez en la primera solicitud.
+"""
+
+import os
+import threading
+
+import numpy as np
+import joblib
+
+# Versión del formato de los bloques (cubos en disco con otro formato se recalculan)
+CUBE_FORMAT_VERSION = 3
+
+
+class DwellCubeService:
+    """Singleton con los cubos de dwell time por (dataset_select, data_type)"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(DwellCubeService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.base_path = os.path.join(os.path.dirname(__file__), '..', '..')
+            self.cube_dir = os.path.join(self.base_path, 'static', 'data')
+            self.cubes = {}  # {(dataset_select, data_type): {'version': ..., 'blocks': {image_id: block}}}
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    def get_cube_path(self, dataset_select, data_type):
+        """Ruta del archivo del cubo de una variante"""
+        return os.path.join(self.cube_dir, f"dwell_cube_{dataset_select}_{data_type}.pkl")
+
+    def get_version(self, dataset_select, data_type):
+        """Versión de los datos de los que depende el cubo"""
+        from app.shared.data_service import get_data_service
+        version = (CUBE_FORMAT_VERSION, data_type) + get_data_service().get_data_version(dataset_select)
+        if data_type == 'fixations':
+            # Los bloques de fixations salen de fixation.csv (precomputed_service)
+            from app.shared.precomputed_fixation_service import get_precomputed_service
+            from app.shared.result_cache import files_version
+            version += files_version([get_precomputed_service().csv_path])
+        return version
+
+    def get_cube(self, dataset_select, data_type):
+        """
+        Retorna el cubo de una variante, cargándolo desde disco si está vigente
+
+        Un cubo (en memoria o en disco) generado con otra versión de los datos se descarta.
+        """
+        key = (dataset_select, data_type)
+        version = self.get_version(dataset_select, data_type)
+        with self._lock:
+            cube = self.cubes.get(key)
+            if cube is not None and cube['version'] == version:
+                return cube
+
+        cube = {'version': version, 'blocks': {}}
+
+        cube_path = self.get_cube_path(dataset_select, data_type)
+        if os.path.exists(cube_path):
+            try:
+                stored = joblib.load(cube_path)
+                if stored.get('version') == version:
+                    cube = stored
+                    print(f"DwellCubeService: Cubo '{dataset_select}/{data_type}' cargado ({len(cube['blocks'])} imágenes)")
+                else:
+                    print(f"ADVERTENCIA: DwellCubeService: Cubo '{dataset_select}/{data_type}' desactualizado, se recalculará")
+            except Exception as e:
+                print(f"ERROR: DwellCubeService: No se pudo cargar {cube_path}: {e}")
+
+        with self._lock:
+            current = self.cubes.get(key)
+            if current is not None and current['version'] == version:
+                return current
+            self.cubes[key] = cube
+            return cube
+
+    def get_block(self, dataset_select, data_type, image_id, builder):
+        """
+        Bloque de una imagen; si no existe se construye con builder() y se guarda
+
+        Args:
+            builder: función sin argumentos que retorna el bloque (dict)
+        """
+        cube = self.get_cube(dataset_select, data_type)
+        image_id = int(image_id)
+
+        block = cube['blocks'].get(image_id)
+        if block is None:
+            block = builder()
+            with self._lock:
+                cube['blocks'][image_id] = block
+        return block
+
+    def save_cube(self, dataset_select, data_type):
+        """Persiste el cubo de una variante"""
+        cube = self.get_cube(dataset_select, data_type)
+        cube_path = self.get_cube_path(dataset_select, data_type)
+        joblib.dump(cube, cube_path, compress=3)
+        return cube_path
+
+    def clear(self):
+        """Descarta los cubos en memoria"""
+        with self._lock:
+            self.cubes.clear()
+
+
+def build_dwell_block(df_sorted, df_filtered, class_column, class_id_column, color_column, valid_participants):
+    """
+    Construye el bloque de una imagen a partir de las muestras ya clasificadas
+
+    Args:
+        df_sorted: muestras con 'participante', class_column, 'delta_t' y 'sample_time'
+            (segundos desde el inicio de la visualización del participante)
+        df_filtered: puntos de gaze clasificados de la imagen (fuente de ratio, ids y colores)
+        class_column, class_id_column, color_column: columnas del dataset
+        valid_participants: participantes oficiales de la imagen
+
+    Returns:
+        dict con los pares (participante, clase) y metadatos por clase
+    """
+    grouped = df_sorted.groupby(['participante', class_column], dropna=False)['delta_t']
+    por_participante_clase = grouped.sum().reset_index().rename(columns={'delta_t': 'time_por_clase'})
+    por_participante_clase['count'] = grouped.size().to_numpy()
+
+    # Índice temporal por par (mismo orden de grupos que por_participante_clase)
+    sample_times = (
+        df_sorted['sample_time'].to_numpy(dtype=float)
+        if 'sample_time' in df_sorted.columns else np.full(len(df_sorted), np.nan)
+    )
+    time_index = build_time_index(
+        grouped.ngroup().to_numpy(), sample_times,
+        df_sorted['delta_t'].to_numpy(dtype=float), len(por_participante_clase)
+    )
+
+    # Ranking de clases por tiempo total en la imagen (mismo orden que el cálculo original)
+    suma_total_tiempo = (
+        por_participante_clase
+        .groupby(class_column)['time_por_clase']
+        .sum()
+        .reset_index()
+        .rename(columns={'time_por_clase': 'total_time_global'})
+        .sort_values(by='total_time_global', ascending=False)
+    )
+
+    # Ratio de cada clase en la imagen (solo valores válidos)
+    if 'ratio' in df_filtered.columns:
+        ratio_por_clase = (
+            df_filtered[[class_column, 'ratio']]
+            .dropna(subset=[class_column, 'ratio'])
+            .groupby(class_column)['ratio']
+            .mean()
+            .to_dict()
+        )
+    else:
+        ratio_por_clase = {}
+
+    # Primer class_id de cada clase (aunque sea NaN) y primer color no nulo
+    first_rows = df_filtered.drop_duplicates(subset=[class_column])
+    class_id_by_class = (
+        dict(zip(first_rows[class_column], first_rows[class_id_column]))
+        if class_id_column in df_filtered.columns else {}
+    )
+    color_by_class = (
+        df_filtered.groupby(class_column, sort=False)[color_column].first().dropna().to_dict()
+        if color_column in df_filtered.columns else {}
+    )
+
+    block = {
+        'valid_participants': sorted(valid_participants),
+        'pair_participants': por_participante_clase['participante'].to_numpy(),
+        'pair_classes': por_participante_clase[class_column].to_numpy(dtype=object),
+        'pair_time': por_participante_clase['time_por_clase'].to_numpy(dtype=float),
+        'pair_count': por_participante_clase['count'].to_numpy(dtype=np.int64),
+        'ranked_classes': suma_total_tiempo[class_column].tolist(),
+        'ratio_by_class': ratio_por_clase,
+        'class_id_by_class': class_id_by_class,
+        'color_by_class': color_by_class,
+        'total_data_points': len(df_filtered)
+    }
+    block.update(time_index)
+    return block
+
+
+def build_time_index(pair_codes, sample_times, dwell, n_pairs):
+    """
+    Arrays para consultar dwell por ventana temporal
+
+    Las muestras se ordenan por (par, tiempo); pair_offsets[k]:pair_offsets[k+1]
+    es el rango del par k y sample_cumdwell tiene un 0 inicial, de modo que el
+    dwell de un rango [a, b) es sample_cumdwell[b] - sample_cumdwell[a].
+
+    sample_keys = par * key_span + (tiempo - key_origin) es creciente en el mismo
+    orden; los tiempos no finitos van al final de su par (key_span - 1), fuera de
+    cualquier ventana.
+
+    Args:
+        pair_codes: índice de par (0..n_pairs-1) de cada muestra
+        sample_times: tiempo de cada muestra (NaN quedan al final de su par)
+        dwell: duración de cada muestra
+        n_pairs: cantidad de pares
+    """
+    pair_codes = np.asarray(pair_codes, dtype=np.int64)
+    sample_times = np.asarray(sample_times, dtype=float)
+    dwell = np.nan_to_num(np.asarray(dwell, dtype=float))
+
+    order = np.lexsort((sample_times, pair_codes))
+    pair_codes = pair_codes[order]
+    sample_times = sample_times[order]
+
+    finite = np.isfinite(sample_times)
+    key_origin = float(sample_times[finite].min()) if finite.any() else 0.0
+    width = float(sample_times[finite].max()) - key_origin if finite.any() else 0.0
+    # Tiempos en [0, width], ventanas recortadas a [-0.5, width + 0.5], no finitos en width + 1
+    key_span = width + 2.0
+    offsets_in_pair = np.where(finite, sample_times - key_origin, width + 1.0)
+
+    return {
+        'pair_offsets': np.searchsorted(pair_codes, np.arange(n_pairs + 1)),
+        'sample_times': sample_times,
+        'sample_keys': pair_codes * key_span + offsets_in_pair,
+        'key_origin': key_origin,
+        'key_span': key_span,
+        'sample_cumdwell': np.concatenate([[0.0], np.cumsum(dwell[order])])
+    }
+
+
+def window_pair_totals(time_index, t_start=None, t_end=None):
+    """
+    Dwell y cantidad de muestras de cada par con tiempo en [t_start, t_end)
+
+    Una sola búsqueda binaria de los límites de todos los pares sobre sample_keys:
+    O(pares × log n) por consulta, sin bucle por par.
+
+    Returns:
+        (pair_time, pair_count) alineados con los pares del índice
+    """
+    keys = time_index['sample_keys']
+    origin = time_index['key_origin']
+    span = time_index['key_span']
+    cumdwell = time_index['sample_cumdwell']
+    n_pairs = len(time_index['pair_offsets']) - 1
+
+    # Límites relativos al origen, recortados al rango de tiempos de un par
+    start = -0.5 if t_start is None else float(np.clip(float(t_start) - origin, -0.5, span - 1.5))
+    end = span - 1.5 if t_end is None else float(np.clip(float(t_end) - origin, -0.5, span - 1.5))
+
+    pair_base = np.arange(n_pairs) * span
+    bounds = np.searchsorted(keys, np.concatenate([pair_base + start, pair_base + end]), side='left')
+    lo, hi = bounds[:n_pairs], bounds[n_pairs:]
+
+    return cumdwell[hi] - cumdwell[lo], hi - lo
+
+
+def get_dwell_cube_service():
+    """Retorna la instancia singleton del DwellCubeService"""
+    return DwellCubeService()
@@ -0,0 +1,158 @@
+"""
+FixationLabelService - Clase semántica pre-calculada de cada fixation
+Para cada variante de dataset guarda, por imagen, la etiqueta de clase de las
+fixations pre-calculadas (fixation.csv) y el color de cada clase, para que el
+scarf plot en modo fixations no ejecute I-VT ni la búsqueda de vecinos en vivo.
+
+Las etiquetas se generan offline con precalculate_fixation_labels.py; las
+imágenes que falten se etiquetan una vez en la primera solicitud.
+"""
+
+import os
+import threading
+
+import joblib
+
+from app.shared.fixation_labeling import assign_fixation_classes, first_value_by_class
+
+
+class FixationLabelService:
+    """Singleton con las etiquetas de fixations por (dataset_select, imagen)"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(FixationLabelService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.base_path = os.path.join(os.path.dirname(__file__), '..', '..')
+            self.labels_dir = os.path.join(self.base_path, 'static', 'data')
+            self.stores = {}  # {dataset_select: {'version': ..., 'images': {image_id: {...}}}}
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    def get_store_path(self, dataset_select):
+        """Ruta del archivo de etiquetas de una variante"""
+        return os.path.join(self.labels_dir, f"fixation_labels_{dataset_select}.pkl")
+
+    def get_version(self, dataset_select):
+        """Versión de los datos de los que dependen las etiquetas (dataset + fixation.csv)"""
+        from app.shared.data_service import get_data_service
+        from app.shared.precomputed_fixation_service import get_precomputed_service
+        from app.shared.result_cache import files_version
+        return get_data_service().get_data_version(dataset_select) + files_version([get_precomputed_service().csv_path])
+
+    def get_store(self, dataset_select):
+        """Etiquetas de una variante, cargadas desde disco si están vigentes"""
+        with self._lock:
+            if dataset_select in self.stores:
+                return self.stores[dataset_select]
+
+        version = self.get_version(dataset_select)
+        store = {'version': version, 'images': {}}
+
+        store_path = self.get_store_path(dataset_select)
+        if os.path.exists(store_path):
+            try:
+                stored = joblib.load(store_path)
+                if stored.get('version') == version:
+                    store = stored
+                    print(f"FixationLabelService: Etiquetas '{dataset_select}' cargadas ({len(store['images'])} imágenes)")
+                else:
+                    print(f"ADVERTENCIA: FixationLabelService: Etiquetas '{dataset_select}' desactualizadas, se recalcularán")
+            except Exception as e:
+                print(f"ERROR: FixationLabelService: No se pudo cargar {store_path}: {e}")
+
+        with self._lock:
+            return self.stores.setdefault(dataset_select, store)
+
+    def get_labeled_fixations(self, image_id, dataset_select='main_class'):
+        """
+        Fixations pre-calculadas de una imagen con su clase y el color de cada clase
+
+        Returns:
+            (frame, class_colors) - frame con las columnas de get_image_fixations_frame
+            más 'class_label' (ordenado por participante y start), o (None, {}) si
+            no hay fixations pre-calculadas
+        """
+        store = self.get_store(dataset_select)
+        image_id = int(image_id)
+
+        entry = store['images'].get(image_id)
+        if entry is None:
+            entry = self.build_image_labels(image_id, dataset_select)
+            if entry is None:
+                return None, {}
+            with self._lock:
+                store['images'][image_id] = entry
+
+        from app.shared.precomputed_fixation_service import get_precomputed_service
+        frame = get_precomputed_service().get_image_fixations_frame(image_id)
+        if frame is None or len(frame) != len(entry['labels']):
+            return None, {}
+
+        frame['class_label'] = entry['labels']
+        return frame, entry['class_colors']
+
+    def build_image_labels(self, image_id, dataset_select='main_class'):
+        """
+        Etiqueta las fixations de una imagen con los gaze points clasificados
+
+        Mismo criterio que el cálculo en vivo del scarf plot: clase más común de
+        los puntos del participante a <= 50 px (ver assign_fixation_classes).
+        """
+        from app.shared.data_service import get_data_service
+        from app.shared.precomputed_fixation_service import get_precomputed_service
+
+        frame = get_precomputed_service().get_image_fixations_frame(image_id)
+        if frame is None:
+            return None
+
+        data_service = get_data_service()
+        data = data_service.get_data_by_dataset(dataset_select)
+        if data is None:
+            return None
+        columns = data_service.get_class_columns(dataset_select, data)
+        if columns is None:
+            return None
+        class_column, _, color_column = columns
+
+        # Gaze points clasificados de la imagen
+        points = data[data['ImageName'] == image_id]
+        points = points[
+            points[class_column].notna() &
+            (points[class_column].astype(str).str.strip() != '')
+        ]
+
+        labels = assign_fixation_classes(
+            frame['participante'].to_numpy(),
+            frame['x_centroid'].to_numpy(dtype=float),
+            frame['y_centroid'].to_numpy(dtype=float),
+            points,
+            class_column
+        )
+        return {
+            'labels': labels,
+            'class_colors': first_value_by_class(points, class_column, color_column)
+        }
+
+    def save_store(self, dataset_select):
+        """Persiste las etiquetas de una variante"""
+        store = self.get_store(dataset_select)
+        store_path = self.get_store_path(dataset_select)
+        joblib.dump(store, store_path, compress=3)
+        return store_path
+
+    def clear(self):
+        """Descarta las etiquetas en memoria"""
+        with self._lock:
+            self.stores.clear()
+
+
+def get_fixation_label_service():
+    """Retorna la instancia singleton del FixationLabelService"""
+    return FixationLabelService()
@@ -0,0 +1,125 @@
+"""
+Asignación de clase semántica a fixations en lote
+Reemplaza el bucle por fixation (distancias a todos los puntos del participante
++ mode()) con un KD-tree por participante y un conteo vectorizado, manteniendo
+exactamente las mismas etiquetas.
+"""
+
+import numpy as np
+import pandas as pd
+from scipy.spatial import cKDTree
+
+# Radio (px) para buscar gaze points cercanos a una fixation
+FIXATION_RADIUS = 50
+
+
+def assign_fixation_classes(fix_participants, fix_x, fix_y, points, class_column,
+                            radius=FIXATION_RADIUS, default_label='unknown'):
+    """
+    Clase más común de los gaze points del mismo participante a <= radius px
+
+    Mismo criterio que el cálculo original:
+      - Empates se resuelven con el menor valor (como Series.mode()[0])
+      - Si no hay puntos en el radio se usa el punto más cercano (el primero
+        en el orden del DataFrame si hay empate, como idxmin)
+      - Si el participante no tiene puntos la etiqueta es default_label
+
+    Args:
+        fix_participants, fix_x, fix_y: arrays con participante y centroide de cada fixation
+        points: DataFrame con 'participante', 'pixelX', 'pixelY' y class_column
+        class_column: columna de clase a asignar
+        radius: radio de búsqueda en píxeles
+        default_label: etiqueta cuando no hay puntos del participante
+
+    Returns:
+        np.ndarray (dtype object) con una etiqueta por fixation
+    """
+    fix_participants = np.asarray(fix_participants)
+    fix_x = np.asarray(fix_x, dtype=float)
+    fix_y = np.asarray(fix_y, dtype=float)
+    labels = np.full(len(fix_participants), default_label, dtype=object)
+
+    if len(fix_participants) == 0 or len(points) == 0:
+        return labels
+
+    # Códigos ordenados de clase: argmax de bincount elige el menor valor en empates
+    class_codes, class_values = pd.factorize(points[class_column], sort=True)
+    class_values = np.asarray(class_values, dtype=object)
+    n_classes = len(class_values)
+
+    point_participants = points['participante'].to_numpy()
+    point_x = points['pixelX'].to_numpy(dtype=float)
+    point_y = points['pixelY'].to_numpy(dtype=float)
+
+    for participant in pd.unique(fix_participants):
+        fix_idx = np.flatnonzero(fix_participants == participant)
+        point_idx = np.flatnonzero(point_participants == participant)
+        if len(point_idx) == 0:
+            continue
+
+        px = point_x[point_idx]
+        py = point_y[point_idx]
+        pc = class_codes[point_idx]
+        fx = fix_x[fix_idx]
+        fy = fix_y[fix_idx]
+
+        valid_points = np.flatnonzero(np.isfinite(px) & np.isfinite(py) & (pc >= 0))
+        valid_fix = np.isfinite(fx) & np.isfinite(fy)
+        if len(valid_points) == 0 or not valid_fix.any():
+            continue
+
+        # Vecinos candidatos con un radio apenas mayor y filtro exacto después
+        tree = cKDTree(np.column_stack([px[valid_points], py[valid_points]]))
+        queries = np.column_stack([fx[valid_fix], fy[valid_fix]])
+        neighbors = tree.query_ball_point(queries, r=radius * (1 + 1e-9) + 1e-9)
+
+        local_fix = np.flatnonzero(valid_fix)
+        lengths = np.fromiter((len(n) for n in neighbors), dtype=np.int64, count=len(neighbors))
+        owners = np.repeat(local_fix, lengths)
+        candidates = valid_points[np.concatenate(neighbors).astype(np.int64)] if lengths.sum() > 0 else np.empty(0, dtype=np.int64)
+
+        distances = np.sqrt((px[candidates] - fx[owners]) ** 2 + (py[candidates] - fy[owners]) ** 2)
+        inside = distances <= radius
+        owners = owners[inside]
+        candidates = candidates[inside]
+
+        # Conteo (fixation x clase) en un solo bincount
+        counts = np.bincount(
+            owners * n_classes + pc[candidates],
+            minlength=len(fix_idx) * n_classes
+        ).reshape(len(fix_idx), n_classes)
+        has_neighbors = counts.sum(axis=1) > 0
+
+        local_labels = np.full(len(fix_idx), default_label, dtype=object)
+        local_labels[has_neighbors] = class_values[counts[has_neighbors].argmax(axis=1)]
+
+        # Fallback: punto más cercano (fixations sin vecinos, normalmente muy pocas)
+        for j in np.flatnonzero(valid_fix & ~has_neighbors):
+            all_distances = np.sqrt((px - fx[j]) ** 2 + (py - fy[j]) ** 2)
+            if np.isnan(all_distances).all():
+                continue
+            closest = np.nanargmin(all_distances)
+            local_labels[j] = points[class_column].iat[point_idx[closest]]
+
+        labels[fix_idx] = local_labels
+
+    return labels
+
+
+def first_value_by_class(frame, class_column, value_column):
+    """
+    Primer valor no nulo de value_column por clase (en el orden del DataFrame)
+
+    Equivalente a frame[frame[class_column] == c][value_column].dropna().iloc[0]
+    para todas las clases a la vez.
+    """
+    if value_column not in frame.columns:
+        return {}
+    return frame.groupby(class_column, sort=False)[value_column].first().dropna().to_dict()
+
+
+def mean_value_by_class(frame, class_column, value_column):
+    """Promedio de value_column por clase (NaN si la clase no tiene valores)"""
+    if value_column not in frame.columns:
+        return {}
+    return frame.groupby(class_column, sort=False)[value_column].mean().to_dict()
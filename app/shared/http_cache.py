@@ -0,0 +1,68 @@
+"""
+Respuestas JSON cacheadas con ETag y GET condicional
+Los endpoints que son función pura de sus parámetros y de los archivos de datos
+guardan los bytes JSON en un ResultCache y responden 304 cuando el cliente ya
+tiene la misma versión (If-None-Match).
+"""
+
+import hashlib
+
+from flask import current_app, jsonify, request
+
+
+def compute_etag(body):
+    """ETag fuerte a partir de los bytes de la respuesta"""
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def cached_json_response(cache, key, compute, cacheable=None):
+    """
+    Retorna la respuesta JSON de key desde el cache o calculándola con compute()
+
+    Args:
+        cache: ResultCache donde se guardan los bytes serializados
+        key: clave hashable (ruta, parámetros normalizados, versión de datos)
+        compute: función sin argumentos que retorna el dict a serializar
+        cacheable: función(data) -> bool; por defecto no se cachean respuestas con 'error'
+
+    Returns:
+        Response con ETag (304 si coincide con If-None-Match)
+    """
+    state = {}
+
+    def load():
+        data = compute()
+        state['cacheable'] = cacheable(data) if cacheable else not (isinstance(data, dict) and 'error' in data)
+        return jsonify(data).get_data()
+
+    # Solicitudes concurrentes con la misma clave esperan un único cálculo
+    body = cache.get_or_load(key, load, cacheable=lambda _: state['cacheable'])
+    return conditional_response(body, 'application/json')
+
+
+def cached_bytes_response(cache, key, compute, mimetype, headers=None):
+    """
+    Igual que cached_json_response para contenido binario (PNG, arrays uint8)
+
+    Args:
+        compute: función sin argumentos que retorna los bytes (None = error, no se cachea)
+        headers: encabezados extra (p.ej. dimensiones del raster)
+
+    Returns:
+        Response con ETag, o None si compute() no produjo contenido
+    """
+    body = cache.get_or_load(key, compute)
+    if body is None:
+        return None
+    return conditional_response(body, mimetype, headers)
+
+
+def conditional_response(body, mimetype, headers=None):
+    """Response con ETag y revalidación obligatoria (304 si coincide con If-None-Match)"""
+    response = current_app.response_class(body, mimetype=mimetype)
+    for name, value in (headers or {}).items():
+        response.headers[name] = value
+    response.set_etag(compute_etag(body))
+    # El navegador puede guardar la respuesta pero debe revalidarla con el ETag
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
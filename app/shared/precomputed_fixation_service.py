@@ -9,6 +9,8 @@ import os
 import time
 from functools import lru_cache
 
+from app.shared.semantic_regions import encode_classes, fixation_regions, regions_payload
+
 def _safe_json_value(value, default_value='unknown'):
     """Función auxiliar para asegurar que los valores sean serializables a JSON."""
     if value is None:
@@ -191,6 +193,43 @@ class PrecomputedFixationService:
         except Exception as e:
             return {'error': f'Error retrieving precomputed fixations: {str(e)}'}
     
+    def get_image_fixations_frame(self, image_id):
+        """
+        Obtener todas las fijaciones de una imagen como DataFrame plano (sin iterrows).
+
+        Parameters:
+        -----------
+        image_id : int
+            ID de la imagen
+
+        Returns:
+        --------
+        DataFrame con columnas ['participante', 'start', 'end', 'duration',
+        'x_centroid', 'y_centroid', 'pointCount'] (mismo formato que I-VT),
+        o None si el servicio no está disponible
+        """
+        if self.fixations_df is None:
+            return None
+
+        columns = ['participante', 'start', 'end', 'duration', 'x_centroid', 'y_centroid', 'pointCount']
+        try:
+            subset = self.fixations_df.xs(image_id, level='image_id')
+        except KeyError:
+            return pd.DataFrame(columns=columns)
+
+        frame = subset.reset_index().rename(columns={
+            'participant_id': 'participante',
+            'start_time': 'start',
+            'end_time': 'end',
+            'point_count': 'pointCount'
+        })
+        frame = frame[columns].copy()
+        frame['participante'] = frame['participante'].astype('int')
+        for col in ['start', 'end', 'duration', 'x_centroid', 'y_centroid']:
+            frame[col] = frame[col].astype('float64')
+        frame['pointCount'] = frame['pointCount'].astype('int')
+        return frame.sort_values(['participante', 'start'], kind='mergesort').reset_index(drop=True)
+
     def get_patch_fixations_fast(self, image_id, pixel_bounds, patch_size=40):
         """
         Filtrar fijaciones por región de patch ultra-rápido.
@@ -269,122 +308,27 @@ class PrecomputedFixationService:
         if 'error' in fixations_result or not fixations_result['fixations']:
             return {'sequence': [], 'region_stats': {}, 'timeline': [], 'error': 'No fixations available'}
 
-        fixations = sorted(fixations_result['fixations'], key=lambda x: x['start_time'])
-
-        # Agrupar por región semántica consecutiva
-        regions = []
-        current_region = None
-        region_start = None
-        region_fixations = []
-
-        for fixation in fixations:
-            region = _safe_json_value(fixation['main_class'], 'unknown')
-
-            if region != current_region:
-                # Terminar región anterior
-                if current_region is not None:
-                    duration = fixation['start_time'] - region_start
-                    if min_duration <= duration <= max_duration:
-                        # Calcular centroide promedio y contar fijaciones
-                        avg_x = sum(f['x_centroid'] for f in region_fixations) / len(region_fixations) if region_fixations else 0
-                        avg_y = sum(f['y_centroid'] for f in region_fixations) / len(region_fixations) if region_fixations else 0
-                        regions.append({
-                            'region': current_region,
-                            'start_time': region_start,
-                            'end_time': fixation['start_time'],
-                            'duration': duration,
-                            'fixation_count': len(region_fixations),
-                            'centroid_x': avg_x,
-                            'centroid_y': avg_y
-                        })
-
-                # Iniciar nueva región
-                current_region = region
-                region_start = fixation['start_time']
-                region_fixations = [fixation]
-            else:
-                region_fixations.append(fixation)
-
-        # Agregar la última región
-        if current_region is not None and region_fixations:
-            duration = fixations[-1]['end_time'] - region_start
-            if min_duration <= duration <= max_duration:
-                avg_x = sum(f['x_centroid'] for f in region_fixations) / len(region_fixations)
-                avg_y = sum(f['y_centroid'] for f in region_fixations) / len(region_fixations)
-                regions.append({
-                    'region': current_region,
-                    'start_time': region_start,
-                    'end_time': fixations[-1]['end_time'],
-                    'duration': duration,
-                    'fixation_count': len(region_fixations),
-                    'centroid_x': avg_x,
-                    'centroid_y': avg_y
-                })
-
-        # Crear transiciones
-        sequence = []
-        for i in range(1, len(regions)):
-            prev_region = regions[i-1]
-            curr_region = regions[i]
-
-            sequence.append({
-                'from_region': prev_region['region'],
-                'to_region': curr_region['region'],
-                'time': curr_region['start_time'],
-                'duration': curr_region['start_time'] - prev_region['end_time']
-            })
-
-        # Estadísticas por región
-        region_stats = {}
-        for region in regions:
-            region_name = region['region']
-            if region_name not in region_stats:
-                region_stats[region_name] = {
-                    'total_duration': 0,
-                    'visit_count': 0,
-                    'first_visit': None,
-                    'last_visit': None,
-                    'centroid_x': 0,
-                    'centroid_y': 0
-                }
-
-            stats = region_stats[region_name]
-            stats['total_duration'] += region['duration']
-            stats['visit_count'] += 1
-            stats['centroid_x'] = region['centroid_x']
-            stats['centroid_y'] = region['centroid_y']
-
-            if stats['first_visit'] is None or region['start_time'] < stats['first_visit']:
-                stats['first_visit'] = region['start_time']
-            if stats['last_visit'] is None or region['end_time'] > stats['last_visit']:
-                stats['last_visit'] = region['end_time']
-
-        # Serializar timeline completo (compatible con renderScarfPlot)
-        timeline_serialized = []
-        for region in regions:
-            timeline_serialized.append({
-                'region': region.get('region', 'unknown'),
-                'start_time': float(region.get('start_time', 0.0)),
-                'end_time': float(region.get('end_time', region.get('start_time', 0.0))),
-                'duration': float(region.get('duration', 0.0)),
-                'fixation_count': int(region.get('fixation_count', 0)),
-                'centroid_x': float(region.get('centroid_x', 0.0)),
-                'centroid_y': float(region.get('centroid_y', 0.0))
-            })
+        fixations = pd.DataFrame(fixations_result['fixations']).sort_values('start_time', kind='mergesort')
+
+        # Estadías por región semántica consecutiva (filtradas por duración) y sus transiciones
+        codes, class_names = encode_classes(fixations['main_class'].to_numpy())
+        regions = fixation_regions(
+            codes,
+            fixations['start_time'].to_numpy(dtype=float),
+            fixations['end_time'].to_numpy(dtype=float),
+            fixations['x_centroid'].to_numpy(dtype=float),
+            fixations['y_centroid'].to_numpy(dtype=float),
+            min_duration, max_duration
+        )
+        payload = regions_payload(regions, class_names)
 
         end_time = time.time()
 
-        result = {
-            'sequence': sequence,
-            'region_stats': region_stats,
-            'timeline': timeline_serialized,
-            'processing_time': end_time - start_time,
-            'total_transitions': len(sequence),
-            'unique_regions': len(region_stats),
-            'source': 'precomputed_semantic_transitions'
-        }
+        result = dict(payload)
+        result['processing_time'] = end_time - start_time
+        result['source'] = 'precomputed_semantic_transitions'
 
-        print(f"TRANSITIONS: {len(sequence)} transiciones, {len(timeline_serialized)} segmentos en {end_time - start_time:.4f}s")
+        print(f"TRANSITIONS: {payload['total_transitions']} transiciones, {len(payload['timeline'])} segmentos en {end_time - start_time:.4f}s")
         return result
 
 # Instancia global del servicio
@@ -0,0 +1,234 @@
+"""
+ResultCache - Cache LRU acotado para respuestas ya serializadas
+Guarda los bytes JSON de una respuesta para que un hit no repita ni el
+cálculo ni la codificación.
+
+Opcionalmente las entradas expiran (ttl_seconds) y get_or_load() evita que
+varias solicitudes concurrentes con la misma clave calculen lo mismo: la
+primera calcula y las demás esperan su resultado (single-flight). Todos los
+caches quedan registrados para exponer sus estadísticas (get_cache_stats).
+"""
+
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+
+# Caches creados en el proceso, por nombre
+_registry = OrderedDict()
+_registry_lock = threading.Lock()
+
+
+class _Flight:
+    """Carga en curso de una clave (single-flight)"""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+class ResultCache:
+    """Cache LRU thread-safe limitado por cantidad de entradas, por bytes y opcionalmente por tiempo"""
+
+    def __init__(self, name, max_entries=256, max_bytes=64 * 1024 * 1024, ttl_seconds=None, sizeof=len):
+        """
+        Args:
+            name: nombre del cache en las estadísticas
+            ttl_seconds: vida máxima de una entrada (None = sin expiración)
+            sizeof: función valor -> bytes estimados (por defecto len, para bytes)
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.sizeof = sizeof
+        self.entries = OrderedDict()  # {key: (value, size, expires_at)}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0
+        self.load_waits = 0
+        self._inflight = {}  # {key: _Flight}
+        self._lock = threading.Lock()
+
+        with _registry_lock:
+            _registry[name] = self
+
+    def _lookup(self, key):
+        """Valor vigente de key (requiere el lock); descarta la entrada si expiró"""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        if expires_at is not None and time.monotonic() >= expires_at:
+            del self.entries[key]
+            self.total_bytes -= size
+            self.expirations += 1
+            return None
+        self.entries.move_to_end(key)
+        return value
+
+    def get(self, key):
+        """Retorna el valor guardado para key o None"""
+        with self._lock:
+            value = self._lookup(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Guarda value y expulsa las entradas más antiguas (o expiradas) si se excede el límite"""
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        expires_at = time.monotonic() + self.ttl_seconds if self.ttl_seconds else None
+
+        with self._lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous[1]
+
+            self.entries[key] = (value, size, expires_at)
+            self.total_bytes += size
+
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                _, (_, evicted_size, evicted_expires) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                if evicted_expires is not None and time.monotonic() >= evicted_expires:
+                    self.expirations += 1
+                else:
+                    self.evictions += 1
+
+    def get_or_load(self, key, loader, cacheable=None):
+        """
+        Retorna el valor de key, calculándolo con loader() una sola vez aunque
+        lleguen varias solicitudes concurrentes con la misma clave
+
+        Args:
+            loader: función sin argumentos que calcula el valor
+            cacheable: función(valor) -> bool; por defecto se cachea todo valor no None
+
+        Returns:
+            el valor (también cuando no es cacheable, p.ej. una respuesta de error)
+        """
+        while True:
+            with self._lock:
+                value = self._lookup(key)
+                if value is not None:
+                    self.hits += 1
+                    return value
+                flight = self._inflight.get(key)
+                leader = flight is None
+                if leader:
+                    flight = self._inflight[key] = _Flight()
+                    self.misses += 1
+                    self.loads += 1
+                else:
+                    self.load_waits += 1
+
+            if not leader:
+                flight.event.wait()
+                if not flight.failed:
+                    return flight.value
+                # La carga falló: reintentar (esta solicitud pasa a calcular)
+                continue
+
+            try:
+                value = loader()
+                if value is not None and (cacheable is None or cacheable(value)):
+                    self.set(key, value)
+                flight.value = value
+                return value
+            except BaseException:
+                flight.failed = True
+                raise
+            finally:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                flight.event.set()
+
+    def purge_expired(self):
+        """Elimina las entradas expiradas; retorna cuántas se eliminaron"""
+        if not self.ttl_seconds:
+            return 0
+        now = time.monotonic()
+        with self._lock:
+            expired = [key for key, (_, _, expires_at) in self.entries.items() if expires_at is not None and now >= expires_at]
+            for key in expired:
+                self.total_bytes -= self.entries.pop(key)[1]
+            self.expirations += len(expired)
+            return len(expired)
+
+    def clear(self):
+        """Vacía el cache"""
+        with self._lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        """Estadísticas del cache"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'name': self.name,
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'max_entries': self.max_entries,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'loads': self.loads,
+                'load_waits': self.load_waits,
+                'loading': len(self._inflight)
+            }
+
+
+def get_cache_stats():
+    """Estadísticas de todos los ResultCache registrados"""
+    with _registry_lock:
+        caches = list(_registry.values())
+    return [cache.stats() for cache in caches]
+
+
+def get_registered_cache(name):
+    """ResultCache registrado con ese nombre (o None)"""
+    with _registry_lock:
+        return _registry.get(name)
+
+
+def snap_rect(x, y, width, height, grid):
+    """
+    Ajusta un rectángulo a una grilla de grid píxeles
+
+    Las esquinas se redondean al múltiplo más cercano (mitades hacia arriba) para que selecciones casi
+    idénticas compartan la misma clave de cache.
+    """
+    if grid <= 1:
+        return x, y, width, height
+    x0 = int(math.floor(x / grid + 0.5)) * grid
+    y0 = int(math.floor(y / grid + 0.5)) * grid
+    x1 = int(math.floor((x + width) / grid + 0.5)) * grid
+    y1 = int(math.floor((y + height) / grid + 0.5)) * grid
+    return x0, y0, x1 - x0, y1 - y0
+
+
+def files_version(paths):
+    """Versión de un conjunto de archivos de datos (mtime y tamaño de cada uno)"""
+    version = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            version.append((os.path.basename(path), int(stat.st_mtime), stat.st_size))
+        except OSError:
+            version.append((os.path.basename(path), None, None))
+    return tuple(version)
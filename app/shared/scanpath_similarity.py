@@ -0,0 +1,188 @@
+"""
+Similitud entre scanpaths (secuencias de clases o de patches por participante)
+Cada scanpath es un array de enteros; la similitud de todos los pares de una
+imagen se calcula con programación dinámica vectorizada: todas las parejas
+avanzan juntas fila por fila de la matriz de DP y cada fila se resuelve con
+operaciones numpy, sin bucles Python por celda ni por pareja.
+
+Métodos:
+  - 'levenshtein': 1 - distancia de edición / largo de la secuencia más larga
+  - 'scanmatch': alineamiento global tipo ScanMatch (Needleman-Wunsch con matriz
+    de sustitución y penalización de gap), normalizado por el puntaje máximo
+"""
+
+import numpy as np
+
+SIMILARITY_METHODS = ['levenshtein', 'scanmatch']
+
+# Parejas procesadas a la vez (acota la memoria de las filas de DP)
+PAIR_CHUNK = 1024
+
+
+def collapse_repeats(sequence):
+    """Elimina repeticiones consecutivas (AAABBA -> ABA)"""
+    sequence = np.asarray(sequence, dtype=np.int64)
+    if len(sequence) < 2:
+        return sequence
+    keep = np.r_[True, sequence[1:] != sequence[:-1]]
+    return sequence[keep]
+
+
+def _pad(sequences, index, length, fill):
+    """Matriz (len(index), length) con las secuencias index rellenadas con fill"""
+    padded = np.full((len(index), length), fill, dtype=sequences[index[0]].dtype)
+    for row, seq_idx in enumerate(index):
+        seq = sequences[seq_idx]
+        padded[row, :len(seq)] = seq
+    return padded
+
+
+def _dp_last_cells(a, len_a, b, len_b, score, gap, maximize):
+    """
+    Última celda de la DP de alineamiento global para muchas parejas a la vez
+
+    Recurrencia (con signo según maximize):
+        D[i][j] = opt(D[i-1][j-1] + score(a[i-1], b[j-1]), D[i-1][j] + gap, D[i][j-1] + gap)
+
+    El término D[i][j-1] se resuelve con un acumulado: con gap lineal,
+    D[i][j] = opt_k(T[k] + gap * (j - k)), es decir accumulate(T - gap * j) + gap * j.
+
+    Args:
+        a, b: (P, La) y (P, Lb) secuencias rellenadas
+        len_a, len_b: largo real de cada secuencia
+        score: función (a_col (P, 1), b (P, Lb)) -> puntajes (P, Lb)
+        gap: costo/puntaje de inserción o borrado
+        maximize: True para puntajes (ScanMatch), False para costos (Levenshtein)
+    """
+    n_pairs, width = b.shape
+    # Costos de Levenshtein enteros: int32 es más rápido que float
+    steps = np.arange(width + 1, dtype=float if maximize else np.int32) * gap
+    accumulate = np.maximum.accumulate if maximize else np.minimum.accumulate
+    better = np.maximum if maximize else np.minimum
+
+    # Fila 0: solo inserciones
+    row = np.tile(steps, (n_pairs, 1))
+    result = row[np.arange(n_pairs), len_b]
+    candidate = np.empty_like(row)
+    for i in range(1, int(len_a.max(initial=0)) + 1):
+        candidate[:, 0] = i * gap
+        better(row[:, :-1] + score(a[:, i - 1:i], b), row[:, 1:] + gap, out=candidate[:, 1:])
+        candidate -= steps
+        row = accumulate(candidate, axis=1)
+        row += steps
+        # Parejas cuya secuencia a termina en esta fila
+        done = np.flatnonzero(len_a == i)
+        result[done] = row[done, len_b[done]]
+
+    return result
+
+
+def similarity_matrix(sequences, method='levenshtein', substitution=None, gap=0.0):
+    """
+    Matriz de similitud (n × n, en [0, 1] para levenshtein) entre todas las secuencias
+
+    Args:
+        sequences: lista de arrays de enteros (códigos de clase o índices de patch)
+        method: 'levenshtein' o 'scanmatch'
+        substitution: para scanmatch, matriz (n_códigos × n_códigos) de puntajes de
+            sustitución o función (códigos_a, códigos_b) -> puntajes (por defecto
+            +1 si coinciden y -1 si no)
+        gap: para scanmatch, puntaje (<= 0) de un gap
+
+    Returns:
+        np.ndarray float (n, n) simétrica con 1 en la diagonal
+    """
+    sequences = [np.asarray(seq, dtype=np.int64) for seq in sequences]
+    n = len(sequences)
+    matrix = np.eye(n)
+    if n < 2:
+        return matrix
+
+    lengths = np.array([len(seq) for seq in sequences], dtype=np.int64)
+    first, second = np.triu_indices(n, k=1)
+    # La secuencia corta como 'a': menos filas de DP
+    swap = lengths[first] > lengths[second]
+    first, second = np.where(swap, second, first), np.where(swap, first, second)
+    # Parejas de largo parecido en el mismo bloque (menos relleno)
+    by_length = np.lexsort((lengths[first], lengths[second]))
+    first, second = first[by_length], second[by_length]
+
+    if method == 'scanmatch':
+        if substitution is None:
+            n_codes = int(max((seq.max() for seq in sequences if len(seq)), default=0)) + 1
+            substitution = 2 * np.eye(n_codes) - 1
+        if callable(substitution):
+            substitute = substitution
+            used_codes = np.unique(np.concatenate(sequences))
+            max_score = float(np.max(substitute(used_codes, used_codes))) if len(used_codes) else 1.0
+        else:
+            table = np.asarray(substitution, dtype=float)
+            max_score = float(np.max(np.diag(table))) if len(table) else 1.0
+
+            def substitute(a_codes, b_codes):
+                return table[a_codes, b_codes]
+
+        def score(a_col, b):
+            # Relleno (-1) fuera de rango: se recorta y nunca se lee la celda
+            return substitute(np.clip(a_col, 0, None), np.clip(b, 0, None))
+        gap_value, maximize = float(gap), True
+    else:
+        def score(a_col, b):
+            return a_col != b
+        gap_value, maximize = 1, False
+
+    values = np.empty(len(first))
+    if not maximize:
+        sequences = [seq.astype(np.int32) for seq in sequences]
+    for lo in range(0, len(first), PAIR_CHUNK):
+        chunk_a = first[lo:lo + PAIR_CHUNK]
+        chunk_b = second[lo:lo + PAIR_CHUNK]
+        len_a = lengths[chunk_a]
+        len_b = lengths[chunk_b]
+        a = _pad(sequences, chunk_a, max(int(len_a.max()), 1), -1)
+        b = _pad(sequences, chunk_b, max(int(len_b.max()), 1), -2)
+        values[lo:lo + PAIR_CHUNK] = _dp_last_cells(a, len_a, b, len_b, score, gap_value, maximize)
+
+    longest = np.maximum(lengths[first], lengths[second]).astype(float)
+    if method == 'scanmatch':
+        similarity = np.where(longest > 0, values / (max_score * np.maximum(longest, 1)), 1.0)
+    else:
+        similarity = np.where(longest > 0, 1.0 - values / np.maximum(longest, 1), 1.0)
+
+    matrix[first, second] = similarity
+    matrix[second, first] = similarity
+    return matrix
+
+
+def patch_substitution(n_cols, patch_size, threshold=None):
+    """
+    Puntaje de sustitución de ScanMatch para secuencias de patches
+
+    El puntaje baja linealmente con la distancia entre centros de patch: +1 en el
+    mismo patch, 0 a threshold píxeles y -1 desde 2 * threshold (por defecto
+    threshold = 2 patches). Se calcula a partir de los índices de patch, sin
+    materializar la matriz (n_patches × n_patches).
+
+    Returns:
+        función (patches_a, patches_b) -> puntajes, para similarity_matrix
+    """
+    if threshold is None:
+        threshold = 2 * patch_size
+
+    def score(a_patches, b_patches):
+        a_rows, a_cols = np.divmod(a_patches, n_cols)
+        b_rows, b_cols = np.divmod(b_patches, n_cols)
+        distances = np.hypot(a_rows - b_rows, a_cols - b_cols) * patch_size
+        return np.clip(1.0 - distances / threshold, -1.0, 1.0)
+
+    return score
+
+
+def patch_sequence(xs, ys, patch_size=40, width=800, height=600):
+    """Índices de patch (fila * columnas + columna) de puntos en orden temporal, sin repeticiones"""
+    xs = np.asarray(xs, dtype=float)
+    ys = np.asarray(ys, dtype=float)
+    valid = np.isfinite(xs) & np.isfinite(ys) & (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    n_cols = int(np.ceil(width / patch_size))
+    patches = (ys[valid] // patch_size).astype(np.int64) * n_cols + (xs[valid] // patch_size).astype(np.int64)
+    return collapse_repeats(patches)
@@ -0,0 +1,337 @@
+"""
+Segmentación de scarf plots por run-length encoding
+Los segmentos (corridas de muestras consecutivas con la misma clase) se obtienen
+con np.diff sobre los códigos categóricos de clase en vez de recorrer filas.
+
+Nivel de detalle (LOD): con una resolución de pantalla (pixel_width o
+max_segments) los segmentos más cortos que un píxel se fusionan con la clase
+dominante de su píxel, así el payload y los rect del SVG escalan con el ancho
+de pantalla y no con la cantidad de muestras.
+"""
+
+import numpy as np
+import pandas as pd
+
+# Duración de la visualización de cada imagen en el eje del scarf plot (ms)
+SCARF_DURATION_MS = 15000.0
+
+DEFAULT_SEGMENT_COLOR = '#999999'
+
+# Resolución máxima aceptada en pixel_width / max_segments
+MAX_LOD_RESOLUTION = 20000
+
+
+def parse_lod_args(args):
+    """
+    Lee la resolución de request.args (pixel_width tiene prioridad sobre max_segments)
+
+    Returns:
+        int > 0 o None (sin fusión)
+    """
+    for name in ('pixel_width', 'max_segments'):
+        value = args.get(name, None, type=int)
+        if value is not None and value > 0:
+            return min(value, MAX_LOD_RESOLUTION)
+    return None
+
+
+def lod_min_duration(span, resolution):
+    """Duración de un píxel para un eje de largo span dibujado en resolution píxeles"""
+    if not resolution or span <= 0:
+        return None
+    return float(span) / resolution
+
+
+def merge_short_segments(codes, starts, ends, weights, min_duration, origin=None):
+    """
+    Fusiona los segmentos más cortos que min_duration (vectorizado)
+
+    Los segmentos cortos consecutivos que caen en el mismo píxel (intervalo de
+    min_duration desde origin) se reemplazan por uno solo con la clase
+    dominante (mayor suma de weights; empate = menor código). Después se unen
+    los segmentos vecinos de la misma clase. Los segmentos largos se conservan,
+    así que quedan a lo sumo ~2 segmentos por píxel.
+
+    Args:
+        codes: código entero de clase de cada segmento, en orden temporal
+        starts, ends: inicio y fin de cada segmento
+        weights: peso de cada segmento para elegir la clase dominante (puntos)
+        min_duration: duración de un píxel (None o <= 0 = sin fusión)
+
+    Returns:
+        (codes, starts, ends, weights, merged) - arrays fusionados y cantidad de
+        segmentos eliminados
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    weights = np.asarray(weights, dtype=float)
+    n = len(codes)
+    if n < 2 or not min_duration or min_duration <= 0:
+        return codes, starts, ends, weights, 0
+
+    if origin is None:
+        origin = starts[0]
+    short = (ends - starts) < min_duration
+    pixel = np.floor((starts - origin) / min_duration).astype(np.int64)
+
+    # Grupo nuevo en cada segmento largo, después de uno largo o al cambiar de píxel
+    new_group = np.ones(n, dtype=bool)
+    new_group[1:] = ~short[1:] | ~short[:-1] | (pixel[1:] != pixel[:-1])
+    group_first = np.flatnonzero(new_group)
+    group = np.cumsum(new_group) - 1
+    n_groups = len(group_first)
+
+    # Clase dominante de cada grupo: suma de pesos por (grupo, clase) con un bincount
+    n_codes = int(codes.max()) + 1
+    totals = np.bincount(group * n_codes + codes, weights=weights, minlength=n_groups * n_codes)
+    dominant = totals.reshape(n_groups, n_codes).argmax(axis=1)
+
+    group_starts = starts[group_first]
+    group_ends = np.maximum.reduceat(ends, group_first)
+    group_weights = np.add.reduceat(weights, group_first)
+
+    # Unir grupos vecinos con la misma clase
+    run_starts, _ = run_length_encode(dominant)
+    merged_codes = dominant[run_starts]
+    merged_starts = group_starts[run_starts]
+    merged_ends = np.maximum.reduceat(group_ends, run_starts)
+    merged_weights = np.add.reduceat(group_weights, run_starts)
+
+    return merged_codes, merged_starts, merged_ends, merged_weights, n - len(merged_codes)
+
+
+def merge_segment_dicts(segments, min_duration, class_key='class', count_key='points', origin=None):
+    """
+    merge_short_segments sobre una lista de dicts de segmento
+
+    Los dicts resultantes conservan las claves del primer segmento de cada
+    fusión, con clase, inicio, fin y conteo actualizados (y 'duration' si existe).
+
+    Returns:
+        (segments, merged)
+    """
+    if len(segments) < 2 or not min_duration:
+        return segments, 0
+
+    codes, classes = pd.factorize(pd.Series([segment[class_key] for segment in segments], dtype=object))
+    starts = np.fromiter((segment['start_time'] for segment in segments), dtype=float, count=len(segments))
+    ends = np.fromiter((segment['end_time'] for segment in segments), dtype=float, count=len(segments))
+    counts = np.fromiter((segment.get(count_key, 1) for segment in segments), dtype=float, count=len(segments))
+
+    merged_codes, merged_starts, merged_ends, merged_counts, merged = merge_short_segments(
+        codes, starts, ends, counts, min_duration, origin
+    )
+    if merged == 0:
+        return segments, 0
+
+    # Plantilla: primer segmento original de la clase (conserva color, source, etc.)
+    first_of_class = {}
+    for segment, code in zip(segments, codes):
+        first_of_class.setdefault(code, segment)
+
+    result = []
+    for code, start, end, count in zip(merged_codes, merged_starts, merged_ends, merged_counts):
+        segment = dict(first_of_class[code])
+        segment[class_key] = classes[code]
+        segment['start_time'] = float(start)
+        segment['end_time'] = float(end)
+        segment[count_key] = int(count)
+        if 'duration' in segment and end > start:
+            segment['duration'] = float(end - start)
+        result.append(segment)
+    return result, merged
+
+
+def run_length_encode(codes):
+    """
+    Corridas de valores iguales consecutivos
+
+    Returns:
+        (starts, ends) - índice de la primera y de la última muestra (inclusive) de cada corrida
+    """
+    codes = np.asarray(codes)
+    if len(codes) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    boundaries = np.flatnonzero(codes[1:] != codes[:-1]) + 1
+    starts = np.concatenate([[0], boundaries])
+    ends = np.concatenate([boundaries - 1, [len(codes) - 1]])
+    return starts, ends
+
+
+def build_segments(class_names, times, color_map, default_color=DEFAULT_SEGMENT_COLOR, max_time=SCARF_DURATION_MS,
+                   min_duration=None):
+    """
+    Segmentos del scarf plot de un participante
+
+    Args:
+        class_names: clase (ya normalizada a texto) de cada muestra, en orden temporal
+        times: tiempo normalizado (ms) de cada muestra
+        color_map: dict clase -> color
+        min_duration: duración de un píxel para fusionar segmentos cortos (None = sin LOD)
+
+    Returns:
+        (segments, merged) - lista de dicts {'class', 'start_time', 'end_time',
+        'points', 'color'} (el end_time del último segmento se limita a max_time)
+        y cantidad de segmentos fusionados por LOD
+    """
+    codes, classes = pd.factorize(np.asarray(class_names, dtype=object))
+    starts, ends = run_length_encode(codes)
+    if len(starts) == 0:
+        return [], 0
+
+    times = np.asarray(times, dtype=float)
+    start_times = times[starts]
+    end_times = times[ends].copy()
+    end_times[-1] = min(end_times[-1], max_time)
+    points = ends - starts + 1
+    segment_codes = codes[starts]
+
+    segment_codes, start_times, end_times, points, merged = merge_short_segments(
+        segment_codes, start_times, end_times, points, min_duration, origin=0.0
+    )
+
+    # Tabla de colores por código de clase (una búsqueda por clase, no por segmento)
+    color_table = [color_map.get(class_name, default_color) for class_name in classes]
+
+    return [
+        {
+            'class': classes[code],
+            'start_time': float(start),
+            'end_time': float(end),
+            'points': int(count),
+            'color': color_table[code]
+        }
+        for code, start, end, count in zip(segment_codes, start_times, end_times, points)
+    ], merged
+
+
+def build_fixation_segments(class_labels, starts, durations, point_counts, color_map,
+                            default_color=DEFAULT_SEGMENT_COLOR, max_time=SCARF_DURATION_MS,
+                            min_duration=None):
+    """
+    Segmentos del scarf plot de un participante en modo fixations (uno por fixation)
+
+    Args:
+        class_labels: clase asignada a cada fixation, en orden de inicio
+        starts: inicio de cada fixation (s); se normaliza a 0-max_time entre el
+            primer y el último inicio del participante
+        durations: duración de cada fixation (s)
+        point_counts: gaze points de cada fixation
+        color_map: dict clase -> color
+        min_duration: duración de un píxel para fusionar fixations cortas (None = sin LOD)
+
+    Returns:
+        (segments, time_range, merged) - lista de dicts {'class', 'start_time',
+        'end_time', 'points', 'color'}, rango de inicios sin normalizar y
+        cantidad de segmentos fusionados por LOD
+    """
+    starts = np.asarray(starts, dtype=float)
+    if len(starts) == 0:
+        return [], 0.0, 0
+
+    min_time = starts.min()
+    time_range = starts.max() - min_time
+    divisor = time_range if time_range > 0 else 1
+
+    start_norm = ((starts - min_time) / divisor) * max_time
+    end_norm = start_norm + np.asarray(durations, dtype=float) * 1000  # duration en segundos
+    start_norm = np.clip(start_norm, 0.0, max_time)
+    end_norm = np.clip(end_norm, 0.0, max_time)
+
+    codes, labels = pd.factorize(pd.Series(class_labels, dtype=object), use_na_sentinel=False)
+    codes, start_norm, end_norm, point_counts, merged = merge_short_segments(
+        codes, start_norm, end_norm, point_counts, min_duration, origin=0.0
+    )
+
+    # Una búsqueda de color por clase, no por fixation
+    color_table = [color_map.get(label, default_color) for label in labels]
+
+    segments = [
+        {
+            'class': str(labels[code]),
+            'start_time': float(start),
+            'end_time': float(end),
+            'points': int(count),
+            'color': color_table[code]
+        }
+        for code, start, end, count in zip(codes, start_norm, end_norm, point_counts)
+    ]
+    return segments, float(time_range), merged
+
+
+def segments_from_arrays(codes, starts, ends, points, classes, colors):
+    """Lista de dicts de segmento (formato de get_scarf_plot_data) desde arrays de timeline"""
+    return [
+        {
+            'class': classes[code],
+            'start_time': float(start),
+            'end_time': float(end),
+            'points': int(count),
+            'color': colors[code]
+        }
+        for code, start, end, count in zip(np.asarray(codes).tolist(), starts, ends, points)
+    ]
+
+
+def pair_offsets(segment_pair, n_pairs):
+    """Offsets (n_pairs + 1) de los segmentos de cada par en arrays ordenados por par"""
+    return np.searchsorted(segment_pair, np.arange(n_pairs + 1)).astype(np.int64)
+
+
+def build_region_timelines(images, participants, times, names):
+    """
+    Timelines de regiones de muchos (imagen, participante) en una sola pasada
+
+    Una corrida de muestras consecutivas se corta al cambiar de par, al cambiar
+    la región o cuando el tiempo no avanza (NaN).
+
+    Args:
+        images, participants, times, names: arrays ordenados por (imagen, participante, tiempo)
+
+    Returns:
+        dict de arrays de timeline ('image', 'participant', 'offsets', 'total_points',
+        't_min', 't_max', 'time_range', 'codes', 'start', 'end', 'points', 'classes');
+        start/end en el tiempo original
+    """
+    images = np.asarray(images, dtype=np.int64)
+    participants = np.asarray(participants, dtype=np.int64)
+    times = np.asarray(times, dtype=float)
+    codes, classes = pd.factorize(pd.Series(names, dtype=object), use_na_sentinel=False)
+    n = len(codes)
+
+    new_pair = np.ones(n, dtype=bool)
+    new_pair[1:] = (images[1:] != images[:-1]) | (participants[1:] != participants[:-1])
+    with np.errstate(invalid='ignore'):
+        # Comparaciones con NaN son False: el tiempo "no avanza" y se corta la corrida
+        advancing = times[1:] >= times[:-1]
+    new_segment = new_pair.copy()
+    new_segment[1:] |= (codes[1:] != codes[:-1]) | ~advancing
+
+    pair_first = np.flatnonzero(new_pair)
+    segment_first = np.flatnonzero(new_segment)
+    segment_last = np.r_[segment_first[1:] - 1, n - 1] if n else segment_first
+    segment_pair = (np.cumsum(new_pair) - 1)[segment_first]
+
+    if n:
+        with np.errstate(invalid='ignore'):
+            t_min = np.fmin.reduceat(times, pair_first)
+            t_max = np.fmax.reduceat(times, pair_first)
+    else:
+        t_min = t_max = np.empty(0)
+
+    return {
+        'image': images[pair_first],
+        'participant': participants[pair_first],
+        'offsets': pair_offsets(segment_pair, len(pair_first)),
+        'total_points': np.diff(np.r_[pair_first, n]).astype(np.int64),
+        't_min': t_min,
+        't_max': t_max,
+        'time_range': t_max - t_min,
+        'codes': codes[segment_first].astype(np.int64),
+        'start': times[segment_first],
+        'end': times[segment_last],
+        'points': (segment_last - segment_first + 1).astype(np.int64),
+        'classes': [str(c) for c in classes]
+    }
@@ -0,0 +1,265 @@
+"""
+SegmentationService - Acceso a las máscaras de segmentación por imagen
+Permite etiquetar coordenadas de gaze/fixations con la clase semántica real
+(datos_seg/<image_id>.pkl) en lugar de umbrales fijos.
+
+Si existe datos_seg/<image_id>.npy (uint16, generado por
+precalculate_segmentation.py) se usa con memory-map en lugar del pkl, y la
+tabla (imagen, class_id) -> ratio de píxeles se lee de
+static/data/segmentation_class_ratios.csv.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import joblib
+
+# Espacio de coordenadas de los datos de eye tracking
+DATA_WIDTH = 800
+DATA_HEIGHT = 600
+
+
+class SegmentationService:
+    """Singleton para cargar máscaras de segmentación y etiquetar coordenadas"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(SegmentationService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self, max_masks=32):
+        if not self._initialized:
+            self.base_path = os.path.join(os.path.dirname(__file__), '..', '..')
+            self.seg_dir = os.path.join(self.base_path, 'static', 'images', 'images', 'datos_seg')
+            self.ratios_path = os.path.join(self.base_path, 'static', 'data', 'segmentation_class_ratios.csv')
+            self.max_masks = max_masks
+            self.masks = OrderedDict()  # LRU {image_id: np.ndarray}
+            self.class_ratios = None  # {image_id: {class_id: ratio}}
+            self.label_maps = {}  # {dataset_select: {class_id: label}}
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    def get_mask_path(self, image_id):
+        """Ruta del pkl de segmentación de una imagen"""
+        return os.path.join(self.seg_dir, f"{int(image_id)}.pkl")
+
+    def get_npy_path(self, image_id):
+        """Ruta de la máscara compacta (uint16) de una imagen"""
+        return os.path.join(self.seg_dir, f"{int(image_id)}.npy")
+
+    def load_mask(self, image_id):
+        """
+        Carga la máscara desde disco sin pasar por el cache
+
+        Prefiere el .npy compacto con memory-map; si no existe, deserializa el pkl.
+        """
+        npy_path = self.get_npy_path(image_id)
+        if os.path.exists(npy_path):
+            try:
+                return np.load(npy_path, mmap_mode='r')
+            except Exception as e:
+                print(f"ERROR: SegmentationService: No se pudo cargar {npy_path}: {e}")
+
+        pkl_path = self.get_mask_path(image_id)
+        if not os.path.exists(pkl_path):
+            print(f"ADVERTENCIA: SegmentationService: No se encontró {pkl_path}")
+            return None
+
+        try:
+            mask = np.asarray(joblib.load(pkl_path))
+        except Exception as e:
+            print(f"ERROR: SegmentationService: No se pudo cargar {pkl_path}: {e}")
+            return None
+
+        # Los class_id de ADE20K caben en uint16 (4x menos memoria que int64)
+        if mask.size > 0 and mask.min() >= 0 and mask.max() <= np.iinfo(np.uint16).max:
+            mask = mask.astype(np.uint16)
+        return mask
+
+    def get_mask(self, image_id):
+        """
+        Retorna la máscara de segmentación (alto x ancho, class_id por píxel)
+
+        Mantiene un LRU de max_masks máscaras en memoria.
+
+        Returns:
+            np.ndarray o None si no existe el archivo
+        """
+        image_id = int(image_id)
+        with self._lock:
+            if image_id in self.masks:
+                self.masks.move_to_end(image_id)
+                return self.masks[image_id]
+
+        mask = self.load_mask(image_id)
+        if mask is None:
+            return None
+
+        with self._lock:
+            self.masks[image_id] = mask
+            self.masks.move_to_end(image_id)
+            while len(self.masks) > self.max_masks:
+                self.masks.popitem(last=False)
+        return mask
+
+    @staticmethod
+    def compute_class_ratios(mask):
+        """
+        Ratio de píxeles de cada class_id de una máscara (un solo np.bincount)
+
+        Returns:
+            dict {class_id: ratio} solo con las clases presentes
+        """
+        counts = np.bincount(np.asarray(mask).ravel().astype(np.intp))
+        present = np.flatnonzero(counts)
+        total = mask.size
+        return {int(cid): float(counts[cid]) / total for cid in present} if total > 0 else {}
+
+    def _load_class_ratios(self):
+        """Carga la tabla pre-calculada de ratios si existe"""
+        class_ratios = {}
+        if os.path.exists(self.ratios_path):
+            try:
+                table = pd.read_csv(self.ratios_path)
+                for image_id, group in table.groupby('image_id'):
+                    class_ratios[int(image_id)] = dict(zip(group['class_id'].astype(int), group['ratio'].astype(float)))
+                print(f"SegmentationService: Ratios de clase cargados ({len(class_ratios)} imágenes)")
+            except Exception as e:
+                print(f"ERROR: SegmentationService: No se pudo cargar {self.ratios_path}: {e}")
+                class_ratios = {}
+        return class_ratios
+
+    def get_class_ratios(self, image_id):
+        """
+        Tabla class_id -> ratio de píxeles de una imagen
+
+        Usa la tabla pre-calculada; si la imagen no está, la calcula desde la
+        máscara y la guarda en memoria.
+
+        Returns:
+            dict {class_id: ratio} o None si no hay máscara
+        """
+        image_id = int(image_id)
+        if self.class_ratios is None:
+            self.class_ratios = self._load_class_ratios()
+
+        if image_id in self.class_ratios:
+            return self.class_ratios[image_id]
+
+        mask = self.get_mask(image_id)
+        if mask is None:
+            return None
+
+        ratios = self.compute_class_ratios(mask)
+        self.class_ratios[image_id] = ratios
+        return ratios
+
+    def get_class_ratio(self, image_id, class_id):
+        """
+        Fracción de píxeles de la imagen con class_id
+
+        Returns:
+            float (0.0 si la clase no aparece) o None si no hay máscara
+        """
+        ratios = self.get_class_ratios(image_id)
+        if ratios is None:
+            return None
+        try:
+            class_id = float(class_id)
+        except (TypeError, ValueError):
+            return 0.0
+        if not np.isfinite(class_id) or class_id != int(class_id):
+            return 0.0
+        return ratios.get(int(class_id), 0.0)
+
+    def lookup_class_ids(self, image_id, xs, ys):
+        """
+        Obtiene el class_id de la máscara para cada coordenada (vectorizado)
+
+        Las coordenadas están en el espacio de datos 800x600 con el eje Y
+        invertido (y=0 abajo), igual que en la visualización; se escalan a la
+        resolución de la máscara.
+
+        Args:
+            image_id: ImageName de la imagen
+            xs, ys: arrays de coordenadas en espacio de datos
+
+        Returns:
+            np.ndarray de class_ids (-1 para coordenadas inválidas o sin máscara)
+        """
+        xs = np.asarray(xs, dtype=float)
+        ys = np.asarray(ys, dtype=float)
+        class_ids = np.full(xs.shape, -1, dtype=np.int64)
+
+        mask = self.get_mask(image_id)
+        if mask is None or xs.size == 0:
+            return class_ids
+
+        mask_height, mask_width = mask.shape[:2]
+        cols = np.floor(xs * (mask_width / DATA_WIDTH))
+        rows = np.floor((DATA_HEIGHT - ys) * (mask_height / DATA_HEIGHT))
+
+        valid = (
+            np.isfinite(cols) & np.isfinite(rows) &
+            (cols >= 0) & (cols < mask_width) &
+            (rows >= 0) & (rows < mask_height)
+        )
+        class_ids[valid] = mask[rows[valid].astype(np.intp), cols[valid].astype(np.intp)]
+        return class_ids
+
+    def get_label_map(self, dataset_select='main_class'):
+        """
+        Mapeo class_id (ADE20K) -> etiqueta de clase para un dataset
+
+        Para los datasets agrupados la etiqueta es el nombre del grupo.
+        """
+        if dataset_select in self.label_maps:
+            return self.label_maps[dataset_select]
+
+        label_map = {}
+        try:
+            from app.shared.data_service import get_data_service
+            data_service = get_data_service()
+            df = data_service.get_data_by_dataset(dataset_select)
+            columns = data_service.get_class_columns(dataset_select, df)
+            if df is not None and columns is not None and 'class_id' in df.columns:
+                class_column = columns[0]
+                pairs = df[['class_id', class_column]].dropna().drop_duplicates(subset=['class_id'])
+                label_map = {
+                    int(cid): str(label).strip()
+                    for cid, label in zip(pairs['class_id'], pairs[class_column])
+                    if str(label).strip()
+                }
+        except Exception as e:
+            print(f"ERROR: SegmentationService: No se pudo construir mapa de etiquetas '{dataset_select}': {e}")
+
+        self.label_maps[dataset_select] = label_map
+        return label_map
+
+    def label_points(self, image_id, xs, ys, dataset_select='main_class', default_label='unknown'):
+        """
+        Etiqueta coordenadas con la clase semántica de la máscara
+
+        Returns:
+            np.ndarray (dtype object) con una etiqueta por coordenada
+        """
+        class_ids = self.lookup_class_ids(image_id, xs, ys)
+        label_map = self.get_label_map(dataset_select)
+
+        unique_ids, inverse = np.unique(class_ids, return_inverse=True)
+        unique_labels = np.array(
+            [label_map.get(int(cid), default_label) for cid in unique_ids],
+            dtype=object
+        )
+        return unique_labels[inverse.reshape(class_ids.shape)]
+
+
+def get_segmentation_service():
+    """Retorna la instancia singleton del SegmentationService"""
+    return SegmentationService()
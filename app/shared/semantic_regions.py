@@ -0,0 +1,205 @@
+"""
+Regiones semánticas y transiciones de un participante
+Agrupa muestras consecutivas (gaze points o fixations) de la misma clase en
+estadías, las filtra por MIN_STAY_DURATION / MAX_STAY_DURATION y arma las
+transiciones y estadísticas por región que usan los endpoints del glyph.
+
+Todo se calcula sobre arrays de códigos de clase con run-length encoding y
+np.add.reduceat / np.bincount; solo la serialización final recorre listas.
+"""
+
+import numpy as np
+import pandas as pd
+
+from app.shared.scarf_segments import run_length_encode
+
+MIN_STAY_DURATION = 0.2  # Mínimo 200ms en una región semántica
+MAX_STAY_DURATION = 5.0  # Máximo 5s por estadía (filtrar anomalías)
+
+
+def extract_regions(codes, starts, ends=None, xs=None, ys=None, min_duration=MIN_STAY_DURATION,
+                    max_duration=MAX_STAY_DURATION, min_samples=1, until_next=False, keep_first_short=False):
+    """
+    Estadías (corridas de misma clase) de una secuencia ordenada por tiempo
+
+    Args:
+        codes: código de clase de cada muestra
+        starts, ends: inicio y fin de cada muestra (ends = starts para gaze points)
+        xs, ys: posición de cada muestra (para el centroide de la estadía)
+        min_duration, max_duration: rango válido de duración (None = sin límite)
+        min_samples: muestras mínimas de una estadía (las más cortas se descartan)
+        until_next: la estadía dura hasta el inicio de la siguiente (la última
+            hasta el fin de su última muestra); si no, hasta el fin de su última muestra
+        keep_first_short: conservar la primera estadía demasiado corta si aparece
+            antes de cualquier estadía válida (evita participantes vacíos)
+
+    Returns:
+        dict de arrays de las estadías conservadas: 'code', 'start', 'end',
+        'duration', 'count', 'centroid_x', 'centroid_y'
+    """
+    codes = np.asarray(codes)
+    starts = np.asarray(starts, dtype=float)
+    ends = starts if ends is None else np.asarray(ends, dtype=float)
+    xs = np.zeros(len(codes)) if xs is None else np.asarray(xs, dtype=float)
+    ys = np.zeros(len(codes)) if ys is None else np.asarray(ys, dtype=float)
+
+    run_starts, run_ends = run_length_encode(codes)
+    counts = run_ends - run_starts + 1
+    region_start = starts[run_starts]
+    if until_next and len(run_starts):
+        region_end = np.r_[starts[run_starts[1:]], ends[-1]]
+    else:
+        region_end = ends[run_ends]
+    duration = region_end - region_start
+
+    eligible = counts >= min_samples
+    too_short = (duration < min_duration) if min_duration is not None else np.zeros(len(counts), dtype=bool)
+    too_long = (duration > max_duration) if max_duration is not None else np.zeros(len(counts), dtype=bool)
+    keep = eligible & ~too_short & ~too_long
+
+    if keep_first_short:
+        first_valid = np.flatnonzero(keep)
+        first_short = np.flatnonzero(eligible & too_short)
+        if len(first_short) and (not len(first_valid) or first_short[0] < first_valid[0]):
+            keep[first_short[0]] = True
+
+    if len(run_starts):
+        sum_x = np.add.reduceat(xs, run_starts)
+        sum_y = np.add.reduceat(ys, run_starts)
+    else:
+        sum_x = sum_y = np.empty(0)
+
+    return {
+        'code': codes[run_starts][keep],
+        'start': region_start[keep],
+        'end': region_end[keep],
+        'duration': duration[keep],
+        'count': counts[keep],
+        'centroid_x': (sum_x / np.maximum(counts, 1))[keep],
+        'centroid_y': (sum_y / np.maximum(counts, 1))[keep]
+    }
+
+
+def fixation_regions(codes, starts, ends, xs, ys, min_duration=MIN_STAY_DURATION, max_duration=MAX_STAY_DURATION):
+    """Estadías de fixations: cada estadía dura hasta la primera fixation de la siguiente"""
+    return extract_regions(codes, starts, ends, xs, ys, min_duration, max_duration, until_next=True)
+
+
+def gaze_regions(codes, times, xs, ys, min_duration=MIN_STAY_DURATION, max_duration=MAX_STAY_DURATION):
+    """
+    Estadías de gaze points: al menos dos puntos, duración entre el primero y el
+    último; la primera estadía corta se conserva si no hubo una válida antes
+    """
+    return extract_regions(codes, times, None, xs, ys, min_duration, max_duration,
+                           min_samples=2, keep_first_short=True)
+
+
+def region_transitions(regions):
+    """
+    Transiciones entre estadías consecutivas de distinta clase
+
+    Returns:
+        dict de arrays 'from', 'to', 'time' (inicio de la estadía destino),
+        'duration' (pausa entre ambas), 'from_stay', 'to_stay'
+    """
+    codes = regions['code']
+    change = np.flatnonzero(codes[1:] != codes[:-1])
+    return {
+        'from': codes[change],
+        'to': codes[change + 1],
+        'time': regions['start'][change + 1],
+        'duration': regions['start'][change + 1] - regions['end'][change],
+        'from_stay': regions['duration'][change],
+        'to_stay': regions['duration'][change + 1]
+    }
+
+
+def regions_payload(regions, class_names):
+    """
+    Formato de los endpoints del glyph: 'sequence', 'region_stats', 'timeline',
+    'total_transitions' y 'unique_regions'
+
+    Las estadísticas por región (visitas, duración total, primera y última visita,
+    muestras y centroide promedio ponderado por muestras) se agregan con bincount.
+
+    Args:
+        regions: dict de extract_regions
+        class_names: nombre de cada código de clase
+    """
+    names = [str(name) for name in class_names]
+    codes = regions['code']
+    transitions = region_transitions(regions)
+
+    sequence = [{
+        'from_region': names[a],
+        'to_region': names[b],
+        'time': float(t),
+        'duration': float(d),
+        'from_stay_duration': float(from_stay),
+        'to_stay_duration': float(to_stay)
+    } for a, b, t, d, from_stay, to_stay in zip(
+        transitions['from'], transitions['to'], transitions['time'], transitions['duration'],
+        transitions['from_stay'], transitions['to_stay']
+    )]
+
+    region_stats = {}
+    if len(codes):
+        # Códigos en orden de primera visita
+        order, first_index = np.unique(codes, return_index=True)
+        order = order[np.argsort(first_index)]
+        n_codes = int(codes.max()) + 1
+        counts = regions['count'].astype(float)
+        visits = np.bincount(codes, minlength=n_codes)
+        total_duration = np.bincount(codes, weights=regions['duration'], minlength=n_codes)
+        samples = np.bincount(codes, weights=counts, minlength=n_codes)
+        centroid_x = np.bincount(codes, weights=regions['centroid_x'] * counts, minlength=n_codes)
+        centroid_y = np.bincount(codes, weights=regions['centroid_y'] * counts, minlength=n_codes)
+        first_visit = np.full(n_codes, np.inf)
+        last_visit = np.full(n_codes, -np.inf)
+        np.minimum.at(first_visit, codes, regions['start'])
+        np.maximum.at(last_visit, codes, regions['end'])
+
+        for code in order:
+            region_stats[names[code]] = {
+                'visit_count': int(visits[code]),
+                'total_duration': float(total_duration[code]),
+                'fixation_count': int(samples[code]),
+                'first_visit': float(first_visit[code]),
+                'last_visit': float(last_visit[code]),
+                'centroid_x': float(centroid_x[code] / samples[code]),
+                'centroid_y': float(centroid_y[code] / samples[code])
+            }
+
+    timeline = [{
+        'region': names[code],
+        'start_time': float(start),
+        'end_time': float(end),
+        'duration': float(duration),
+        'fixation_count': int(count),
+        'centroid_x': float(cx),
+        'centroid_y': float(cy)
+    } for code, start, end, duration, count, cx, cy in zip(
+        codes, regions['start'], regions['end'], regions['duration'], regions['count'],
+        regions['centroid_x'], regions['centroid_y']
+    )]
+
+    return {
+        'sequence': sequence,
+        'region_stats': region_stats,
+        'timeline': timeline,
+        'total_transitions': len(sequence),
+        'unique_regions': len(region_stats)
+    }
+
+
+def encode_classes(values, default='unknown'):
+    """
+    Códigos de clase de una secuencia de nombres (vacíos / NaN -> default)
+
+    Returns:
+        (codes np.ndarray, class_names lista)
+    """
+    names = pd.Series(values, dtype=object)
+    names = names.where(names.notna() & (names.astype(str).str.strip() != ''), default).astype(str)
+    codes, classes = pd.factorize(names)
+    return codes.astype(np.int64), list(classes)
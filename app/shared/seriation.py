@@ -0,0 +1,103 @@
+"""
+Seriación de matrices (reordenamiento de filas/columnas) en el servidor
+Reemplaza el optimal_leaf_order de reorder.js en el navegador: las permutaciones
+se calculan una vez por matriz y se guardan en un cache LRU.
+"""
+
+import hashlib
+
+import numpy as np
+from scipy.cluster.hierarchy import linkage, leaves_list
+from scipy.spatial.distance import pdist, squareform
+
+from app.shared.result_cache import ResultCache
+
+# Órdenes soportados en el parámetro order=
+SERIATION_ORDERS = ['olo', 'spectral']
+
+_order_cache = ResultCache('seriation', max_entries=2048, max_bytes=16 * 1024 * 1024)
+
+
+def optimal_leaf_order(matrix):
+    """
+    Orden de hojas óptimo del clustering jerárquico (complete, euclídea)
+
+    Mismo criterio por defecto que reorder.optimal_leaf_order().
+    """
+    if len(matrix) < 3:
+        return np.arange(len(matrix))
+    tree = linkage(matrix, method='complete', metric='euclidean', optimal_ordering=True)
+    return leaves_list(tree)
+
+
+def spectral_order(matrix):
+    """
+    Orden espectral: filas ordenadas por el vector de Fiedler del Laplaciano
+    de la matriz de similitud (kernel gaussiano sobre distancias euclídeas)
+    """
+    n = len(matrix)
+    if n < 3:
+        return np.arange(n)
+
+    distances = squareform(pdist(matrix, metric='euclidean'))
+    scale = np.median(distances[distances > 0]) if np.any(distances > 0) else 1.0
+    similarity = np.exp(-(distances / scale) ** 2)
+
+    laplacian = np.diag(similarity.sum(axis=1)) - similarity
+    _, eigenvectors = np.linalg.eigh(laplacian)
+    fiedler = eigenvectors[:, 1]
+
+    # Signo determinista para que el orden no se invierta entre ejecuciones
+    if fiedler[np.argmax(np.abs(fiedler))] < 0:
+        fiedler = -fiedler
+    return np.argsort(fiedler, kind='mergesort')
+
+
+def seriate(matrix, order='olo', axis=0):
+    """
+    Permutación de filas (axis=0) o columnas (axis=1) de una matriz
+
+    Args:
+        matrix: lista de listas o np.ndarray 2D
+        order: 'olo' (optimal leaf ordering) o 'spectral'
+
+    Returns:
+        lista de índices (la fila/columna i del resultado es la permutación[i] original)
+    """
+    values = np.nan_to_num(np.asarray(matrix, dtype=float))
+    if values.ndim != 2:
+        return []
+    if axis == 1:
+        values = values.T
+
+    key = (order, hashlib.blake2b(values.tobytes(), digest_size=16).hexdigest(), values.shape)
+    cached = _order_cache.get(key)
+    if cached is not None:
+        return np.frombuffer(cached, dtype=np.int64).tolist()
+
+    if order == 'spectral':
+        permutation = spectral_order(values)
+    else:
+        permutation = optimal_leaf_order(values)
+
+    permutation = np.asarray(permutation, dtype=np.int64)
+    _order_cache.set(key, permutation.tobytes())
+    return permutation.tolist()
+
+
+def add_matrix_ordering(data, order, matrix_key='matrix_normalized'):
+    """
+    Agrega row_order y col_order a una respuesta de heatmap
+
+    No hace nada si order no es soportado o la respuesta tiene error.
+    """
+    if order not in SERIATION_ORDERS or not isinstance(data, dict) or 'error' in data:
+        return data
+    matrix = data.get(matrix_key)
+    if not matrix:
+        return data
+
+    data['order'] = order
+    data['row_order'] = seriate(matrix, order, axis=0)
+    data['col_order'] = seriate(matrix, order, axis=1)
+    return data
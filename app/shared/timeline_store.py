@@ -0,0 +1,240 @@
+"""
+TimelineStore - Timelines de scarf plot pre-calculados en disco
+Cada variante (scarf gaze / fixations por dataset_select y el timeline de
+regiones del glyph) se guarda en static/data/scarf_timelines/<variante>/ como
+arrays .npy que se abren con memory-map al iniciar:
+
+  pares:     image, participant (int32), offsets (int64, n_pares + 1),
+             total_points (int64), t_min, t_max, time_range (float64)
+  segmentos: codes (int32), start, end (float32), points (int32)
+  meta.json: versión de los datos, clases y colores (diccionario compartido)
+
+Con relative_times los tiempos de los segmentos se guardan relativos al t_min
+del par (así float32 no pierde precisión con tiempos absolutos grandes); al
+leer se redondean a time_decimals para no devolver el ruido de float32.
+
+Los segmentos de un par son codes[offsets[i]:offsets[i + 1]] (ordenados por
+imagen y participante), así que una solicitud es solo lectura de rangos.
+Se genera con precalculate_scarf_timelines.py.
+"""
+
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+
+from app.shared.scarf_segments import pair_offsets
+
+# Se incrementa cuando cambia el formato de los archivos
+STORE_FORMAT_VERSION = 1
+
+PAIR_ARRAYS = {
+    'image': np.int32,
+    'participant': np.int32,
+    'offsets': np.int64,
+    'total_points': np.int64,
+    't_min': np.float64,
+    't_max': np.float64,
+    'time_range': np.float64
+}
+SEGMENT_ARRAYS = {
+    'codes': np.int32,
+    'start': np.float32,
+    'end': np.float32,
+    'points': np.int32
+}
+
+
+def variant_name(kind, dataset_select, data_type='gaze'):
+    """Nombre de la variante ('scarf' o 'glyph', dataset, tipo de datos)"""
+    return f"{kind}_{dataset_select}_{data_type}"
+
+
+class TimelineStore:
+    """Singleton con las variantes de timelines pre-calculados (memory-mapped)"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TimelineStore, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.base_path = os.path.join(os.path.dirname(__file__), '..', '..')
+            self.store_dir = os.path.join(self.base_path, 'static', 'data', 'scarf_timelines')
+            self.variants = {}  # {nombre: dict de arrays memory-mapped + meta}
+            self.validated = {}  # {nombre: bool} versión comprobada contra los datos actuales
+            self._lock = threading.Lock()
+            self._initialized = True
+            self.open_all()
+
+    def open_all(self):
+        """Abre (memory-map) todas las variantes guardadas en disco"""
+        if not os.path.isdir(self.store_dir):
+            return
+        for name in sorted(os.listdir(self.store_dir)):
+            variant = self._open_variant(name)
+            if variant is not None:
+                with self._lock:
+                    self.variants[name] = variant
+                    self.validated.pop(name, None)
+        if self.variants:
+            print(f"TimelineStore: {len(self.variants)} variantes de timelines abiertas")
+
+    def _open_variant(self, name):
+        """Arrays memory-mapped de una variante (None si falta algún archivo)"""
+        variant_dir = os.path.join(self.store_dir, name)
+        meta_path = os.path.join(variant_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r') as f:
+                meta = json.load(f)
+            if meta.get('format') != STORE_FORMAT_VERSION:
+                print(f"ADVERTENCIA: TimelineStore: Formato de '{name}' obsoleto, se ignora")
+                return None
+            variant = {
+                key: np.load(os.path.join(variant_dir, f"{key}.npy"), mmap_mode='r')
+                for key in list(PAIR_ARRAYS) + list(SEGMENT_ARRAYS)
+            }
+        except Exception as e:
+            print(f"ERROR: TimelineStore: No se pudo abrir '{name}': {e}")
+            return None
+        variant['classes'] = meta['classes']
+        variant['colors'] = meta['colors']
+        variant['version'] = meta['version']
+        variant['relative_times'] = meta.get('relative_times', False)
+        variant['time_decimals'] = meta.get('time_decimals', 3)
+        return variant
+
+    def get_version(self, kind, dataset_select, data_type='gaze'):
+        """Versión de los datos de una variante (como lista JSON, comparable con meta.json)"""
+        from app.shared.data_service import get_data_service
+        version = list(get_data_service().get_data_version(dataset_select))
+        if data_type == 'fixations':
+            from app.shared.precomputed_fixation_service import get_precomputed_service
+            from app.shared.result_cache import files_version
+            version += list(files_version([get_precomputed_service().csv_path]))
+        return json.loads(json.dumps([kind] + version))
+
+    def get_variant(self, kind, dataset_select, data_type='gaze'):
+        """Variante vigente (versión igual a la de los datos actuales) o None"""
+        name = variant_name(kind, dataset_select, data_type)
+        with self._lock:
+            variant = self.variants.get(name)
+            validated = self.validated.get(name)
+        if variant is None:
+            return None
+
+        if validated is None:
+            validated = variant['version'] == self.get_version(kind, dataset_select, data_type)
+            if not validated:
+                print(f"ADVERTENCIA: TimelineStore: '{name}' desactualizada, se usará el cálculo en vivo")
+            with self._lock:
+                self.validated[name] = validated
+        return variant if validated else None
+
+    def read_pairs(self, variant, pair_keys):
+        """
+        Arrays de timeline de los pares pedidos (copiados desde el memory-map)
+
+        Args:
+            pair_keys: np.ndarray ordenado de claves (imagen << 32) + participante
+
+        Returns:
+            dict con el mismo formato que build_region_timelines (offsets re-basados)
+        """
+        stored_keys = (variant['image'].astype(np.int64) << 32) + variant['participant']
+        pairs = np.flatnonzero(np.isin(stored_keys, pair_keys))
+
+        starts = variant['offsets'][pairs]
+        lengths = variant['offsets'][pairs + 1] - starts
+        segments = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        segment_pair = np.repeat(np.arange(len(pairs)), lengths)
+
+        result = {key: np.asarray(variant[key][pairs], dtype=np.float64 if dtype is np.float64 else np.int64)
+                  for key, dtype in PAIR_ARRAYS.items() if key != 'offsets'}
+        result['codes'] = np.asarray(variant['codes'][segments], dtype=np.int64)
+        result['points'] = np.asarray(variant['points'][segments], dtype=np.int64)
+        for key in ('start', 'end'):
+            times = np.asarray(variant[key][segments], dtype=np.float64)
+            if variant['relative_times']:
+                times = times + result['t_min'][segment_pair]
+            result[key] = np.round(times, variant['time_decimals'])
+        result['offsets'] = pair_offsets(segment_pair, len(pairs))
+        result['classes'] = variant['classes']
+        result['colors'] = variant['colors']
+        return result
+
+    def read_image(self, variant, image_id):
+        """Arrays de timeline de todos los participantes de una imagen"""
+        lo, hi = np.searchsorted(variant['image'], [int(image_id), int(image_id) + 1])
+        pair_keys = (np.asarray(variant['image'][lo:hi], dtype=np.int64) << 32) + variant['participant'][lo:hi]
+        return self.read_pairs(variant, pair_keys)
+
+    def save_variant(self, kind, dataset_select, data_type, timelines, relative_times=False, time_decimals=3):
+        """
+        Guarda los arrays de timeline de una variante y la vuelve a abrir
+
+        Args:
+            timelines: dict de arrays (build_region_timelines / get_timeline_arrays)
+                ordenado por imagen y participante, con 'classes' y 'colors'
+            relative_times: guardar start/end relativos al t_min de cada par
+            time_decimals: decimales de start/end al leer
+
+        Returns:
+            ruta del directorio de la variante
+        """
+        name = variant_name(kind, dataset_select, data_type)
+        variant_dir = os.path.join(self.store_dir, name)
+        tmp_dir = variant_dir + '.tmp'
+        if os.path.exists(tmp_dir):
+            shutil.rmtree(tmp_dir)
+        os.makedirs(tmp_dir)
+
+        arrays = dict(timelines)
+        if relative_times:
+            segment_pair = np.repeat(np.arange(len(arrays['image'])), np.diff(arrays['offsets']))
+            t_min = np.asarray(arrays['t_min'], dtype=np.float64)[segment_pair]
+            arrays['start'] = np.asarray(arrays['start'], dtype=np.float64) - t_min
+            arrays['end'] = np.asarray(arrays['end'], dtype=np.float64) - t_min
+
+        for key, dtype in list(PAIR_ARRAYS.items()) + list(SEGMENT_ARRAYS.items()):
+            np.save(os.path.join(tmp_dir, f"{key}.npy"), np.ascontiguousarray(arrays[key], dtype=dtype))
+
+        colors = timelines.get('colors') or [None] * len(timelines['classes'])
+        with open(os.path.join(tmp_dir, 'meta.json'), 'w') as f:
+            json.dump({
+                'format': STORE_FORMAT_VERSION,
+                'version': self.get_version(kind, dataset_select, data_type),
+                'classes': list(timelines['classes']),
+                'colors': list(colors),
+                'relative_times': bool(relative_times),
+                'time_decimals': int(time_decimals),
+                'pairs': int(len(timelines['image'])),
+                'segments': int(len(timelines['codes']))
+            }, f)
+
+        # Reemplazo del directorio anterior (los memory-maps abiertos se liberan antes)
+        with self._lock:
+            self.variants.pop(name, None)
+            self.validated.pop(name, None)
+        if os.path.exists(variant_dir):
+            shutil.rmtree(variant_dir)
+        os.replace(tmp_dir, variant_dir)
+
+        variant = self._open_variant(name)
+        if variant is not None:
+            with self._lock:
+                self.variants[name] = variant
+        return variant_dir
+
+
+def get_timeline_store():
+    """Retorna la instancia singleton del TimelineStore"""
+    return TimelineStore()
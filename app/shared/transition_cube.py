@@ -0,0 +1,201 @@
+"""
+TransitionCubeService - Cubo disperso de transiciones entre clases
+Para cada variante (dataset_select, data_type) guarda en formato COO, ordenado por
+(imagen, participante, clase origen, clase destino):
+
+  image, participant, from_code, to_code (int32)
+  count (int32): cantidad de transiciones from -> to del par
+  dwell (float64): suma del tiempo en la clase origen antes de cada transición
+
+Una transición es el paso entre dos corridas consecutivas de distinta clase en la
+secuencia temporal de un participante (muestras de gaze o fixations); el dwell de la
+corrida es el tiempo desde su primera muestra hasta la primera de la siguiente.
+
+El grafo de transiciones de cualquier subconjunto de imágenes y participantes es una
+suma (bincount) sobre las filas seleccionadas. Los cubos se generan offline con
+precalculate_transition_cube.py; si falta uno se construye en la primera solicitud.
+"""
+
+import os
+import threading
+
+import numpy as np
+import joblib
+
+from app.shared.scarf_segments import run_length_encode
+
+# Versión del formato de los cubos (cubos en disco con otro formato se recalculan)
+TRANSITION_CUBE_FORMAT_VERSION = 1
+
+CUBE_ARRAYS = ('image', 'participant', 'from_code', 'to_code', 'count', 'dwell')
+
+
+def build_transition_arrays(images, participants, times, codes):
+    """
+    Transiciones de clase por (imagen, participante) en formato COO
+
+    Args:
+        images, participants, times, codes: arrays de muestras ordenados por
+            (imagen, participante, tiempo)
+
+    Returns:
+        dict con los arrays de CUBE_ARRAYS
+    """
+    images = np.asarray(images, dtype=np.int64)
+    participants = np.asarray(participants, dtype=np.int64)
+    times = np.asarray(times, dtype=float)
+    codes = np.asarray(codes, dtype=np.int64)
+
+    pair_keys = (images << 32) + participants
+    n_codes = int(codes.max()) + 1 if len(codes) else 1
+
+    # Corridas de misma clase dentro de cada par
+    run_starts, _ = run_length_encode(pair_keys * n_codes + codes)
+    run_pairs = pair_keys[run_starts]
+    run_codes = codes[run_starts]
+    run_times = times[run_starts]
+
+    # Transición = corrida seguida de otra del mismo par
+    follows = np.flatnonzero(run_pairs[1:] == run_pairs[:-1])
+    pairs = run_pairs[follows]
+    from_codes = run_codes[follows]
+    to_codes = run_codes[follows + 1]
+    dwell = run_times[follows + 1] - run_times[follows]
+
+    # Agregar por (par, origen, destino)
+    cell_keys = np.stack([pairs, from_codes, to_codes], axis=1)
+    cells, inverse = np.unique(cell_keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    counts = np.bincount(inverse, minlength=len(cells))
+    dwell_sums = np.bincount(inverse, weights=dwell, minlength=len(cells))
+
+    return {
+        'image': (cells[:, 0] >> 32).astype(np.int32),
+        'participant': (cells[:, 0] & 0xFFFFFFFF).astype(np.int32),
+        'from_code': cells[:, 1].astype(np.int32),
+        'to_code': cells[:, 2].astype(np.int32),
+        'count': counts.astype(np.int32),
+        'dwell': dwell_sums.astype(np.float64)
+    }
+
+
+def sum_transitions(cube, rows):
+    """
+    Matrices (n_clases × n_clases) de conteos y dwell sumadas sobre las filas del cubo
+
+    Args:
+        rows: índices o máscara booleana sobre las filas del cubo
+    """
+    n_classes = len(cube['classes'])
+    cells = cube['from_code'][rows].astype(np.int64) * n_classes + cube['to_code'][rows]
+    counts = np.bincount(cells, weights=cube['count'][rows], minlength=n_classes * n_classes)
+    dwell = np.bincount(cells, weights=cube['dwell'][rows], minlength=n_classes * n_classes)
+    return counts.reshape(n_classes, n_classes), dwell.reshape(n_classes, n_classes)
+
+
+class TransitionCubeService:
+    """Singleton con los cubos de transiciones por (dataset_select, data_type)"""
+
+    _instance = None
+    _initialized = False
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(TransitionCubeService, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if not self._initialized:
+            self.base_path = os.path.join(os.path.dirname(__file__), '..', '..')
+            self.cube_dir = os.path.join(self.base_path, 'static', 'data')
+            self.cubes = {}  # {(dataset_select, data_type): cubo}
+            self._lock = threading.Lock()
+            self._initialized = True
+
+    def get_cube_path(self, dataset_select, data_type):
+        """Ruta del archivo del cubo de una variante"""
+        return os.path.join(self.cube_dir, f"transition_cube_{dataset_select}_{data_type}.pkl")
+
+    def get_version(self, dataset_select, data_type):
+        """Versión de los datos de los que depende el cubo"""
+        from app.shared.data_service import get_data_service
+        version = (TRANSITION_CUBE_FORMAT_VERSION, data_type) + get_data_service().get_data_version(dataset_select)
+        if data_type == 'fixations':
+            from app.shared.precomputed_fixation_service import get_precomputed_service
+            from app.shared.result_cache import files_version
+            version += files_version([get_precomputed_service().csv_path])
+        return version
+
+    def get_cube(self, dataset_select, data_type, builder):
+        """
+        Cubo de una variante: en memoria, desde disco si está vigente o construido con builder()
+
+        Args:
+            builder: función sin argumentos que retorna el dict del cubo
+                (CUBE_ARRAYS + 'classes' y 'colors'), o None si no hay datos
+        """
+        key = (dataset_select, data_type)
+        version = self.get_version(dataset_select, data_type)
+        with self._lock:
+            cube = self.cubes.get(key)
+            if cube is not None and cube['version'] == version:
+                return cube
+
+        cube = None
+        cube_path = self.get_cube_path(dataset_select, data_type)
+        if os.path.exists(cube_path):
+            try:
+                stored = joblib.load(cube_path)
+                if stored.get('version') == version:
+                    cube = stored
+                    print(f"TransitionCubeService: Cubo '{dataset_select}/{data_type}' cargado ({len(cube['count'])} celdas)")
+                else:
+                    print(f"ADVERTENCIA: TransitionCubeService: Cubo '{dataset_select}/{data_type}' desactualizado, se recalculará")
+            except Exception as e:
+                print(f"ERROR: TransitionCubeService: No se pudo cargar {cube_path}: {e}")
+
+        if cube is None:
+            cube = builder()
+            if cube is None:
+                return None
+            cube['version'] = version
+
+        with self._lock:
+            self.cubes[key] = cube
+        return cube
+
+    def save_cube(self, dataset_select, data_type, builder):
+        """Persiste el cubo de una variante (construyéndolo si hace falta)"""
+        cube = self.get_cube(dataset_select, data_type, builder)
+        if cube is None:
+            return None
+        cube_path = self.get_cube_path(dataset_select, data_type)
+        joblib.dump(cube, cube_path, compress=3)
+        return cube_path
+
+    def select_rows(self, cube, image_ids=None, participant_ids=None, pair_keys=None):
+        """
+        Filas del cubo de las imágenes, participantes y pares pedidos (None = sin filtro)
+
+        Args:
+            pair_keys: claves (imagen << 32) + participante permitidas (p.ej. de una cohorte)
+        """
+        mask = np.ones(len(cube['count']), dtype=bool)
+        if image_ids is not None:
+            mask &= np.isin(cube['image'], np.asarray(list(image_ids), dtype=np.int64))
+        if participant_ids is not None:
+            mask &= np.isin(cube['participant'], np.asarray(list(participant_ids), dtype=np.int64))
+        if pair_keys is not None:
+            keys = (cube['image'].astype(np.int64) << 32) + cube['participant']
+            mask &= np.isin(keys, np.asarray(pair_keys, dtype=np.int64))
+        return np.flatnonzero(mask)
+
+    def clear(self):
+        """Descarta los cubos en memoria"""
+        with self._lock:
+            self.cubes.clear()
+
+
+def get_transition_cube_service():
+    """Retorna la instancia singleton del TransitionCubeService"""
+    return TransitionCubeService()
@@ -5,6 +5,17 @@ from app.controllers.scarf_plot import *
 from app.controllers.by_participant import *
 from app.controllers.glyph import glyph_bp
 from app.services.fixation_detection_ivt import get_fixations_ivt
+from app.shared.area_index_service import get_area_index_service
+from app.shared.segmentation_service import get_segmentation_service
+from app.shared.result_cache import ResultCache, snap_rect, files_version, get_cache_stats
+from app.shared.http_cache import cached_json_response, cached_bytes_response
+from app.shared.data_service import get_data_service
+from app.shared.precomputed_fixation_service import get_precomputed_service
+from app.shared.seriation import add_matrix_ordering, SERIATION_ORDERS
+from app.shared.cohort import get_cohort_service, parse_cohort_args, cohort_key
+from app.shared.scarf_segments import parse_lod_args
+from app.shared.scanpath_similarity import SIMILARITY_METHODS
+from app.controllers.scarf_plot import SCANPATH_SEQUENCES
 import random
 import json
 import os
@@ -62,6 +73,60 @@ gaze_data = load_gaze_data()
 ivt_cache = load_ivt_cache()
 imagename_to_index = create_imagename_to_index_mapping()
 
+# Cache de resultados de /api/analyze-area (bytes JSON ya serializados)
+# Los rectángulos se ajustan a una grilla de AREA_CACHE_GRID_PX píxeles para
+# que selecciones casi idénticas compartan entrada; la versión de datos se toma
+# de los archivos cargados al iniciar.
+AREA_CACHE_GRID_PX = int(os.environ.get('AREA_CACHE_GRID_PX', 4))
+DATA_VERSION = files_version([
+    os.path.join(os.path.dirname(__file__), 'static', 'data', 'df_final1.csv'),
+    os.path.join(os.path.dirname(__file__), 'static', 'data', 'ivt_precalculated.csv'),
+    os.path.join(os.path.dirname(__file__), 'static', 'data', 'data_hololens.json')
+])
+area_result_cache = ResultCache('analyze_area', max_entries=512, max_bytes=128 * 1024 * 1024)
+
+# Caches de respuestas (con ETag) para endpoints que son función pura de sus parámetros
+heatmap_response_cache = ResultCache('heatmap', max_entries=1024, max_bytes=64 * 1024 * 1024)
+scarf_response_cache = ResultCache('scarf_plot', max_entries=512, max_bytes=128 * 1024 * 1024)
+participant_heatmap_response_cache = ResultCache('participant_heatmap', max_entries=256, max_bytes=64 * 1024 * 1024)
+transition_response_cache = ResultCache('transition_matrix', max_entries=512, max_bytes=64 * 1024 * 1024)
+
+# Rasters de densidad de gaze (PNG o uint8) por (imagen, participantes, sigma, resolución)
+density_raster_cache = ResultCache('gaze_density', max_entries=1024, max_bytes=64 * 1024 * 1024)
+DENSITY_MAX_WIDTH = 800
+DENSITY_MAX_HEIGHT = 600
+# Rango de sigma (px en 800x600): el costo del filtro gaussiano crece con sigma
+DENSITY_MIN_SIGMA = 1.0
+DENSITY_MAX_SIGMA = 200.0
+
+def response_data_version(dataset_select, data_type):
+    """
+    Versión de los datos de una respuesta cacheada (parte de la clave y del ETag)
+
+    Las respuestas de fixations dependen también de fixation.csv.
+    """
+    version = get_data_service().get_data_version(dataset_select)
+    if data_type == 'fixations':
+        version += files_version([get_precomputed_service().csv_path])
+    return version
+
+def parse_time_window(args):
+    """
+    Lee t_start/t_end (segundos desde el inicio de la visualización)
+
+    Returns:
+        (t_start, t_end, error) - None donde no hay límite; error si la ventana es vacía
+    """
+    t_start = args.get('t_start', None, type=float)
+    t_end = args.get('t_end', None, type=float)
+    if t_start is not None and not np.isfinite(t_start):
+        t_start = None
+    if t_end is not None and not np.isfinite(t_end):
+        t_end = None
+    if t_start is not None and t_end is not None and t_end <= t_start:
+        return t_start, t_end, f't_end ({t_end}) must be greater than t_start ({t_start})'
+    return t_start, t_end, None
+
 @app.route('/api/heatmap/<int:image_id>', methods=['GET'])
 def get_heatmap(image_id):
     """Obtiene datos de heatmap para una imagen (image_id es ImageName 0-149)"""
@@ -69,6 +134,11 @@ def get_heatmap(image_id):
     data_type = request.args.get('data_type', 'gaze').lower()
     dataset_select = request.args.get('dataset_select', 'main_class').lower()
     mode = request.args.get('mode', 'attention').lower()
+    order = request.args.get('order', '').lower()
+    cohort = parse_cohort_args(request.args)
+    t_start, t_end, window_error = parse_time_window(request.args)
+    if window_error:
+        return jsonify({'error': window_error}), 400
 
     # Validar data_type
     if data_type not in ['fixations', 'gaze']:
@@ -82,16 +152,96 @@ def get_heatmap(image_id):
     if mode not in ['attention', 'time']:
         mode = 'attention'
 
+    # Validar order (seriación de filas/columnas; vacío = sin reordenar)
+    if order not in SERIATION_ORDERS:
+        order = None
+
     # image_id es ImageName directamente (0-149)
     print(f"GET /api/heatmap/{image_id} - data_type: {data_type}, dataset_select: {dataset_select}, mode: {mode}")
-    data = heatmap_controller.get_heatmap_data(image_id, top_n, data_type, dataset_select, mode=mode)
-    return jsonify(data)
+    cache_key = ('heatmap', image_id, top_n, data_type, dataset_select, mode, order, cohort_key(cohort),
+                 t_start, t_end, response_data_version(dataset_select, data_type))
+    return cached_json_response(
+        heatmap_response_cache, cache_key,
+        lambda: add_matrix_ordering(
+            heatmap_controller.get_heatmap_data(image_id, top_n, data_type, dataset_select, mode=mode, cohort=cohort,
+                                                t_start=t_start, t_end=t_end),
+            order
+        )
+    )
+
+@app.route('/api/heatmap/compare', methods=['GET'])
+def get_heatmap_comparison():
+    """
+    Compara varias imágenes con un eje de clases común
+
+    Imágenes por image_ids=1,2,3 y/o min_avg_hololens / max_avg_hololens (umbral
+    sobre avg_hololens de data_hololens.json); layout=participants|images.
+    """
+    top_n = request.args.get('top_n', 15, type=int)
+    data_type = request.args.get('data_type', 'gaze').lower()
+    dataset_select = request.args.get('dataset_select', 'main_class').lower()
+    mode = request.args.get('mode', 'attention').lower()
+    layout = request.args.get('layout', 'participants').lower()
+    min_avg = request.args.get('min_avg_hololens', None, type=float)
+    max_avg = request.args.get('max_avg_hololens', None, type=float)
+
+    if data_type not in ['fixations', 'gaze']:
+        data_type = 'gaze'
+    if dataset_select not in ['main_class', 'grouped', 'disorder', 'grouped_disorder']:
+        dataset_select = 'main_class'
+    if mode not in ['attention', 'time']:
+        mode = 'attention'
+    if layout not in ['participants', 'images']:
+        layout = 'participants'
+
+    # Imágenes pedidas explícitamente
+    image_ids = []
+    for value in request.args.get('image_ids', '').split(','):
+        value = value.strip()
+        if value.isdigit() and int(value) not in image_ids:
+            image_ids.append(int(value))
+
+    # Imágenes por umbral de avg_hololens
+    if min_avg is not None or max_avg is not None:
+        scores_data = get_data_service().get_scores_data() or {}
+        by_threshold = sorted(
+            int(key) for key, info in scores_data.items()
+            if str(key).isdigit()
+            and (min_avg is None or info.get('avg_hololens', 0) >= min_avg)
+            and (max_avg is None or info.get('avg_hololens', 0) <= max_avg)
+        )
+        image_ids = [i for i in image_ids if i in by_threshold] if image_ids else by_threshold
+
+    if not image_ids:
+        return jsonify({'error': 'No images selected (use image_ids or min_avg_hololens/max_avg_hololens)'}), 400
+
+    print(f"GET /api/heatmap/compare - {len(image_ids)} images, data_type: {data_type}, dataset_select: {dataset_select}, layout: {layout}")
+    cache_key = ('heatmap_compare', tuple(image_ids), top_n, data_type, dataset_select, mode, layout,
+                 response_data_version(dataset_select, data_type))
+    return cached_json_response(
+        heatmap_response_cache, cache_key,
+        lambda: heatmap_controller.get_comparison_data(image_ids, top_n, data_type, dataset_select, mode=mode, layout=layout)
+    )
 
 @app.route('/api/heatmap/participant/<int:participant_id>', methods=['GET'])
 def get_attention_heatmap(participant_id):
     """Obtiene datos de heatmap para una imagen"""
-    data = by_participant_controller.get_heatmap_data_for_participant(participant_id)
-    return jsonify(data)
+    order = request.args.get('order', '').lower()
+    if order not in SERIATION_ORDERS:
+        order = None
+    t_start, t_end, window_error = parse_time_window(request.args)
+    if window_error:
+        return jsonify({'error': window_error}), 400
+
+    cache_key = ('participant_heatmap', participant_id, order, t_start, t_end,
+                 get_data_service().get_data_version('main_class'))
+    return cached_json_response(
+        participant_heatmap_response_cache, cache_key,
+        lambda: add_matrix_ordering(
+            by_participant_controller.get_heatmap_data_for_participant(participant_id, t_start=t_start, t_end=t_end),
+            order
+        )
+    )
 
 @app.route('/api/saliency-coverage/<int:participant_id>', methods=['GET'])
 def get_saliency_coverage(participant_id):
@@ -120,6 +270,12 @@ def get_scarf_plot(image_id):
     participant_id = request.args.get('participant_id', type=int)
     data_type = request.args.get('data_type', 'gaze').lower()
     dataset_select = request.args.get('dataset_select', 'main_class').lower()
+    cohort = parse_cohort_args(request.args)
+    # Nivel de detalle: pixel_width / max_segments (None = todos los segmentos)
+    resolution = parse_lod_args(request.args)
+    # order=similarity: participantes ordenados por similitud de scanpath
+    order = request.args.get('order', '').lower()
+    similarity_args = parse_similarity_args(request.args) if order == 'similarity' else None
 
     # Validar data_type
     if data_type not in ['fixations', 'gaze']:
@@ -131,8 +287,147 @@ def get_scarf_plot(image_id):
 
     # image_id es ImageName directamente (0-149)
     print(f"GET /api/scarf-plot/{image_id} - data_type: {data_type}, dataset_select: {dataset_select}")
-    data = scarf_controller.get_scarf_plot_data(image_id, participant_id, data_type, dataset_select)
-    return jsonify(data)
+    cache_key = ('scarf_plot', image_id, participant_id, data_type, dataset_select, cohort_key(cohort), resolution,
+                 similarity_args, response_data_version(dataset_select, data_type))
+
+    def compute():
+        data = scarf_controller.get_scarf_plot_data(image_id, participant_id, data_type, dataset_select, cohort=cohort,
+                                                    resolution=resolution)
+        if similarity_args:
+            data = scarf_controller.order_scarf_by_similarity(data, image_id, data_type, dataset_select, *similarity_args)
+        return data
+
+    return cached_json_response(scarf_response_cache, cache_key, compute)
+
+def parse_similarity_args(args):
+    """
+    Lee sequence (class/patch), patch_size y method (levenshtein/scanmatch)
+
+    Returns:
+        (sequence, patch_size, method) con valores por defecto si no son válidos
+    """
+    sequence = args.get('sequence', 'class').lower()
+    if sequence not in SCANPATH_SEQUENCES:
+        sequence = 'class'
+    patch_size = args.get('patch_size', 40, type=int)
+    if patch_size is None or patch_size < 10 or patch_size > 200:
+        patch_size = 40
+    method = args.get('method', 'levenshtein').lower()
+    if method not in SIMILARITY_METHODS:
+        method = 'levenshtein'
+    return sequence, patch_size, method
+
+@app.route('/api/scanpath-similarity/<int:image_id>', methods=['GET'])
+def get_scanpath_similarity(image_id):
+    """
+    Similitud entre los scanpaths de los participantes de una imagen
+
+    Parámetros: data_type, dataset_select, cohorte, sequence (class|patch),
+    patch_size y method (levenshtein|scanmatch). Retorna la matriz de similitud y
+    el orden de participantes (orden de hojas óptimo).
+    """
+    data_type = request.args.get('data_type', 'gaze').lower()
+    if data_type not in ['fixations', 'gaze']:
+        data_type = 'gaze'
+    dataset_select = request.args.get('dataset_select', 'main_class').lower()
+    if dataset_select not in ['main_class', 'grouped', 'disorder', 'grouped_disorder']:
+        dataset_select = 'main_class'
+    cohort = parse_cohort_args(request.args)
+    sequence, patch_size, method = parse_similarity_args(request.args)
+
+    print(f"GET /api/scanpath-similarity/{image_id} - {method} / {sequence}, data_type: {data_type}, dataset_select: {dataset_select}")
+    cache_key = ('scanpath_similarity', image_id, data_type, dataset_select, cohort_key(cohort), sequence, patch_size,
+                 method, response_data_version(dataset_select, data_type))
+    return cached_json_response(
+        scarf_response_cache, cache_key,
+        lambda: scarf_controller.get_scanpath_similarity(image_id, None, data_type, dataset_select, sequence,
+                                                         patch_size, method, cohort=cohort)
+    )
+
+@app.route('/api/scarf-plot/batch', methods=['GET'])
+def get_scarf_plot_batch():
+    """
+    Scarf plot de varias imágenes y/o un participante en una sola solicitud
+
+    Imágenes por image_ids=1,2,3; con participant_id y sin image_ids se usan todas
+    las imágenes que vio el participante. Acepta los mismos filtros de cohorte y
+    pixel_width / max_segments que /api/scarf-plot/<image_id>.
+    """
+    participant_id = request.args.get('participant_id', type=int)
+    data_type = request.args.get('data_type', 'gaze').lower()
+    dataset_select = request.args.get('dataset_select', 'main_class').lower()
+    cohort = parse_cohort_args(request.args)
+    resolution = parse_lod_args(request.args)
+
+    if data_type not in ['fixations', 'gaze']:
+        data_type = 'gaze'
+    if dataset_select not in ['main_class', 'grouped', 'disorder', 'grouped_disorder']:
+        dataset_select = 'main_class'
+
+    image_ids = []
+    for value in request.args.get('image_ids', '').split(','):
+        value = value.strip()
+        if value.isdigit() and int(value) not in image_ids:
+            image_ids.append(int(value))
+
+    if not image_ids and participant_id is None:
+        return jsonify({'error': 'No images selected (use image_ids and/or participant_id)'}), 400
+
+    print(f"GET /api/scarf-plot/batch - {len(image_ids) or 'all'} images, participant: {participant_id}, data_type: {data_type}, dataset_select: {dataset_select}")
+    cache_key = ('scarf_batch', tuple(image_ids), participant_id, data_type, dataset_select, cohort_key(cohort), resolution,
+                 response_data_version(dataset_select, data_type))
+    return cached_json_response(
+        scarf_response_cache, cache_key,
+        lambda: scarf_controller.get_scarf_batch_data(image_ids or None, participant_id, data_type, dataset_select,
+                                                      cohort=cohort, resolution=resolution)
+    )
+
+def parse_id_list(args, name):
+    """Lista de enteros sin repetir de un parámetro separado por comas (1,2,3)"""
+    ids = []
+    for value in args.get(name, '').split(','):
+        value = value.strip()
+        if value.isdigit() and int(value) not in ids:
+            ids.append(int(value))
+    return ids
+
+@app.route('/api/transitions/matrix', methods=['GET'])
+def get_transition_matrix():
+    """
+    Grafo de transiciones entre clases sumado desde el cubo pre-calculado
+
+    Parámetros: image_ids=1,2,3 y participant_ids=4,5 (vacíos = todos), filtros de
+    cohorte, data_type y dataset_select. Retorna las matrices origen × destino de
+    conteos y de dwell antes de la transición, y la lista de transiciones.
+    """
+    data_type = request.args.get('data_type', 'gaze').lower()
+    if data_type not in ['fixations', 'gaze']:
+        data_type = 'gaze'
+    dataset_select = request.args.get('dataset_select', 'main_class').lower()
+    if dataset_select not in ['main_class', 'grouped', 'disorder', 'grouped_disorder']:
+        dataset_select = 'main_class'
+    cohort = parse_cohort_args(request.args)
+    image_ids = parse_id_list(request.args, 'image_ids')
+    participant_ids = parse_id_list(request.args, 'participant_ids')
+
+    print(f"GET /api/transitions/matrix - {len(image_ids) or 'all'} images, {len(participant_ids) or 'all'} participants, data_type: {data_type}, dataset_select: {dataset_select}")
+    cache_key = ('transition_matrix', tuple(sorted(image_ids)), tuple(sorted(participant_ids)), data_type, dataset_select,
+                 cohort_key(cohort), response_data_version(dataset_select, data_type))
+    return cached_json_response(
+        transition_response_cache, cache_key,
+        lambda: scarf_controller.get_transition_matrix(image_ids or None, participant_ids or None, data_type,
+                                                       dataset_select, cohort=cohort)
+    )
+
+@app.route('/api/admin/cache-stats', methods=['GET'])
+def get_admin_cache_stats():
+    """Estadísticas (entradas, bytes, hits, misses, expulsiones) de los caches de resultados"""
+    caches = get_cache_stats()
+    return jsonify({
+        'caches': caches,
+        'total_entries': sum(cache['entries'] for cache in caches),
+        'total_bytes': sum(cache['bytes'] for cache in caches)
+    })
 
 @app.route('/', methods=['GET'])
 def main():
@@ -209,6 +504,401 @@ def get_gaze_data(image_id):
         print(f"Full traceback:\n{traceback.format_exc()}")
         return jsonify({'error': str(e)}), 400
 
+def render_gaze_density(points, width, height, sigma, output_format):
+    """
+    Renderiza el mapa de densidad Gaussiano de los puntos (espacio 800x600, Y invertida)
+
+    Usa ByParticipantController.generate_heatmap directamente a la resolución
+    pedida. La fila 0 del raster es el borde superior de la imagen.
+
+    Returns:
+        bytes PNG (colormap con alfa proporcional a la densidad) o uint8 fila por fila
+    """
+    import cv2
+
+    density = by_participant_controller.generate_heatmap(
+        points, img_width=800, img_height=600, sigma=sigma, output_shape=(width, height)
+    )
+    if density.shape != (height, width):
+        density = cv2.resize(density, (width, height), interpolation=cv2.INTER_AREA)
+
+    # pixelY crece hacia arriba: invertir filas para alinear con la imagen
+    density = np.flipud(density)
+    density_uint8 = np.clip(np.rint(density * 255), 0, 255).astype(np.uint8)
+
+    if output_format == 'uint8':
+        return np.ascontiguousarray(density_uint8).tobytes()
+
+    colored = cv2.applyColorMap(density_uint8, cv2.COLORMAP_JET)
+    rgba = np.dstack([colored, density_uint8])  # BGRA: transparente donde no hay densidad
+    ok, encoded = cv2.imencode('.png', rgba)
+    if not ok:
+        return None
+    return encoded.tobytes()
+
+@app.route('/api/gaze-density/<int:image_id>', methods=['GET'])
+def get_gaze_density(image_id):
+    """
+    Raster de densidad de gaze/fixations renderizado en el servidor
+
+    Parámetros: width/height (resolución, máx. 800x600), sigma (px en 800x600, entre 1 y 200),
+    participant_id (uno o varios separados por coma), data_type (gaze|fixations)
+    y format (png|uint8). Con format=uint8 el cuerpo son width*height bytes
+    fila por fila; las dimensiones van en X-Density-Width / X-Density-Height.
+    """
+    if gaze_data is None:
+        return jsonify({'error': 'Gaze data not loaded'}), 400
+
+    width = request.args.get('width', 200, type=int)
+    height = request.args.get('height', 150, type=int)
+    sigma = request.args.get('sigma', 30.0, type=float)
+    data_type = request.args.get('data_type', 'gaze').lower()
+    output_format = request.args.get('format', 'png').lower()
+
+    width = int(np.clip(width or 200, 1, DENSITY_MAX_WIDTH))
+    height = int(np.clip(height or 150, 1, DENSITY_MAX_HEIGHT))
+    if sigma is None or not np.isfinite(sigma) or sigma <= 0:
+        sigma = 30.0
+    # Acotado y redondeado a 0.1 px (también acota las entradas de cache)
+    sigma = round(float(np.clip(sigma, DENSITY_MIN_SIGMA, DENSITY_MAX_SIGMA)), 1)
+    if data_type not in ['fixations', 'gaze']:
+        data_type = 'gaze'
+    if output_format not in ['png', 'uint8']:
+        output_format = 'png'
+
+    participants = tuple(sorted({
+        int(value) for value in request.args.get('participant_id', '').split(',')
+        if value.strip().isdigit()
+    }))
+
+    def compute():
+        if data_type == 'fixations':
+            if ivt_cache is None:
+                return None
+            source = ivt_cache[ivt_cache['ImageName'] == image_id]
+            x_column, y_column = 'x_centroid', 'y_centroid'
+        else:
+            source = gaze_data[gaze_data['ImageName'] == image_id]
+            x_column, y_column = 'pixelX', 'pixelY'
+
+        if participants:
+            source = source[source['participante'].isin(participants)]
+
+        xs = source[x_column].to_numpy(dtype=float)
+        ys = source[y_column].to_numpy(dtype=float)
+        # Mismo criterio que /api/gaze-data: descartar NaN y el origen (0, 0)
+        valid = ~np.isnan(xs) & ~np.isnan(ys) & ((xs > 0) | (ys > 0))
+        points = np.column_stack([xs[valid], ys[valid]])
+        return render_gaze_density(points, width, height, sigma, output_format)
+
+    cache_key = ('gaze_density', image_id, participants, data_type, sigma, width, height, output_format, DATA_VERSION)
+    response = cached_bytes_response(
+        density_raster_cache, cache_key, compute,
+        mimetype='image/png' if output_format == 'png' else 'application/octet-stream',
+        headers={'X-Density-Width': str(width), 'X-Density-Height': str(height)}
+    )
+    if response is None:
+        return jsonify({'error': f'No {data_type} data available for image {image_id}'}), 400
+    return response
+
+def prepare_area_frames(image_id, participant_id, timings, cohort=None):
+    """
+    Prepara los gaze points y fixations de una imagen con tiempos normalizados
+
+    Compartido por /api/analyze-area y su modo incremental. Con cohort solo se
+    mantienen los participantes que cumplen los filtros.
+
+    Returns:
+        (gaze_records, image_fixations) - image_fixations es None si no hay cache I-VT
+    """
+    import time
+
+    # Obtener TODOS los gaze data para esta imagen
+    # IMPORTANTE: image_id es el ImageName (de la URL)
+    t_step = time.time()
+    image_gaze_data = gaze_data[gaze_data['ImageName'] == image_id].copy()
+
+    # Filtrar por participante si se especificó
+    if participant_id is not None:
+        image_gaze_data = image_gaze_data[image_gaze_data['participante'] == participant_id].copy()
+        print(f"Filtering by participant: {participant_id}")
+
+    # Filtrar por cohorte (máscara de participantes de la imagen)
+    if cohort:
+        cohort_participants = get_cohort_service().get_participants(cohort, image_id)
+        image_gaze_data = image_gaze_data[image_gaze_data['participante'].isin(cohort_participants)].copy()
+        print(f"Filtering by cohort {cohort}: {len(cohort_participants)} participants")
+
+    timings['filter_gaze_data'] = (time.time() - t_step) * 1000
+
+    print(f"Image gaze data rows: {len(image_gaze_data)}")
+    print(f"[TIMING] Filter gaze data: {timings['filter_gaze_data']:.1f}ms")
+
+    # SIEMPRE procesar AMBOS tipos de datos para poder usarlos en overlay independientemente
+    # Obtener gaze points (VECTORIZADO - mucho más rápido que iterrows)
+    t_step = time.time()
+    print(f"Processing GAZE POINTS (vectorized)...")
+
+    # Solo incluir campos esenciales para gaze points (sin 'start' que confunde con fixations)
+    gaze_records = image_gaze_data[[
+        'participante', 'ImageIndex', 'ImageName', 'pixelX', 'pixelY', 'Time'
+    ]].copy()
+
+    # Renombrar columnas para que coincidan con el formato esperado
+    gaze_records = gaze_records.rename(columns={
+        'pixelX': 'x_centroid',
+        'pixelY': 'y_centroid'
+    })
+
+    # Asignar campos necesarios
+    gaze_records['pointCount'] = 1
+    gaze_records['ImageName'] = gaze_records['ImageName'].astype('int')
+    gaze_records['participante'] = gaze_records['participante'].fillna(0).astype('int')
+    gaze_records['ImageIndex'] = gaze_records['ImageIndex'].astype('int')
+
+    timings['gaze_processing'] = (time.time() - t_step) * 1000
+
+    print(f"Total gaze points in image: {len(gaze_records)}")
+    print(f"[TIMING] Gaze processing: {timings['gaze_processing']:.1f}ms")
+
+    # Obtener fixations desde cache precalculado (VECTORIZADO)
+    t_step = time.time()
+    print(f"Processing FIXATIONS (from precalculated cache - vectorized)...")
+    image_fixations = None
+
+    if ivt_cache is not None:
+        # CORRECCIÓN: Filtrar fixations por ImageName (no ImageIndex)
+        # ImageIndex en raw_gaze es secuencial por participante, pero ImageName es el ID real
+        image_fixations = ivt_cache[ivt_cache['ImageName'] == image_id].copy()
+
+        # Filtrar por participante si se especificó
+        if participant_id is not None:
+            image_fixations = image_fixations[image_fixations['participante'] == participant_id].copy()
+            print(f"Filtering fixations by participant: {participant_id}")
+
+        if cohort:
+            image_fixations = image_fixations[image_fixations['participante'].isin(cohort_participants)].copy()
+
+        if len(image_fixations) > 0:
+            # Asegurar tipos de datos correctos
+            image_fixations['participante'] = image_fixations['participante'].astype('int')
+            image_fixations['ImageIndex'] = image_fixations['ImageIndex'].astype('int')
+            image_fixations['start'] = image_fixations['start'].astype('float')
+            image_fixations['end'] = image_fixations['end'].astype('float')
+            image_fixations['duration'] = image_fixations['duration'].astype('float')
+            image_fixations['x_centroid'] = image_fixations['x_centroid'].astype('float')
+            image_fixations['y_centroid'] = image_fixations['y_centroid'].astype('float')
+            image_fixations['pointCount'] = image_fixations['pointCount'].astype('int')
+            image_fixations['class_names'] = [[]] * len(image_fixations)
+        else:
+            image_fixations = None
+    else:
+        print("Warning: IVT cache not available, returning empty fixations")
+
+    timings['fixations_processing'] = (time.time() - t_step) * 1000
+
+    print(f"Total fixations in image: {len(image_fixations) if image_fixations is not None else 0}")
+    print(f"[TIMING] Fixations processing: {timings['fixations_processing']:.1f}ms")
+
+    # Normalizar tiempos para que comiencen en 0 (PER PARTICIPANTE, PER IMAGE)
+    # IMPORTANTE: Cada participante ve cada imagen durante exactamente 15 segundos
+    # Los datos ya están filtrados por ImageName, así que el offset de cada participante
+    # representa el momento cuando comenzó a ver ESTA imagen.
+    # NOTA: NO se aplica offset de 4 segundos - normalized_time = raw_time - min_time
+    #
+    # El offset se calcula sobre TODA la imagen (no solo el área) combinando el mínimo
+    # de Time (gaze) y de start (fixations) por participante, y se resta sobre las
+    # columnas antes de crear diccionarios (mismo resultado que restar item por item).
+    t_step = time.time()
+
+    if len(gaze_records) > 0:
+        offset_series = [gaze_records.groupby('participante')['Time'].min()]
+        if image_fixations is not None:
+            offset_series.append(image_fixations.groupby('participante')['start'].min())
+        participant_min_times = pd.concat(offset_series).groupby(level=0).min()
+
+        print(f"Normalization offsets per participant: {participant_min_times.to_dict()}")
+
+        gaze_offsets = gaze_records['participante'].map(participant_min_times).astype('float')
+        gaze_records['Time'] = gaze_records['Time'].astype('float') - gaze_offsets
+
+        if image_fixations is not None:
+            fix_offsets = image_fixations['participante'].map(participant_min_times).astype('float')
+            image_fixations['start'] = image_fixations['start'] - fix_offsets
+            image_fixations['end'] = image_fixations['end'] - fix_offsets
+
+    timings['time_normalization'] = (time.time() - t_step) * 1000
+
+    return gaze_records, image_fixations
+
+# Ventana de visualización por imagen (segundos) para histogramas temporales
+VIEWING_WINDOW_SECONDS = 15.0
+
+def gaze_dwell_times(gaze_records):
+    """
+    Dwell de cada gaze point: tiempo hasta la siguiente muestra del mismo participante
+
+    Se calcula sobre TODA la imagen (no solo el área) para que el último punto
+    dentro del área no pierda su duración. La última muestra de cada participante
+    tiene dwell 0.
+
+    Returns:
+        np.ndarray alineado con las filas de gaze_records
+    """
+    times = gaze_records['Time'].to_numpy(dtype=float)
+    participants = gaze_records['participante'].to_numpy()
+    dwell = np.zeros(len(times), dtype=float)
+    if len(times) < 2:
+        return dwell
+
+    order = np.lexsort((times, participants))
+    sorted_times = times[order]
+    sorted_participants = participants[order]
+
+    steps = np.diff(sorted_times)
+    same_participant = sorted_participants[1:] == sorted_participants[:-1]
+    steps = np.where(same_participant & np.isfinite(steps), np.maximum(steps, 0.0), 0.0)
+
+    dwell[order[:-1]] = steps
+    return dwell
+
+def time_binned_histogram(participants, times, dwell, labels, bin_size=1.0):
+    """
+    Agrega puntos del área en bins de tiempo (mismo criterio que calculateTimeData)
+
+    Los tiempos negativos se ignoran y el último bin acumula todo lo que ocurre a
+    partir de VIEWING_WINDOW_SECONDS (con bin_size=1 son los 16 bins del glyph).
+
+    Args:
+        participants: array con el participante de cada punto
+        times: array de tiempos normalizados (start para fixations, Time para gaze)
+        dwell: array de duración de cada punto en segundos
+        labels: array con la clase semántica de cada punto
+        bin_size: tamaño del bin en segundos
+
+    Returns:
+        dict serializable con conteos y dwell por participante y por clase
+    """
+    n_bins = int(np.ceil(VIEWING_WINDOW_SECONDS / bin_size)) + 1
+
+    times = np.asarray(times, dtype=float)
+    valid = np.isfinite(times) & (times >= 0)
+    bins = np.minimum(np.floor(times[valid] / bin_size).astype(np.int64), n_bins - 1)
+    dwell = np.nan_to_num(np.asarray(dwell, dtype=float)[valid])
+
+    participant_values, participant_codes = np.unique(np.asarray(participants)[valid], return_inverse=True)
+    class_values, class_codes = np.unique(np.asarray(labels, dtype=str)[valid], return_inverse=True)
+
+    n_participants = len(participant_values)
+    n_classes = len(class_values)
+
+    participant_flat = participant_codes * n_bins + bins
+    class_flat = class_codes * n_bins + bins
+
+    per_participant_counts = np.bincount(participant_flat, minlength=n_participants * n_bins).reshape(n_participants, n_bins)
+    per_participant_dwell = np.bincount(participant_flat, weights=dwell, minlength=n_participants * n_bins).reshape(n_participants, n_bins)
+    per_class_counts = np.bincount(class_flat, minlength=n_classes * n_bins).reshape(n_classes, n_bins)
+    per_class_dwell = np.bincount(class_flat, weights=dwell, minlength=n_classes * n_bins).reshape(n_classes, n_bins)
+
+    return {
+        'bin_size': bin_size,
+        'n_bins': n_bins,
+        'bin_starts': (np.arange(n_bins) * bin_size).round(6).tolist(),
+        'counts': np.bincount(bins, minlength=n_bins).tolist(),
+        'dwell': np.bincount(bins, weights=dwell, minlength=n_bins).round(6).tolist(),
+        'participants': [int(p) for p in participant_values],
+        'per_participant_counts': per_participant_counts.tolist(),
+        'per_participant_dwell': per_participant_dwell.round(6).tolist(),
+        'classes': class_values.tolist(),
+        'per_class_counts': per_class_counts.tolist(),
+        'per_class_dwell': per_class_dwell.round(6).tolist()
+    }
+
+def rect_mask(records, x, y, width, height):
+    """Máscara de puntos (x_centroid, y_centroid) dentro del rectángulo"""
+    return (
+        (records['x_centroid'] >= x) &
+        (records['x_centroid'] <= x + width) &
+        (records['y_centroid'] >= y) &
+        (records['y_centroid'] <= y + height)
+    )
+
+def clean_data_vectorized(data_list):
+    """Vectorized NaN cleaning - 20-30x más rápido que list comprehension"""
+    if not data_list:
+        return data_list
+
+    # Convertir a DataFrame para operaciones vectorizadas
+    df = pd.DataFrame(data_list)
+
+    # Rellenar NaN con None para todos los campos
+    df = df.where(pd.notna(df), None)
+
+    # Asegurar que 'score' siempre existe y tiene un valor por defecto
+    if 'score' in df.columns:
+        df['score'] = df['score'].fillna(5.0)
+    else:
+        df['score'] = 5.0
+
+    # Convertir back a lista de diccionarios
+    return df.to_dict('records')
+
+def load_participant_scores(image_id):
+    """Scores de TODOS los participantes para una imagen desde data_hololens.json"""
+    participant_scores = {}
+    try:
+        with open('static/data/data_hololens.json', 'r') as f:
+            full_data = json.loads(f.read())
+
+        # Buscar la imagen en el JSON por ImageName (que es el image_id de la URL)
+        image_name = str(image_id)
+        if image_name in full_data:
+            image_data = full_data[image_name]
+            score_participant = image_data.get('score_participant', [])
+
+            # Crear diccionario de scores por participante
+            for score_info in score_participant:
+                participant_id = score_info.get('participant')
+                score = score_info.get('score')
+                if participant_id is not None:
+                    participant_scores[int(participant_id)] = {
+                        'score': score,
+                        'age': score_info.get('age'),
+                        'gender': score_info.get('gender'),
+                        'state': score_info.get('state')
+                    }
+    except Exception as e:
+        print(f"Warning: Could not load participant scores: {e}")
+    return participant_scores
+
+def parse_area_request():
+    """Lee área (body JSON), data_type, participant_id y cohorte comunes a /api/analyze-area"""
+    area_data = request.get_json()
+    x = area_data.get('x', 0)
+    y = area_data.get('y', 0)
+    width = area_data.get('width', 50)
+    height = area_data.get('height', 50)
+
+    # Obtener tipo de datos desde query parameter (fixations o gaze)
+    data_type = request.args.get('data_type', 'fixations').lower()
+
+    # Validar que sea uno de los tipos soportados
+    if data_type not in ['fixations', 'gaze']:
+        data_type = 'fixations'
+
+    # Obtener participante seleccionado (opcional)
+    participant_id = request.args.get('participant_id', None)
+    if participant_id is not None:
+        try:
+            participant_id = int(participant_id)
+        except (ValueError, TypeError):
+            participant_id = None
+
+    # Filtros de cohorte opcionales (score, edad, género, estado)
+    cohort = parse_cohort_args(request.args)
+
+    return area_data, x, y, width, height, data_type, participant_id, cohort
+
 @app.route('/api/analyze-area/<int:image_id>', methods=['POST'])
 def analyze_area(image_id):
     """Analiza las fijaciones IVT o puntos de gaze en un área específica de una imagen"""
@@ -222,50 +912,39 @@ def analyze_area(image_id):
     try:
         t_step = time.time()
 
-        # Obtener coordenadas del área desde el request
-        area_data = request.get_json()
-        x = area_data.get('x', 0)
-        y = area_data.get('y', 0)
-        width = area_data.get('width', 50)
-        height = area_data.get('height', 50)
-
-        # Obtener tipo de datos desde query parameter (fixations o gaze)
-        data_type = request.args.get('data_type', 'fixations').lower()
+        # Obtener coordenadas del área, tipo de datos y participante desde el request
+        _, x, y, width, height, data_type, participant_id, cohort = parse_area_request()
 
-        # Validar que sea uno de los tipos soportados
-        if data_type not in ['fixations', 'gaze']:
-            data_type = 'fixations'
-
-        # Obtener participante seleccionado (opcional)
-        participant_id = request.args.get('participant_id', None)
-        if participant_id is not None:
-            try:
-                participant_id = int(participant_id)
-            except (ValueError, TypeError):
-                participant_id = None
+        # Agregación opcional en servidor: aggregate=histogram devuelve solo los bins
+        aggregate = request.args.get('aggregate', None)
+        bin_size = request.args.get('bin_size', 1.0, type=float)
+        if bin_size is None or not np.isfinite(bin_size) or bin_size <= 0:
+            bin_size = 1.0
+        dataset_select = request.args.get('dataset_select', 'main_class').lower()
 
         timings['request_parsing'] = (time.time() - t_step) * 1000
 
         print(f"\n=== /api/analyze-area/{image_id} ===")
         print(f"data_type parameter: {data_type}")
         print(f"participant_id parameter: {participant_id}")
+        print(f"aggregate parameter: {aggregate}")
+
+        # Ajustar el rectángulo a la grilla y buscar en el cache de resultados
+        x, y, width, height = snap_rect(x, y, width, height, AREA_CACHE_GRID_PX)
+        cache_key = (
+            image_id, x, y, width, height, data_type, participant_id,
+            (aggregate, bin_size, dataset_select) if aggregate == 'histogram' else None,
+            cohort_key(cohort),
+            DATA_VERSION
+        )
+        cached_response = area_result_cache.get(cache_key)
+        if cached_response is not None:
+            print(f"[CACHE] analyze-area hit: {width}x{height}px at ({x}, {y}) in {(time.time() - t_total_start) * 1000:.1f}ms")
+            return app.response_class(cached_response, mimetype='application/json')
 
-        # Obtener TODOS los gaze data para esta imagen
-        # IMPORTANTE: image_id es el ImageName (de la URL)
-        t_step = time.time()
-        image_gaze_data = gaze_data[gaze_data['ImageName'] == image_id].copy()
-
-        # Filtrar por participante si se especificó
-        if participant_id is not None:
-            image_gaze_data = image_gaze_data[image_gaze_data['participante'] == participant_id].copy()
-            print(f"Filtering by participant: {participant_id}")
-
-        timings['filter_gaze_data'] = (time.time() - t_step) * 1000
-
-        print(f"Image gaze data rows: {len(image_gaze_data)}")
-        print(f"[TIMING] Filter gaze data: {timings['filter_gaze_data']:.1f}ms")
+        gaze_records, image_fixations = prepare_area_frames(image_id, participant_id, timings, cohort)
 
-        if len(image_gaze_data) == 0:
+        if len(gaze_records) == 0:
             return jsonify({
                 'fixations': [],
                 'count': 0,
@@ -277,243 +956,96 @@ def analyze_area(image_id):
                 'error': f'No gaze data found for image {image_id}'
             })
 
-        # SIEMPRE procesar AMBOS tipos de datos para poder usarlos en overlay independientemente
-        # Obtener gaze points (VECTORIZADO - mucho más rápido que iterrows)
-        t_step = time.time()
-        print(f"Processing GAZE POINTS (vectorized)...")
-
-        # Convertir a diccionarios de manera vectorizada
-        # Solo incluir campos esenciales para gaze points (sin 'start' que confunde con fixations)
-        gaze_records = image_gaze_data[[
-            'participante', 'ImageIndex', 'ImageName', 'pixelX', 'pixelY', 'Time'
-        ]].copy()
-
-        # Renombrar columnas para que coincidan con el formato esperado
-        gaze_records = gaze_records.rename(columns={
-            'pixelX': 'x_centroid',
-            'pixelY': 'y_centroid'
-        })
-
-        # Asignar campos necesarios
-        gaze_records['pointCount'] = 1
-        gaze_records['ImageName'] = gaze_records['ImageName'].astype('int')
-        gaze_records['participante'] = gaze_records['participante'].fillna(0).astype('int')
-        gaze_records['ImageIndex'] = gaze_records['ImageIndex'].astype('int')
-
-        # Convertir a lista de diccionarios (vectorizado)
-        all_gaze_points = gaze_records.to_dict('records')
-
         # Filtrar por área rectangular usando operaciones de Pandas (mucho más rápido)
-        area_mask = (
-            (gaze_records['x_centroid'] >= x) &
-            (gaze_records['x_centroid'] <= x + width) &
-            (gaze_records['y_centroid'] >= y) &
-            (gaze_records['y_centroid'] <= y + height)
-        )
-        area_gaze_records = gaze_records[area_mask]
-        area_gaze_points = area_gaze_records.to_dict('records')
-
-        timings['gaze_processing'] = (time.time() - t_step) * 1000
-
-        print(f"Total gaze points in image: {len(all_gaze_points)}")
-        print(f"Gaze points in area: {len(area_gaze_points)}")
-        print(f"[TIMING] Gaze processing: {timings['gaze_processing']:.1f}ms")
+        area_mask = rect_mask(gaze_records, x, y, width, height)
+        fix_area_mask = rect_mask(image_fixations, x, y, width, height) if image_fixations is not None else None
+
+        print(f"Gaze points in area: {int(area_mask.sum())}")
+        print(f"Fixations in area: {int(fix_area_mask.sum()) if fix_area_mask is not None else 0}")
+
+        if aggregate == 'histogram':
+            t_step = time.time()
+
+            if data_type == 'fixations':
+                if image_fixations is not None:
+                    area_points = image_fixations[fix_area_mask]
+                    times = area_points['start'].to_numpy(dtype=float)
+                    dwell = area_points['duration'].to_numpy(dtype=float)
+                else:
+                    area_points = gaze_records.iloc[0:0]
+                    times = dwell = np.empty(0)
+                total_data_points = len(image_fixations) if image_fixations is not None else 0
+            else:  # data_type == 'gaze'
+                area_points = gaze_records[area_mask]
+                times = area_points['Time'].to_numpy(dtype=float)
+                dwell = gaze_dwell_times(gaze_records)[area_mask.to_numpy()]
+                total_data_points = len(gaze_records)
+
+            # Clase semántica de cada punto según la máscara de segmentación
+            labels = get_segmentation_service().label_points(
+                image_id,
+                area_points['x_centroid'].to_numpy(dtype=float),
+                area_points['y_centroid'].to_numpy(dtype=float),
+                dataset_select
+            )
+
+            histogram = time_binned_histogram(
+                area_points['participante'].to_numpy(), times, dwell, labels, bin_size
+            )
+            timings['histogram'] = (time.time() - t_step) * 1000
+
+            participant_scores = load_participant_scores(image_id)
+            timings['total'] = (time.time() - t_total_start) * 1000
+            print(f"[TIMING] Histogram aggregation: {timings['histogram']:.1f}ms")
+            print(f"[TIMING] TOTAL API TIME: {timings['total']:.1f}ms")
+
+            response = jsonify({
+                'aggregate': 'histogram',
+                'histogram': histogram,
+                'count': int(len(area_points)),
+                'total_fixations_in_image': total_data_points,
+                'area': {
+                    'x': x,
+                    'y': y,
+                    'width': width,
+                    'height': height
+                },
+                'participant_scores': participant_scores,
+                'data_type': data_type,
+                'algorithm': 'I-VT' if data_type == 'fixations' else 'Raw Gaze',
+                'parameters': {
+                    'velocity_threshold': 1.15 if data_type == 'fixations' else None,
+                    'min_duration': 0.0 if data_type == 'fixations' else None
+                }
+            })
+            area_result_cache.set(cache_key, response.get_data())
+            return response
 
-        # Obtener fixations desde cache precalculado (VECTORIZADO)
+        # Convertir a lista de diccionarios (vectorizado) ya con tiempos normalizados
         t_step = time.time()
-        print(f"Processing FIXATIONS (from precalculated cache - vectorized)...")
-        all_fixations = []
-        area_fixations = []
-
-        if ivt_cache is not None:
-            # CORRECCIÓN: Filtrar fixations por ImageName (no ImageIndex)
-            # ImageIndex en raw_gaze es secuencial por participante, pero ImageName es el ID real
-            image_fixations = ivt_cache[ivt_cache['ImageName'] == image_id].copy()
-
-            # Filtrar por participante si se especificó
-            if participant_id is not None:
-                image_fixations = image_fixations[image_fixations['participante'] == participant_id].copy()
-                print(f"Filtering fixations by participant: {participant_id}")
-
-            if len(image_fixations) > 0:
-                # Asegurar tipos de datos correctos
-                image_fixations['participante'] = image_fixations['participante'].astype('int')
-                image_fixations['ImageIndex'] = image_fixations['ImageIndex'].astype('int')
-                image_fixations['start'] = image_fixations['start'].astype('float')
-                image_fixations['end'] = image_fixations['end'].astype('float')
-                image_fixations['duration'] = image_fixations['duration'].astype('float')
-                image_fixations['x_centroid'] = image_fixations['x_centroid'].astype('float')
-                image_fixations['y_centroid'] = image_fixations['y_centroid'].astype('float')
-                image_fixations['pointCount'] = image_fixations['pointCount'].astype('int')
-                image_fixations['class_names'] = [[]] * len(image_fixations)
-
-                # Convertir a lista de diccionarios (vectorizado)
-                all_fixations = image_fixations.to_dict('records')
-
-                # Filtrar por área rectangular usando Pandas (mucho más rápido)
-                fix_area_mask = (
-                    (image_fixations['x_centroid'] >= x) &
-                    (image_fixations['x_centroid'] <= x + width) &
-                    (image_fixations['y_centroid'] >= y) &
-                    (image_fixations['y_centroid'] <= y + height)
-                )
-                area_fixations = image_fixations[fix_area_mask].to_dict('records')
+        total_gaze_points = len(gaze_records)
+        area_gaze_points = gaze_records[area_mask].to_dict('records')
+
+        if image_fixations is not None:
+            total_fixations = len(image_fixations)
+            area_fixations = image_fixations[fix_area_mask].to_dict('records')
         else:
-            print("Warning: IVT cache not available, returning empty fixations")
-            all_fixations = []
+            total_fixations = 0
             area_fixations = []
 
-        timings['fixations_processing'] = (time.time() - t_step) * 1000
-
-        print(f"Total fixations in image: {len(all_fixations)}")
-        print(f"Fixations in area: {len(area_fixations)}")
-        print(f"[TIMING] Fixations processing: {timings['fixations_processing']:.1f}ms")
-
-        # Normalizar tiempos para que comiencen en 0 (PER PARTICIPANTE, PER IMAGE)
-        # IMPORTANTE: Cada participante ve cada imagen durante exactamente 15 segundos
-        # Cuando ImageIndex cambia, el tiempo debe reiniciar en 0 para ese participante
-        # Los datos ya están filtrados por ImageName, así que participant_min_times
-        # representa el momento cuando cada participante comenzó a ver ESTA imagen
-        t_step = time.time()
-
-        # NOTA: NO se aplica offset de 4 segundos - los tiempos son correctos
-        # normalized_time = raw_time - min_time_para_esta_imagen
-        # Resultado: 0-15 segundos (el tiempo que el participante vio esta imagen)
-
-        # Calcular el tiempo mínimo POR PARTICIPANTE (para esta imagen específica)
-        # IMPORTANTE: Incluir datos de TODA la imagen, no solo del área seleccionada
-        # Esto asegura que los tiempos se normalicen correctamente
-        participant_min_times = {}
-
-        # Para ALL gaze points (no solo area_gaze_points)
-        if all_gaze_points:
-            for p in all_gaze_points:
-                participant = p.get('participante')
-                time_val = p.get('Time')
-                if participant is not None and time_val is not None:
-                    if participant not in participant_min_times:
-                        participant_min_times[participant] = time_val
-                    else:
-                        participant_min_times[participant] = min(participant_min_times[participant], time_val)
-
-        # Para ALL fixations (no solo area_fixations)
-        if all_fixations:
-            for f in all_fixations:
-                participant = f.get('participante')
-                start_time = f.get('start')
-                if participant is not None and start_time is not None:
-                    if participant not in participant_min_times:
-                        participant_min_times[participant] = start_time
-                    else:
-                        participant_min_times[participant] = min(participant_min_times[participant], start_time)
-
-        print(f"Normalization offsets per participant: {participant_min_times}")
-
-        # DEBUG: Log sample time values before normalization
-        if all_gaze_points:
-            sample_gaze_before = [p.get('Time') for p in all_gaze_points[:5]]
-            print(f"DEBUG: Sample gaze times BEFORE normalization: {sample_gaze_before}")
-        if all_fixations:
-            sample_fix_before = [f.get('start') for f in all_fixations[:5]]
-            print(f"DEBUG: Sample fixation starts BEFORE normalization: {sample_fix_before}")
-
-        # Aplicar normalización POR PARTICIPANTE
-        def normalize_times_per_participant(data_list, time_field, participant_field='participante'):
-            """Subtract participant's min_time from time field (per-image normalization)"""
-            for item in data_list:
-                participant = item.get(participant_field)
-                time_val = item.get(time_field)
-
-                # Si no hay participante, no podemos normalizar
-                if participant is None or time_val is None:
-                    continue
-
-                # Si el participante no está en min_times, saltar (pero imprimir warning)
-                if participant not in participant_min_times:
-                    print(f"Warning: Participant {participant} not in participant_min_times, skipping normalization for {time_field}")
-                    continue
-
-                try:
-                    # Normalizar: restar el tiempo mínimo para este participante en esta imagen
-                    # Resultado: tiempos de 0-15 segundos (duración de visualización de imagen)
-                    normalized_time = float(item[time_field]) - float(participant_min_times[participant])
-                    item[time_field] = float(normalized_time)  # Asegurar que es un float válido
-                except (TypeError, ValueError) as e:
-                    print(f"Warning: Could not normalize time for {time_field}: {e}, keeping original value")
-                    # Si hay error, dejar el valor original
-            return data_list
-
-        # Normalizar gaze points (POR PARTICIPANTE)
-        all_gaze_points = normalize_times_per_participant(all_gaze_points, 'Time')
-        area_gaze_points = normalize_times_per_participant(area_gaze_points, 'Time')
-
-        # DEBUG: Verificar que la normalización se aplicó
-        if area_gaze_points:
-            sample_times_after = [p.get('Time') for p in area_gaze_points[:5]]
-            print(f"DEBUG: Sample gaze times AFTER normalization: {sample_times_after}")
-
-        # Normalizar fixations (POR PARTICIPANTE - start, end)
-        def normalize_fixations_per_participant(fix_list):
-            for fix in fix_list:
-                participant = fix.get('participante')
-                if participant in participant_min_times:
-                    try:
-                        if fix.get('start') is not None:
-                            # Normalizar: restar tiempo mínimo para este participante en esta imagen
-                            normalized_start = float(fix['start']) - float(participant_min_times[participant])
-                            fix['start'] = float(normalized_start)
-                        if fix.get('end') is not None:
-                            # Normalizar: restar tiempo mínimo para este participante en esta imagen
-                            normalized_end = float(fix['end']) - float(participant_min_times[participant])
-                            fix['end'] = float(normalized_end)
-                    except (TypeError, ValueError) as e:
-                        print(f"Warning: Could not normalize fixation times: {e}, keeping original values")
-            return fix_list
-
-        all_fixations = normalize_fixations_per_participant(all_fixations)
-        area_fixations = normalize_fixations_per_participant(area_fixations)
-
-        # DEBUG: Log sample time values after normalization
-        if all_gaze_points:
-            sample_gaze_after = [p.get('Time') for p in all_gaze_points[:5]]
-            print(f"DEBUG: Sample gaze times AFTER normalization (per-participant): {sample_gaze_after}")
-        if all_fixations:
-            sample_fix_after = [f.get('start') for f in all_fixations[:5]]
-            print(f"DEBUG: Sample fixation starts AFTER normalization (per-participant): {sample_fix_after}")
-
-        timings['time_normalization'] = (time.time() - t_step) * 1000
+        timings['records_conversion'] = (time.time() - t_step) * 1000
 
         # Seleccionar qué datos usar para el análisis principal según data_type
         if data_type == 'fixations':
             area_data_points = area_fixations
-            total_data_points = len(all_fixations)
+            total_data_points = total_fixations
         else:  # data_type == 'gaze'
             area_data_points = area_gaze_points
-            total_data_points = len(all_gaze_points)
+            total_data_points = total_gaze_points
 
         # Vectorized NaN cleaning usando Pandas (mucho más rápido que list comprehension)
         t_step = time.time()
 
-        def clean_data_vectorized(data_list):
-            """Vectorized NaN cleaning - 20-30x más rápido que list comprehension"""
-            if not data_list:
-                return data_list
-
-            # Convertir a DataFrame para operaciones vectorizadas
-            df = pd.DataFrame(data_list)
-
-            # Rellenar NaN con None para todos los campos
-            df = df.where(pd.notna(df), None)
-
-            # Asegurar que 'score' siempre existe y tiene un valor por defecto
-            if 'score' in df.columns:
-                df['score'] = df['score'].fillna(5.0)
-            else:
-                df['score'] = 5.0
-
-            # Convertir back a lista de diccionarios
-            return df.to_dict('records')
-
         # Procesar todos los datos con vectorización
         area_gaze_points = clean_data_vectorized(area_gaze_points)
         area_fixations = clean_data_vectorized(area_fixations)
@@ -524,30 +1056,7 @@ def analyze_area(image_id):
         # NUEVO: Cargar scores de TODOS los participantes para esta imagen
         # desde data_hololens.json
         t_step = time.time()
-        participant_scores = {}
-        try:
-            with open('static/data/data_hololens.json', 'r') as f:
-                full_data = json.loads(f.read())
-
-            # Buscar la imagen en el JSON por ImageName (que es el image_id de la URL)
-            image_name = str(image_id)
-            if image_name in full_data:
-                image_data = full_data[image_name]
-                score_participant = image_data.get('score_participant', [])
-
-                # Crear diccionario de scores por participante
-                for score_info in score_participant:
-                    participant_id = score_info.get('participant')
-                    score = score_info.get('score')
-                    if participant_id is not None:
-                        participant_scores[int(participant_id)] = {
-                            'score': score,
-                            'age': score_info.get('age'),
-                            'gender': score_info.get('gender'),
-                            'state': score_info.get('state')
-                        }
-        except Exception as e:
-            print(f"Warning: Could not load participant scores: {e}")
+        participant_scores = load_participant_scores(image_id)
 
         timings['participant_scores'] = (time.time() - t_step) * 1000
         timings['total'] = (time.time() - t_total_start) * 1000
@@ -556,7 +1065,7 @@ def analyze_area(image_id):
         print(f"[TIMING] Data cleanup: {timings['data_cleanup']:.1f}ms")
         print(f"[TIMING] Participant scores: {timings['participant_scores']:.1f}ms")
         print(f"[TIMING] TOTAL API TIME: {timings['total']:.1f}ms")
-        print(f"[TIMING] Breakdown: parse={timings['request_parsing']:.1f}ms, filter_gaze={timings['filter_gaze_data']:.1f}ms, gaze_proc={timings['gaze_processing']:.1f}ms, fix_proc={timings['fixations_processing']:.1f}ms, norm_time={timings['time_normalization']:.1f}ms, cleanup={timings['data_cleanup']:.1f}ms, scores={timings['participant_scores']:.1f}ms")
+        print(f"[TIMING] Breakdown: parse={timings['request_parsing']:.1f}ms, filter_gaze={timings['filter_gaze_data']:.1f}ms, gaze_proc={timings['gaze_processing']:.1f}ms, fix_proc={timings['fixations_processing']:.1f}ms, norm_time={timings['time_normalization']:.1f}ms, to_records={timings['records_conversion']:.1f}ms, cleanup={timings['data_cleanup']:.1f}ms, scores={timings['participant_scores']:.1f}ms")
 
         t_step = time.time()
         response = jsonify({
@@ -581,6 +1090,7 @@ def analyze_area(image_id):
         })
         timings['json_serialization'] = (time.time() - t_step) * 1000
         print(f"[TIMING] JSON serialization: {timings['json_serialization']:.1f}ms")
+        area_result_cache.set(cache_key, response.get_data())
         return response
     except Exception as e:
         import traceback
@@ -588,5 +1098,82 @@ def analyze_area(image_id):
         print(f"Full traceback:\n{traceback.format_exc()}")
         return jsonify({'error': str(e), 'traceback': traceback.format_exc()}), 400
 
+@app.route('/api/analyze-area/<int:image_id>/incremental', methods=['POST'])
+def analyze_area_incremental(image_id):
+    """
+    Modo incremental de /api/analyze-area para el brush en vivo
+
+    El cliente envía selection_id y el nuevo rectángulo; se responde solo con los
+    puntos que entraron o salieron respecto al rectángulo anterior de esa sesión,
+    más los agregados actualizados. Sin selection_id (o al cambiar de imagen,
+    participante o data_type) la respuesta es un reinicio con todos los puntos.
+    """
+    import time
+    t_total_start = time.time()
+
+    if gaze_data is None:
+        return jsonify({'error': 'Gaze data not loaded'}), 400
+
+    try:
+        area_data, x, y, width, height, data_type, participant_id, cohort = parse_area_request()
+        selection_id = area_data.get('selection_id')
+
+        def build_records():
+            gaze_records, image_fixations = prepare_area_frames(image_id, participant_id, {}, cohort)
+            if data_type == 'fixations':
+                return image_fixations
+            return gaze_records
+
+        area_index_service = get_area_index_service()
+        index_key = (image_id, participant_id, data_type, cohort_key(cohort))
+        index = area_index_service.get_index(index_key, build_records)
+
+        if index is None:
+            point_ids = np.empty(0, dtype=np.int64)
+        else:
+            point_ids = index.query(x, y, width, height)
+
+        delta = area_index_service.update_session(selection_id, index_key, point_ids)
+
+        if index is not None:
+            entered = clean_data_vectorized(index.get_records(delta['entered']))
+            participant_counts = index.participant_counts(point_ids)
+            total_data_points = index.total
+        else:
+            entered = []
+            participant_counts = {}
+            total_data_points = 0
+
+        response = {
+            'selection_id': delta['selection_id'],
+            'reset': delta['reset'],
+            'entered': entered,
+            'left': delta['left'].tolist(),
+            'count': int(len(point_ids)),
+            'participant_counts': participant_counts,
+            'total_fixations_in_image': total_data_points,
+            'area': {
+                'x': x,
+                'y': y,
+                'width': width,
+                'height': height
+            },
+            'data_type': data_type,
+            'algorithm': 'I-VT' if data_type == 'fixations' else 'Raw Gaze'
+        }
+
+        # Los scores solo cambian con la imagen, se envían al reiniciar la sesión
+        if delta['reset']:
+            response['participant_scores'] = load_participant_scores(image_id)
+
+        print(f"[TIMING] analyze-area incremental: +{len(entered)} / -{len(delta['left'])} "
+              f"({len(point_ids)} in area) in {(time.time() - t_total_start) * 1000:.1f}ms")
+        return jsonify(response)
+    except Exception as e:
+        import traceback
+        print(f"Error analyzing area (incremental): {e}")
+        print(f"Full traceback:\n{traceback.format_exc()}")
+        return jsonify({'error': str(e), 'traceback': traceback.format_exc()}), 400
+
 if __name__ == '__main__':
     app.run(debug=True, host='0.0.0.0', port=8081)
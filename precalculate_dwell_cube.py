@@ -0,0 +1,54 @@
+"""
+Script para pre-calcular el cubo de dwell time (imagen × participante × clase).
+Genera un cubo por variante de dataset y tipo de datos (gaze / fixations) para que el
+heatmap por clase se arme solo con slicing y normalización, sin recalcular delta_t ni
+agrupar en cada request.
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.shared.data_service import get_data_service
+from app.shared.dwell_cube_service import get_dwell_cube_service
+from app.controllers.heatmap import heatmap_controller
+
+def main():
+    print("=" * 80)
+    print("PRE-CÁLCULO DEL CUBO DE DWELL TIME")
+    print("=" * 80)
+
+    data_service = get_data_service()
+    cube_service = get_dwell_cube_service()
+
+    for dataset_select in data_service.get_available_datasets():
+        df = data_service.get_data_by_dataset(dataset_select)
+        if df is None:
+            print(f"\n⚠ Dataset '{dataset_select}' no disponible, se omite")
+            continue
+
+        image_ids = sorted(int(i) for i in df['ImageName'].dropna().unique())
+
+        for data_type in ['gaze', 'fixations']:
+            print(f"\n{dataset_select} / {data_type}: {len(image_ids)} imágenes")
+            errors = 0
+
+            for idx, image_id in enumerate(image_ids, 1):
+                if idx % 25 == 0 or idx == 1:
+                    print(f"   Progreso: {idx}/{len(image_ids)}")
+
+                # Construye (y guarda en memoria) el bloque de la imagen
+                result = heatmap_controller.get_heatmap_data(image_id, data_type=data_type, dataset_select=dataset_select)
+                if 'error' in result:
+                    errors += 1
+
+            cube_path = cube_service.save_cube(dataset_select, data_type)
+            print(f"   ✓ Cubo guardado en {cube_path} ({errors} imágenes sin datos)")
+
+    print("\n" + "=" * 80)
+    print("✓ PRE-CÁLCULO COMPLETADO EXITOSAMENTE")
+    print("=" * 80)
+
+if __name__ == '__main__':
+    main()
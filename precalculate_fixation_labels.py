@@ -0,0 +1,56 @@
+"""
+Script para pre-calcular la clase semántica de cada fixation pre-calculada (fixation.csv).
+Genera un archivo de etiquetas por variante de dataset para que el scarf plot en modo
+fixations no ejecute I-VT ni la búsqueda de vecinos en cada request.
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.shared.data_service import get_data_service
+from app.shared.precomputed_fixation_service import get_precomputed_service
+from app.shared.fixation_label_service import get_fixation_label_service
+
+def main():
+    print("=" * 80)
+    print("PRE-CÁLCULO DE ETIQUETAS DE FIXATIONS")
+    print("=" * 80)
+
+    data_service = get_data_service()
+    precomputed_service = get_precomputed_service()
+    label_service = get_fixation_label_service()
+
+    if precomputed_service.fixations_df is None:
+        print("\n✗ fixation.csv no disponible, no hay fixations que etiquetar")
+        return
+
+    image_ids = sorted(int(i) for i in precomputed_service.fixations_df.index.get_level_values('image_id').unique())
+
+    for dataset_select in data_service.get_available_datasets():
+        if data_service.get_data_by_dataset(dataset_select) is None:
+            print(f"\n⚠ Dataset '{dataset_select}' no disponible, se omite")
+            continue
+
+        print(f"\n{dataset_select}: {len(image_ids)} imágenes")
+        errors = 0
+
+        for idx, image_id in enumerate(image_ids, 1):
+            if idx % 25 == 0 or idx == 1:
+                print(f"   Progreso: {idx}/{len(image_ids)}")
+
+            # Etiqueta (y guarda en memoria) las fixations de la imagen
+            fixations, _ = label_service.get_labeled_fixations(image_id, dataset_select)
+            if fixations is None:
+                errors += 1
+
+        labels_path = label_service.save_store(dataset_select)
+        print(f"   ✓ Etiquetas guardadas en {labels_path} ({errors} imágenes sin datos)")
+
+    print("\n" + "=" * 80)
+    print("✓ PRE-CÁLCULO COMPLETADO EXITOSAMENTE")
+    print("=" * 80)
+
+if __name__ == '__main__':
+    main()
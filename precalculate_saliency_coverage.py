@@ -1,38 +1,31 @@
 """
 Script para pre-calcular saliency coverage y entropy para todos los participantes e imágenes.
 Esto evita tener que calcularlos en tiempo real, mejorando significativamente el rendimiento.
+
+Los heatmaps se generan por lotes con el motor de densidad (un np.bincount y un
+suavizado a resolución reducida por lote) y se llevan a 800x600 para las métricas.
 """
 
 import pandas as pd
 import numpy as np
-from scipy.ndimage import gaussian_filter
 from skimage.filters import threshold_otsu
 import json
 from pathlib import Path
 
+from app.shared.density_engine import density_map, density_maps, upsample_map
+
+# Mapas (participante, imagen) procesados por lote
+BATCH_SIZE = 256
+
 def generate_heatmap(fixations, img_width=800, img_height=600, sigma=30):
     """
     Genera un heatmap continuo a partir de puntos de fijación con suavizado Gaussiano.
     """
-    if not fixations or len(fixations) == 0:
+    if fixations is None or len(fixations) == 0:
         return np.zeros((img_height, img_width))
 
-    # Crear matriz de acumulación
-    heatmap = np.zeros((img_height, img_width))
-
-    # Acumular puntos en el heatmap
-    for x, y in fixations:
-        # Convertir coordenadas a enteros y validar límites
-        x_int = int(round(x))
-        y_int = int(round(y))
-
-        if 0 <= x_int < img_width and 0 <= y_int < img_height:
-            heatmap[y_int, x_int] += 1
-
-    # Aplicar suavizado Gaussiano
-    heatmap_smooth = gaussian_filter(heatmap, sigma=sigma)
-
-    return heatmap_smooth
+    # Coordenadas redondeadas (int(round(x))) como en el cálculo original
+    return density_map(fixations, img_width, img_height, sigma, rounding='round', normalize=False)
 
 def calculate_saliency_coverage(heatmap):
     """
@@ -105,56 +98,66 @@ def main():
 
     # Obtener combinaciones únicas de participante e imagen
     print("\n2. Identificando combinaciones únicas...")
-    combinations = df[['participante', 'ImageName']].drop_duplicates()
+    # (sin claves nulas: mismo orden que los grupos de groupby(sort=False))
+    combinations = df[['participante', 'ImageName']].dropna().drop_duplicates()
     total_combinations = len(combinations)
     print(f"   ✓ Total de combinaciones participante-imagen: {total_combinations}")
 
     # Pre-calcular saliency coverage y entropy
-    print("\n3. Calculando saliency coverage y entropy...")
+    print("\n3. Calculando saliency coverage y entropy (por lotes)...")
     results = []
 
-    for idx, (_, row) in enumerate(combinations.iterrows(), 1):
-        participant_id = row['participante']
-        image_name = row['ImageName']
-
-        if idx % 50 == 0 or idx == 1:
-            print(f"   Progreso: {idx}/{total_combinations} ({idx/total_combinations*100:.1f}%)")
-
-        # Filtrar datos para esta combinación
-        mask = (df['participante'] == participant_id) & (df['ImageName'] == image_name)
-        image_data = df[mask]
-
-        if len(image_data) == 0:
-            continue
-
-        # Extraer puntos de gaze
-        fixations = list(zip(image_data['pixelX'].values, image_data['pixelY'].values))
-
-        # Generar heatmap
-        heatmap = generate_heatmap(fixations, img_width=800, img_height=600, sigma=30)
-
-        # Calcular métricas
-        saliency_coverage, _ = calculate_saliency_coverage(heatmap)
-        stationary_entropy = calculate_stationary_entropy(heatmap)
-
-        # Obtener score de la imagen
-        score = 0.0
-        if str(image_name) in scores_data:
-            score_entries = scores_data[str(image_name)].get('score_participant', [])
-            for entry in score_entries:
-                if entry['participant'] == participant_id:
-                    score = entry.get('score', 0.0)
-                    break
-
-        # Guardar resultado
-        results.append({
-            'participante': int(participant_id),
-            'ImageName': int(image_name),
-            'score': float(score),
-            'saliency_coverage': float(saliency_coverage),
-            'stationary_entropy': float(stationary_entropy),
-            'gaze_points_count': len(image_data)
-        })
+    # Código de cada combinación en el orden de combinations (primera aparición)
+    group_codes = df.groupby(['participante', 'ImageName'], sort=False).ngroup().to_numpy()
+    points_count = np.bincount(group_codes[group_codes >= 0], minlength=total_combinations)
+
+    # Puntos ordenados por combinación para cortar cada lote con searchsorted
+    order = np.argsort(group_codes, kind='stable')
+    sorted_codes = group_codes[order]
+    xs = df['pixelX'].to_numpy(dtype=float)[order]
+    ys = df['pixelY'].to_numpy(dtype=float)[order]
+
+    # Score de cada (imagen, participante)
+    scores_lookup = {
+        (str(image_key), entry['participant']): entry.get('score', 0.0)
+        for image_key, image_info in scores_data.items()
+        for entry in image_info.get('score_participant', [])
+    }
+
+    combination_rows = combinations.to_numpy()
+    for batch_start in range(0, total_combinations, BATCH_SIZE):
+        batch_end = min(batch_start + BATCH_SIZE, total_combinations)
+        print(f"   Progreso: {batch_end}/{total_combinations} ({batch_end/total_combinations*100:.1f}%)")
+
+        lo, hi = np.searchsorted(sorted_codes, [batch_start, batch_end])
+        maps, _ = density_maps(
+            sorted_codes[lo:hi] - batch_start, xs[lo:hi], ys[lo:hi], batch_end - batch_start,
+            width=800, height=600, sigma=30, rounding='round'
+        )
+
+        for offset, code in enumerate(range(batch_start, batch_end)):
+            participant_id, image_name = combination_rows[code]
+
+            if points_count[code] == 0:
+                continue
+
+            # Heatmap a resolución completa y métricas
+            heatmap = upsample_map(maps[offset], 800, 600)
+            saliency_coverage, _ = calculate_saliency_coverage(heatmap)
+            stationary_entropy = calculate_stationary_entropy(heatmap)
+
+            # Obtener score de la imagen
+            score = scores_lookup.get((str(image_name), participant_id), 0.0)
+
+            # Guardar resultado
+            results.append({
+                'participante': int(participant_id),
+                'ImageName': int(image_name),
+                'score': float(score),
+                'saliency_coverage': float(saliency_coverage),
+                'stationary_entropy': float(stationary_entropy),
+                'gaze_points_count': int(points_count[code])
+            })
 
     print(f"   ✓ Completado: {len(results)} combinaciones procesadas")
 
@@ -0,0 +1,72 @@
+"""
+Script para pre-calcular los timelines de scarf plot de todas las imágenes y participantes.
+Genera, por variante de dataset, los segmentos de gaze y de fixations del scarf plot y el
+timeline de regiones del glyph en formato binario (static/data/scarf_timelines/), que el
+servidor abre con memory-map al iniciar para responder sin recalcular.
+"""
+
+import sys
+import os
+
+import numpy as np
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.shared.data_service import get_data_service
+from app.shared.precomputed_fixation_service import get_precomputed_service
+from app.shared.timeline_store import get_timeline_store
+from app.controllers.scarf_plot import scarf_controller
+from app.controllers.glyph import build_glyph_timelines
+
+def main():
+    print("=" * 80)
+    print("PRE-CÁLCULO DE TIMELINES DE SCARF PLOT")
+    print("=" * 80)
+
+    data_service = get_data_service()
+    timeline_store = get_timeline_store()
+    precomputed_service = get_precomputed_service()
+
+    # 1. Scarf plot (gaze y fixations) por variante de dataset
+    print("\n1. Timelines del scarf plot...")
+    for dataset_select in data_service.get_available_datasets():
+        table = scarf_controller.get_timeline_table(dataset_select)
+        if table is None:
+            print(f"\n⚠ Dataset '{dataset_select}' no disponible, se omite")
+            continue
+
+        pair_keys = np.unique((table['image'] << 32) + table['participant'])
+        timelines = scarf_controller.get_timeline_arrays(pair_keys, 'gaze', dataset_select, use_store=False)
+        variant_dir = timeline_store.save_variant('scarf', dataset_select, 'gaze', timelines)
+        print(f"   ✓ {dataset_select} / gaze: {len(timelines['image'])} pares, {len(timelines['codes'])} segmentos -> {variant_dir}")
+
+        if precomputed_service.fixations_df is None:
+            print(f"   ⚠ {dataset_select} / fixations: fixation.csv no disponible, se omite")
+            continue
+        index = precomputed_service.fixations_df.index
+        fixation_keys = np.unique(
+            (index.get_level_values('image_id').to_numpy(dtype=np.int64) << 32)
+            + index.get_level_values('participant_id').to_numpy(dtype=np.int64)
+        )
+        timelines = scarf_controller.get_timeline_arrays(fixation_keys, 'fixations', dataset_select, use_store=False)
+        variant_dir = timeline_store.save_variant('scarf', dataset_select, 'fixations', timelines)
+        print(f"   ✓ {dataset_select} / fixations: {len(timelines['image'])} pares, {len(timelines['codes'])} segmentos -> {variant_dir}")
+
+    # 2. Timeline de regiones del glyph (/api/scarf/timeline)
+    print("\n2. Timeline de regiones del glyph...")
+    data = data_service.get_data_by_dataset('main_class')
+    if data is None:
+        print("   ⚠ Dataset 'main_class' no disponible, se omite")
+    else:
+        timelines = build_glyph_timelines(data)
+        # Tiempos relativos al inicio de cada participante (precisión de float32)
+        variant_dir = timeline_store.save_variant('glyph', 'main_class', 'gaze', timelines,
+                                                  relative_times=True, time_decimals=6)
+        print(f"   ✓ {len(timelines['image'])} pares, {len(timelines['codes'])} segmentos -> {variant_dir}")
+
+    print("\n" + "=" * 80)
+    print("✓ PRE-CÁLCULO COMPLETADO EXITOSAMENTE")
+    print("=" * 80)
+
+if __name__ == '__main__':
+    main()
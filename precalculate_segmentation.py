@@ -0,0 +1,65 @@
+"""
+Script para pre-calcular las máscaras de segmentación compactas y la tabla de ratios por clase.
+Convierte cada datos_seg/<image_id>.pkl (int64) a <image_id>.npy (uint16) para cargarlo con
+memory-map, y guarda el ratio de píxeles de cada (imagen, class_id) usando un np.bincount por máscara.
+"""
+
+import numpy as np
+import pandas as pd
+import joblib
+from pathlib import Path
+
+from app.shared.segmentation_service import SegmentationService
+
+def main():
+    print("=" * 80)
+    print("PRE-CÁLCULO DE MÁSCARAS DE SEGMENTACIÓN Y RATIOS POR CLASE")
+    print("=" * 80)
+
+    base_dir = Path(__file__).parent
+    seg_dir = base_dir / 'static' / 'images' / 'images' / 'datos_seg'
+    output_path = base_dir / 'static' / 'data' / 'segmentation_class_ratios.csv'
+
+    pkl_files = sorted(seg_dir.glob('*.pkl'), key=lambda p: int(p.stem) if p.stem.isdigit() else p.stem)
+    print(f"\n1. Máscaras encontradas en {seg_dir}: {len(pkl_files)}")
+
+    print("\n2. Convirtiendo a .npy uint16 y calculando ratios...")
+    rows = []
+    converted = 0
+
+    for idx, pkl_path in enumerate(pkl_files, 1):
+        if not pkl_path.stem.isdigit():
+            continue
+        image_id = int(pkl_path.stem)
+
+        if idx % 25 == 0 or idx == 1:
+            print(f"   Progreso: {idx}/{len(pkl_files)}")
+
+        mask = np.asarray(joblib.load(pkl_path))
+
+        if mask.size > 0 and mask.min() >= 0 and mask.max() <= np.iinfo(np.uint16).max:
+            np.save(seg_dir / f"{image_id}.npy", mask.astype(np.uint16))
+            converted += 1
+        else:
+            print(f"   ADVERTENCIA: {pkl_path.name} tiene valores fuera de uint16, se mantiene solo el pkl")
+
+        for class_id, ratio in SegmentationService.compute_class_ratios(mask).items():
+            rows.append({
+                'image_id': image_id,
+                'class_id': class_id,
+                'ratio': ratio
+            })
+
+    print(f"   ✓ Máscaras convertidas: {converted}")
+
+    print(f"\n3. Guardando tabla de ratios en {output_path}...")
+    ratios_df = pd.DataFrame(rows, columns=['image_id', 'class_id', 'ratio'])
+    ratios_df.to_csv(output_path, index=False)
+    print(f"   ✓ {len(ratios_df)} filas (imagen, clase) guardadas")
+
+    print("\n" + "=" * 80)
+    print("✓ PRE-CÁLCULO COMPLETADO EXITOSAMENTE")
+    print("=" * 80)
+
+if __name__ == '__main__':
+    main()
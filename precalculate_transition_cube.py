@@ -0,0 +1,48 @@
+"""
+Script para pre-calcular el cubo de transiciones entre clases (imagen × participante × origen × destino).
+Genera un cubo disperso por variante de dataset y tipo de datos (gaze / fixations) con la
+cantidad de transiciones y el dwell antes de cada una, para que /api/transitions/matrix
+solo sume las filas de los participantes pedidos.
+"""
+
+import sys
+import os
+
+sys.path.append(os.path.dirname(__file__))
+
+from app.shared.data_service import get_data_service
+from app.shared.transition_cube import get_transition_cube_service
+from app.controllers.scarf_plot import scarf_controller
+
+def main():
+    print("=" * 80)
+    print("PRE-CÁLCULO DEL CUBO DE TRANSICIONES")
+    print("=" * 80)
+
+    data_service = get_data_service()
+    cube_service = get_transition_cube_service()
+
+    for dataset_select in data_service.get_available_datasets():
+        if data_service.get_data_by_dataset(dataset_select) is None:
+            print(f"\n⚠ Dataset '{dataset_select}' no disponible, se omite")
+            continue
+
+        for data_type in ['gaze', 'fixations']:
+            print(f"\n{dataset_select} / {data_type}...")
+            cube_path = cube_service.save_cube(
+                dataset_select, data_type,
+                lambda: scarf_controller.build_transition_cube(dataset_select, data_type)
+            )
+            if cube_path is None:
+                print("   ⚠ Sin datos, se omite")
+                continue
+
+            cube = cube_service.get_cube(dataset_select, data_type, lambda: None)
+            print(f"   ✓ {len(cube['count'])} celdas, {int(cube['count'].sum())} transiciones -> {cube_path}")
+
+    print("\n" + "=" * 80)
+    print("✓ PRE-CÁLCULO COMPLETADO EXITOSAMENTE")
+    print("=" * 80)
+
+if __name__ == '__main__':
+    main()
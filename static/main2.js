@@ -902,11 +902,17 @@ function createBrushSelection(imageWrapper, img) {
         .on('start', function() {
             console.log('Brush iniciado');
             window.brushActive = true;
+            resetIncrementalAreaState();
         })
         .on('brush', function(event) {
             if (event.selection) {
                 window.brushSelection = event.selection;
-                console.log('Selección brush:', event.selection);
+
+                // Análisis en vivo: solo se piden los puntos que entran/salen del rectángulo
+                const liveArea = brushSelectionToDataArea(event.selection, imgWidth, imgHeight);
+                if (liveArea.width >= 40 && liveArea.height >= 40) {
+                    scheduleIncrementalAreaAnalysis(liveArea);
+                }
             }
         })
         .on('end', function(event) {
@@ -918,33 +924,7 @@ function createBrushSelection(imageWrapper, img) {
 
                 console.log(`Selección brush (pantalla): (${x0.toFixed(1)}, ${y0.toFixed(1)}) to (${x1.toFixed(1)}, ${y1.toFixed(1)})`);
 
-                // IMPORTANTE: Los datos gaze están en espacio 800x600 (nativo)
-                // pero el brush está en espacio de pantalla (imgWidth x imgHeight)
-                // Necesitamos escalar las coordenadas del brush al espacio de datos
-                const DATA_WIDTH = 800;
-                const DATA_HEIGHT = 600;
-
-                const scaleX = DATA_WIDTH / imgWidth;
-                const scaleY = DATA_HEIGHT / imgHeight;
-
-                console.log(`Factores de escala: X=${scaleX.toFixed(3)}, Y=${scaleY.toFixed(3)} (pantalla ${imgWidth}x${imgHeight} -> datos ${DATA_WIDTH}x${DATA_HEIGHT})`);
-
-                // Convertir coordenadas de pantalla a espacio de datos
-                // IMPORTANTE: Tanto Gaze como Fixations invierten Y en visualización (líneas 442 y 504)
-                // Por lo tanto, el brush debe invertir Y para AMBOS tipos de datos
-
-                // Ambos tipos invierten Y porque la visualización lo hace
-                const areaY = Math.round((DATA_HEIGHT - (y1 * scaleY)));
-                const areaHeight = Math.round((y1 - y0) * scaleY);
-
-                console.log(`Modo ${currentDataType}: Invirtiendo Y - y0_pantalla=${y0.toFixed(1)}, y1_pantalla=${y1.toFixed(1)} -> y_datos=${areaY}`);
-
-                const area = {
-                    x: Math.round(x0 * scaleX),
-                    y: areaY,
-                    width: Math.round((x1 - x0) * scaleX),
-                    height: areaHeight
-                };
+                const area = brushSelectionToDataArea(event.selection, imgWidth, imgHeight);
 
                 console.log(`Área seleccionada (espacio datos): ${area.width}x${area.height}px en (${area.x}, ${area.y})`);
 
@@ -956,6 +936,9 @@ function createBrushSelection(imageWrapper, img) {
 
                 console.log(`✅ Área para análisis: ${area.width}x${area.height}px en (${area.x}, ${area.y})`);
 
+                // El análisis completo al soltar reemplaza el resultado incremental
+                resetIncrementalAreaState();
+
                 // Llamar función para generar glyph del área seleccionada
                 analyzeSelectedArea(area);
             } else {
@@ -2122,6 +2105,137 @@ class RadialGlyph {
     }
 }
 
+function brushSelectionToDataArea(selection, imgWidth, imgHeight) {
+    const [[x0, y0], [x1, y1]] = selection;
+
+    // IMPORTANTE: Los datos gaze están en espacio 800x600 (nativo)
+    // pero el brush está en espacio de pantalla (imgWidth x imgHeight)
+    // Necesitamos escalar las coordenadas del brush al espacio de datos
+    const DATA_WIDTH = 800;
+    const DATA_HEIGHT = 600;
+
+    const scaleX = DATA_WIDTH / imgWidth;
+    const scaleY = DATA_HEIGHT / imgHeight;
+
+    // Convertir coordenadas de pantalla a espacio de datos
+    // IMPORTANTE: Tanto Gaze como Fixations invierten Y en visualización (líneas 442 y 504)
+    // Por lo tanto, el brush debe invertir Y para AMBOS tipos de datos
+    return {
+        x: Math.round(x0 * scaleX),
+        y: Math.round((DATA_HEIGHT - (y1 * scaleY))),
+        width: Math.round((x1 - x0) * scaleX),
+        height: Math.round((y1 - y0) * scaleY)
+    };
+}
+
+// Estado del análisis incremental durante el arrastre del brush
+var incrementalAreaState = {
+    selectionId: null,
+    points: new Map(),          // point_id -> registro del área actual
+    participantScores: {},
+    pending: false,             // Hay un request en vuelo
+    queuedArea: null,           // Último rectángulo pendiente de enviar
+    lastSent: 0
+};
+const INCREMENTAL_AREA_THROTTLE_MS = 120;
+
+function resetIncrementalAreaState() {
+    incrementalAreaState.selectionId = null;
+    incrementalAreaState.points = new Map();
+    incrementalAreaState.participantScores = {};
+    incrementalAreaState.queuedArea = null;
+}
+
+function scheduleIncrementalAreaAnalysis(area) {
+    // Un solo request en vuelo: los rectángulos intermedios se descartan
+    incrementalAreaState.queuedArea = area;
+    if (incrementalAreaState.pending) return;
+
+    const wait = Math.max(0, INCREMENTAL_AREA_THROTTLE_MS - (Date.now() - incrementalAreaState.lastSent));
+    incrementalAreaState.pending = true;
+    setTimeout(() => {
+        const nextArea = incrementalAreaState.queuedArea;
+        incrementalAreaState.queuedArea = null;
+        if (!nextArea || !window.brushActive) {
+            incrementalAreaState.pending = false;
+            return;
+        }
+        incrementalAreaState.lastSent = Date.now();
+        analyzeSelectedAreaIncremental(nextArea).finally(() => {
+            incrementalAreaState.pending = false;
+            if (incrementalAreaState.queuedArea && window.brushActive) {
+                scheduleIncrementalAreaAnalysis(incrementalAreaState.queuedArea);
+            }
+        });
+    }, wait);
+}
+
+function analyzeSelectedAreaIncremental(area) {
+    const currentImage = selectedImg;
+    if (!currentImage) {
+        return Promise.resolve();
+    }
+
+    const dataTypeSelect = document.getElementById('data-type-select');
+    const dataType = dataTypeSelect ? dataTypeSelect.value : 'fixations';
+    currentDataType = dataType;
+
+    let apiUrl = `/api/analyze-area/${currentImage}/incremental?data_type=${dataType}`;
+    if (selectedPart !== null && selectedPart !== 'all') {
+        apiUrl += `&participant_id=${selectedPart}`;
+    }
+
+    return fetch(apiUrl, {
+        method: 'POST',
+        headers: {
+            'Content-Type': 'application/json',
+        },
+        body: JSON.stringify({
+            selection_id: incrementalAreaState.selectionId,
+            x: area.x,
+            y: area.y,
+            width: area.width,
+            height: area.height
+        })
+    })
+    .then(response => response.json())
+    .then(delta => {
+        // El brush pudo terminar mientras el request estaba en vuelo
+        if (delta.error || !window.brushActive) return;
+
+        const state = incrementalAreaState;
+        if (delta.reset) {
+            state.points = new Map();
+            state.participantScores = delta.participant_scores || {};
+        }
+        state.selectionId = delta.selection_id;
+
+        delta.left.forEach(pointId => state.points.delete(pointId));
+        delta.entered.forEach(point => state.points.set(point.point_id, point));
+
+        const points = Array.from(state.points.values());
+        const data = {
+            data_for_analysis: points,
+            fixations: dataType === 'fixations' ? points : [],
+            gaze_points: dataType === 'gaze' ? points : [],
+            count: delta.count,
+            total_fixations_in_image: delta.total_fixations_in_image,
+            participant_counts: delta.participant_counts,
+            area: delta.area,
+            participant_scores: state.participantScores,
+            data_type: delta.data_type,
+            algorithm: delta.algorithm
+        };
+
+        currentAnalyzedArea = area;
+        currentAreaData = data;
+        showGlyphTooltip(area, data);
+    })
+    .catch(error => {
+        console.error('Error analyzing area (incremental):', error);
+    });
+}
+
 function analyzeSelectedArea(area) {
     console.log('Analizando área seleccionada:', area);
 
@@ -2597,7 +2711,11 @@ function visualizeAttentionHeatmap(data, colNormalize=false) {
     }
 
     
-    var perm = reorder.optimal_leaf_order()(data_matrix);
+    // Orden de filas calculado (y cacheado) en el servidor; reorder.js solo
+    // cuando se normaliza por columna o el servidor no envió la permutación
+    var perm = (!colNormalize && Array.isArray(data.row_order) && data.row_order.length === data.classes.length)
+        ? data.row_order
+        : reorder.optimal_leaf_order()(data_matrix);
     var permIds = [];
     for (let i = 0; i < data.classes.length; i++) {
         permIds.push(data.classes[perm[i]]);
@@ -4887,7 +5005,7 @@ function loadHeatmap(imageId, dataType = 'gaze', mode = 'attention') {
 
 function loadAttentionHeatmap(participantId) {
     const baseUrl = window.location.origin;
-    const apiUrl = `${baseUrl}/api/heatmap/participant/${participantId}`;
+    const apiUrl = `${baseUrl}/api/heatmap/participant/${participantId}?order=olo`;
     fetch(apiUrl)
         .then(response => {
             if (!response.ok) {
@@ -5416,7 +5534,11 @@ function visualizeScarfPlot(data) {
 
 function loadScarfPlot(imageId, dataType = 'gaze') {
             const baseUrl = window.location.origin;
-            const apiUrl = `${baseUrl}/api/scarf-plot/${imageId}?data_type=${dataType}&dataset_select=${currentDatasetSelect}`;
+            // Ancho del eje de tiempo en píxeles: el backend fusiona segmentos más cortos que un píxel
+            const scarfContainer = document.getElementById('scarf-plot');
+            const pixelWidth = scarfContainer ? Math.round(scarfContainer.clientWidth) : 0;
+            const lodParam = pixelWidth > 0 ? `&pixel_width=${pixelWidth}` : '';
+            const apiUrl = `${baseUrl}/api/scarf-plot/${imageId}?data_type=${dataType}&dataset_select=${currentDatasetSelect}${lodParam}`;
 
             console.log(`Cargando scarf plot desde: ${apiUrl} (data_type=${dataType}, dataset_select=${currentDatasetSelect})`);
 